@@ -0,0 +1,96 @@
+"""Time the /list channel browser on a large network
+
+    python -m benchmarks.channellist --channels 20000 --sessions 100
+
+Streams a LIST reply into a shared channel listing and compares it with
+printing every 322 as a <server> chat line, then times searching the index
+the way the browser does while someone types, and counts how many LIST
+requests the given number of sessions opening the browser send upstream.
+"""
+import argparse
+import time
+
+from benchmarks import corpora
+from benchmarks.replay import StubSocket, make_view, percentile
+from helpers.memory import memory_budget
+from irc.channellist import ChannelListing, channel_lists
+from irc.client import IrcBaseClient, IrcMessage
+from irc.state import SessionState
+
+
+def make_state(nick: str) -> SessionState:
+    client = IrcBaseClient(nick, "lizardchat-web")
+    client.socket = StubSocket()
+    client.connected = True
+    client.server = (corpora.SERVER, 6697)
+    return SessionState(client)
+
+
+def stream_listing(lines: list[str]) -> tuple[float, ChannelListing]:
+    state = make_state(corpora.NICK)
+    listing = state.request_channel_list()
+    start = time.perf_counter()
+    for raw in lines:
+        state.process(IrcMessage.from_raw(raw))
+    elapsed = time.perf_counter() - start
+    assert listing.completed and len(listing.index) == len(lines) - 2
+    return elapsed, listing
+
+
+def stream_chat_lines(lines: list[str]) -> float:
+    view = make_view()
+    start = time.perf_counter()
+    for raw in lines:
+        message = IrcMessage.from_raw(raw)
+        view.add_message_to_buffer("<server>", "<!>", message.params)
+        view.page.update()
+    elapsed = time.perf_counter() - start
+    memory_budget.forget(view)
+    return elapsed
+
+
+def typing(words: list[str]) -> list[str]:
+    return [word[:length] for word in words for length in range(1, len(word) + 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=100)
+    args = parser.parse_args()
+
+    lines = corpora.channel_list(args.channels)
+    channel_lists.clear()
+    listing_seconds, listing = stream_listing(lines)
+    chat_seconds = stream_chat_lines(lines)
+    print(f"{'LIST stream':<24}{'total ms':>10}{'per line us':>13}")
+    for name, seconds in (("listing", listing_seconds), ("chat lines", chat_seconds)):
+        print(f"{name:<24}{seconds * 1e3:>10.1f}{seconds / len(lines) * 1e6:>13.2f}")
+
+    index = listing.index
+    queries = typing(["gecko", "basking rock", "terrarium"])
+    print(f"\n{'search':<24}{'p50 us':>10}{'p99 us':>13}")
+    for sort in ("users", "name"):
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, sort)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(
+            f"{'typing, by ' + sort:<24}{percentile(timings, 50) * 1e6:>10.1f}"
+            f"{percentile(timings, 99) * 1e6:>13.1f}"
+        )
+
+    channel_lists.clear()
+    fetches = channel_lists.fetches
+    for i in range(args.sessions):
+        make_state(f"browser{i}").request_channel_list()
+    print(
+        f"\n{args.sessions} sessions opening /list sent "
+        f"{channel_lists.fetches - fetches} LIST request(s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compare the cost of chat line representations
+
+    python -m benchmarks.chatlines --lines 10000
+
+Reports controls per line, bytes of the add-control payload sent over the
+websocket, and Python heap held by the rendered lines.
+"""
+import argparse
+import json
+import tracemalloc
+
+import flet as ft
+from flet_core.protocol import CommandEncoder
+
+from benchmarks import corpora
+from views.chat import ChatMessage
+
+
+class RowChatMessage(ft.Row):
+    """The previous Row of three Text controls, kept for comparison"""
+
+    def __init__(self, timestamp: str, nickname: str, message: str) -> None:
+        super().__init__()
+        self.vertical_alignment = ft.MainAxisAlignment.START
+        self.alignment = ft.CrossAxisAlignment.START
+        self.spacing = 5
+        self.controls = [
+            ft.Text(value=timestamp, size=10),
+            ft.Text(
+                value=f"{nickname}:", weight=ft.FontWeight.BOLD, font_family="Cousine"
+            ),
+            ft.Text(
+                value=message,
+                selectable=True,
+                font_family="Cousine",
+                no_wrap=False,
+                overflow=ft.TextOverflow.CLIP,
+                expand=True,
+            ),
+        ]
+
+
+REPRESENTATIONS = {"row": RowChatMessage, "spans": ChatMessage}
+
+
+def sample_lines(count: int) -> list[tuple[str, str, str]]:
+    lines = []
+    for raw in corpora.privmsg_stream(count):
+        source, _, _, text = raw.rstrip("\r\n").split(" ", 3)
+        lines.append(("12:34:56", source[1:].split("!")[0], text[1:]))
+    return lines
+
+
+def measure(factory, lines: list[tuple[str, str, str]]) -> dict[str, float]:
+    tracemalloc.start()
+    controls = [factory(*line) for line in lines]
+    heap, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    commands = []
+    for control in controls:
+        commands.extend(control._build_add_commands())
+    payload = len(json.dumps(commands, cls=CommandEncoder, separators=(",", ":")))
+    return {
+        "controls_per_line": len(commands) / len(lines),
+        "payload_bytes": payload,
+        "heap_bytes": heap,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10000)
+    args = parser.parse_args()
+
+    lines = sample_lines(args.lines)
+    print(f"{args.lines} lines")
+    print(
+        f"{'representation':<16}{'controls/line':>15}"
+        f"{'payload KiB':>13}{'heap KiB':>10}"
+    )
+    for name, factory in REPRESENTATIONS.items():
+        result = measure(factory, lines)
+        print(
+            f"{name:<16}{result['controls_per_line']:>15.1f}"
+            f"{result['payload_bytes'] / 1024:>13.0f}"
+            f"{result['heap_bytes'] / 1024:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Time Tab completion and nick list updates in a large channel
+
+    python -m benchmarks.completion --users 5000
+
+Fills a UserList buffer with generated nicks, marks some of them as recent
+speakers and times completing one- and two-letter prefixes, then the
+incremental JOIN, PART and NICK updates against rebuilding the whole list.
+"""
+import argparse
+import random
+import time
+
+from benchmarks import corpora
+from benchmarks.replay import percentile
+from views.chat import UserList
+
+
+def timed(action, samples: int) -> list[float]:
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        action(i)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    names = corpora.nicks(args.users, seed=2)
+    user_list = UserList()
+    user_list.register_buffer(corpora.CHANNEL)
+    user_list.set_buffer_nicks(corpora.CHANNEL, names)
+    user_list.set_active_buffer(corpora.CHANNEL)
+    bare = [name.lstrip("@%+") for name in names]
+    for nick in rng.sample(bare, 40):
+        user_list.spoke(corpora.CHANNEL, nick)
+    prefixes = [nick[:length] for nick in bare for length in (1, 2)]
+
+    results = {
+        "complete": timed(
+            lambda i: user_list.complete(corpora.CHANNEL, rng.choice(prefixes)),
+            args.samples,
+        ),
+        "join": timed(
+            lambda i: user_list.add_user(corpora.CHANNEL, f"joiner_{i}"),
+            args.samples,
+        ),
+        "nick": timed(
+            lambda i: user_list.replace_name(f"joiner_{i}", f"renamed_{i}"),
+            args.samples,
+        ),
+        "part": timed(
+            lambda i: user_list.remove_user_from_buffer(
+                corpora.CHANNEL, f"renamed_{i}"
+            ),
+            args.samples,
+        ),
+        "rebuild": timed(
+            lambda i: user_list.set_buffer_nicks(corpora.CHANNEL, names),
+            max(args.samples // 100, 5),
+        ),
+    }
+    print(f"{'operation':<12}{'p50 us':>10}{'p99 us':>10}")
+    for name, timings in results.items():
+        print(
+            f"{name:<12}{percentile(timings, 50) * 1e6:>10.1f}"
+            f"{percentile(timings, 99) * 1e6:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import random
+import zlib
+
+SERVER = "irc.lizard.fun"
+NICK = "bench"
+CHANNEL = "#main_chat"
+RECORDED_DIR = os.path.join(os.path.dirname(__file__), "recorded")
+
+WORDS = (
+    "lizard gecko skink anole iguana basking rock sun warm scales tail "
+    "cricket mealworm terrarium shed molt heat lamp uvb substrate hide"
+).split()
+
+
+def user_mask(nick: str) -> str:
+    cloak = zlib.crc32(nick.encode()) & 0xFFFFFF
+    return f"{nick}!~{nick[:10]}@Clk-{cloak:06X}.lizard.fun"
+
+
+def nicks(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    prefixes = ("", "", "", "+", "@", "%")
+    return [
+        f"{rng.choice(prefixes)}{rng.choice(WORDS)}_{i}" for i in range(count)
+    ]
+
+
+def recorded(name: str) -> list[str]:
+    with open(os.path.join(RECORDED_DIR, f"{name}.txt")) as f:
+        return [line.rstrip("\r\n") + "\r\n" for line in f if line.strip()]
+
+
+def registration() -> list[str]:
+    return recorded("registration")
+
+
+def motd(lines: int = 500) -> list[str]:
+    rng = random.Random(1)
+    corpus = [f":{SERVER} 375 {NICK} :- {SERVER} Message of the Day -\r\n"]
+    for _ in range(lines):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14)))
+        corpus.append(f":{SERVER} 372 {NICK} :- {text}\r\n")
+    corpus.append(f":{SERVER} 376 {NICK} :End of /MOTD command.\r\n")
+    return corpus
+
+
+def names(count: int = 5000, line_length: int = 400) -> list[str]:
+    corpus = []
+    prefix = f":{SERVER} 353 {NICK} = {CHANNEL} :"
+    line = []
+    length = len(prefix)
+    for nick in nicks(count, seed=2):
+        if length + len(nick) + 1 > line_length:
+            corpus.append(prefix + " ".join(line) + "\r\n")
+            line = []
+            length = len(prefix)
+        line.append(nick)
+        length += len(nick) + 1
+    if line:
+        corpus.append(prefix + " ".join(line) + "\r\n")
+    corpus.append(f":{SERVER} 366 {NICK} {CHANNEL} :End of /NAMES list.\r\n")
+    return corpus
+
+
+def privmsg_stream(count: int = 20000, speakers: int = 200) -> list[str]:
+    rng = random.Random(3)
+    masks = [user_mask(nick.lstrip("+@%")) for nick in nicks(speakers, seed=3)]
+    corpus = []
+    for _ in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 25)))
+        corpus.append(f":{rng.choice(masks)} PRIVMSG {CHANNEL} :{text}\r\n")
+    return corpus
+
+
+def netsplit(count: int = 1000) -> list[str]:
+    masks = [user_mask(nick.lstrip("+@%")) for nick in nicks(count, seed=4)]
+    corpus = [f":{mask} QUIT :*.net *.split\r\n" for mask in masks]
+    corpus += [f":{mask} JOIN :{CHANNEL}\r\n" for mask in masks]
+    return corpus
+
+
+def channel_list(count: int = 5000) -> list[str]:
+    rng = random.Random(6)
+    corpus = [f":{SERVER} 321 {NICK} Channel :Users  Name\r\n"]
+    for i in range(count):
+        users = int(rng.paretovariate(1.2))
+        topic = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 12)))
+        corpus.append(
+            f":{SERVER} 322 {NICK} #{rng.choice(WORDS)}_{i} {users} :[+nt] {topic}\r\n"
+        )
+    corpus.append(f":{SERVER} 323 {NICK} :End of /LIST\r\n")
+    return corpus
+
+
+CORPORA = {
+    "registration": registration,
+    "motd": motd,
+    "names_5000": names,
+    "privmsg_stream": privmsg_stream,
+    "netsplit": netsplit,
+    "channel_list": channel_list,
+}
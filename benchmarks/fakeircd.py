@@ -0,0 +1,498 @@
+"""Minimal asyncio IRC server for local load and integration testing
+
+    python -m benchmarks.fakeircd --port 6667 --chatter-rate 50
+
+Speaks enough of the protocol for the web client: registration with CAP
+negotiation and SASL PLAIN, JOIN, PART, NAMES, TOPIC, PRIVMSG/NOTICE fan-out,
+draft/chathistory (LATEST, BEFORE and AFTER by timestamp), a NickServ that
+answers IDENTIFY, PING/PONG and QUIT. Optional chatter bots
+post to a channel at a fixed rate; each line carries a ts=<ns> token so clients
+can measure delivery latency.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import datetime
+import itertools
+import ssl
+import time
+from collections import deque
+
+CAPS = (
+    "multi-prefix",
+    "server-time",
+    "message-tags",
+    "batch",
+    "echo-message",
+    "draft/chathistory",
+)
+# Messages kept per channel or private conversation, and the most a
+# CHATHISTORY request may ask for
+HISTORY_LENGTH = 5000
+HISTORY_LIMIT = 100
+
+
+def server_time() -> str:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return now.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class FakeClient:
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.nick = "*"
+        self.username = None
+        self.host = writer.get_extra_info("peername", ("127.0.0.1", 0))[0]
+        self.channels = set()
+        self.registered = False
+        self.caps = set()
+        self.negotiating = False
+        self.sasl_payload = None
+        self.account = None
+
+    @property
+    def mask(self) -> str:
+        return f"{self.nick}!{self.username}@{self.host}"
+
+    def send(self, line: str, tags: dict[str, str] | None = None) -> None:
+        tags = dict(tags or {})
+        if "server-time" in self.caps:
+            tags.setdefault("time", server_time())
+        else:
+            tags.pop("time", None)
+        if tags:
+            encoded = ";".join(f"{key}={value}" for key, value in tags.items())
+            line = f"@{encoded} {line}"
+        if not self.writer.is_closing():
+            self.writer.write(f"{line}\r\n".encode("utf-8"))
+
+
+class FakeIrcServer:
+    def __init__(
+        self,
+        name: str = "irc.lizard.fun",
+        chatter_rate: float = 0.0,
+        chatter_channel: str = "#main_chat",
+        ping_interval: float = 30.0,
+        accounts: dict[str, str] | None = None,
+    ) -> None:
+        self.name = name
+        # account name -> password, for SASL PLAIN and NickServ IDENTIFY
+        self.accounts = accounts or {}
+        self.chatter_rate = chatter_rate
+        self.chatter_channel = chatter_channel
+        self.ping_interval = ping_interval
+        self.clients: dict[str, FakeClient] = {}
+        self.channels: dict[str, set[FakeClient]] = {}
+        self.topics: dict[str, str] = {}
+        # Channel name, or the two nicks of a private conversation, to
+        # (server time, line) in the order they were sent
+        self.history: dict[str, deque[tuple[str, str]]] = {}
+        self.batch_ids = itertools.count()
+        self.tasks = []
+        self.server = None
+
+    async def start(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 6667,
+        ssl_context: ssl.SSLContext | None = None,
+    ) -> None:
+        self.server = await asyncio.start_server(
+            self.handle_connection, host, port, ssl=ssl_context
+        )
+        if self.chatter_rate > 0:
+            self.tasks.append(asyncio.create_task(self.chatter()))
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        self.server.close()
+        for client in list(self.clients.values()):
+            client.writer.close()
+        await self.server.wait_closed()
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        client = FakeClient(writer)
+        pinger = asyncio.create_task(self.ping_loop(client))
+        try:
+            while line := await reader.readline():
+                self.handle_line(client, line.decode("utf-8").strip("\r\n"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            pinger.cancel()
+            self.quit(client, "Connection closed")
+            writer.close()
+
+    async def ping_loop(self, client: FakeClient) -> None:
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            client.send(f"PING :{self.name}")
+
+    async def chatter(self) -> None:
+        tick = 0.01
+        owed = 0.0
+        count = 0
+        while True:
+            await asyncio.sleep(tick)
+            owed += self.chatter_rate * tick
+            while owed >= 1:
+                owed -= 1
+                count += 1
+                line = (
+                    f":chatter{count % 10}!bot@fake.lizard.fun PRIVMSG "
+                    f"{self.chatter_channel} :chatter {count} ts={time.time_ns()}"
+                )
+                sent = self.remember(self.chatter_channel, line)
+                self.fan_out(self.chatter_channel, line, tags={"time": sent})
+
+    def numeric(self, client: FakeClient, code: str, params: str) -> None:
+        client.send(f":{self.name} {code} {client.nick} {params}")
+
+    def fan_out(
+        self,
+        channel: str,
+        line: str,
+        exclude: FakeClient = None,
+        tags: dict[str, str] | None = None,
+    ) -> None:
+        for member in self.channels.get(channel, ()):
+            if member is not exclude:
+                member.send(line, tags)
+
+    def remember(self, key: str, line: str) -> str:
+        """Store a line in the key's history and return its server time"""
+        sent = server_time()
+        self.history.setdefault(key, deque(maxlen=HISTORY_LENGTH)).append((sent, line))
+        return sent
+
+    def history_key(self, client: FakeClient, target: str) -> str:
+        if target.startswith("#"):
+            return target
+        return " ".join(sorted((client.nick.lower(), target.lower())))
+
+    def handle_line(self, client: FakeClient, line: str) -> None:
+        if not line:
+            return
+        command, _, params = line.partition(" ")
+        handler = getattr(self, f"on_{command.lower()}", None)
+        if handler is None:
+            self.numeric(client, "421", f"{command} :Unknown command")
+        elif not client.registered and command.upper() not in (
+            "NICK", "USER", "PASS", "PING", "QUIT", "CAP", "AUTHENTICATE"
+        ):
+            self.numeric(client, "451", ":You have not registered")
+        else:
+            handler(client, params)
+
+    def on_pass(self, client: FakeClient, params: str) -> None:
+        pass
+
+    def on_nick(self, client: FakeClient, params: str) -> None:
+        nick = params.lstrip(":")
+        if nick in self.clients and self.clients[nick] is not client:
+            self.numeric(client, "433", f"{nick} :Nickname is already in use")
+            return
+        old_mask = client.mask
+        self.clients.pop(client.nick, None)
+        if client.registered:
+            line = f":{old_mask} NICK :{nick}"
+            client.send(line)
+            for channel in client.channels:
+                self.fan_out(channel, line, exclude=client)
+        client.nick = nick
+        self.clients[nick] = client
+        self.maybe_register(client)
+
+    def on_user(self, client: FakeClient, params: str) -> None:
+        client.username = params.split(" ")[0]
+        self.maybe_register(client)
+
+    def on_cap(self, client: FakeClient, params: str) -> None:
+        subcommand, _, rest = params.partition(" ")
+        match subcommand.upper():
+            case "LS":
+                client.negotiating = not client.registered
+                offered = " ".join(CAPS + ("sasl=PLAIN",))
+                client.send(f":{self.name} CAP {client.nick} LS :{offered}")
+            case "REQ":
+                requested = rest.lstrip(":").split()
+                names = {cap.lstrip("-") for cap in requested}
+                if names <= set(CAPS) | {"sasl"}:
+                    for cap in requested:
+                        if cap.startswith("-"):
+                            client.caps.discard(cap[1:])
+                        else:
+                            client.caps.add(cap)
+                    verdict = "ACK"
+                else:
+                    verdict = "NAK"
+                caps = " ".join(requested)
+                client.send(f":{self.name} CAP {client.nick} {verdict} :{caps}")
+            case "LIST":
+                caps = " ".join(sorted(client.caps))
+                client.send(f":{self.name} CAP {client.nick} LIST :{caps}")
+            case "END":
+                client.negotiating = False
+                self.maybe_register(client)
+
+    def on_authenticate(self, client: FakeClient, params: str) -> None:
+        if "sasl" not in client.caps or client.account is not None:
+            self.numeric(client, "907", ":You have already authenticated")
+        elif client.sasl_payload is None:
+            if params.upper() == "PLAIN":
+                client.sasl_payload = ""
+                client.send("AUTHENTICATE +")
+            else:
+                self.numeric(client, "908", "PLAIN :are available SASL mechanisms")
+        elif params == "*":
+            client.sasl_payload = None
+            self.numeric(client, "906", ":SASL authentication aborted")
+        else:
+            client.sasl_payload += "" if params == "+" else params
+            if len(params) < 400:
+                payload, client.sasl_payload = client.sasl_payload, None
+                self.sasl_plain(client, payload)
+
+    def sasl_plain(self, client: FakeClient, payload: str) -> None:
+        try:
+            _, account, password = (
+                base64.b64decode(payload).decode("utf-8").split("\0")
+            )
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            account, password = None, None
+        if account in self.accounts and self.accounts[account] == password:
+            client.account = account
+            self.numeric(
+                client, "900", f"{client.mask} {account} :You are now logged in"
+            )
+            self.numeric(client, "903", ":SASL authentication successful")
+        else:
+            self.numeric(client, "904", ":SASL authentication failed")
+
+    def nickserv(self, client: FakeClient, text: str) -> None:
+        command, _, password = text.lstrip(":").partition(" ")
+        if command.upper() != "IDENTIFY":
+            reply = "Unknown command"
+        elif self.accounts.get(client.nick) == password:
+            client.account = client.nick
+            reply = f"You are now identified for {client.nick}"
+        else:
+            reply = "Invalid password"
+        client.send(f":NickServ!services@{self.name} NOTICE {client.nick} :{reply}")
+
+    def maybe_register(self, client: FakeClient) -> None:
+        if (
+            client.registered
+            or client.negotiating
+            or client.nick == "*"
+            or client.username is None
+        ):
+            return
+        client.registered = True
+        self.numeric(client, "001", f":Welcome to the fake network {client.mask}")
+        self.numeric(client, "002", f":Your host is {self.name}")
+        self.numeric(client, "003", ":This server was created today")
+        self.numeric(client, "004", f"{self.name} fakeircd-1 iowx bklmnopstv")
+        self.numeric(
+            client,
+            "005",
+            "CASEMAPPING=ascii CHANTYPES=# NICKLEN=30 PREFIX=(ov)@+ "
+            f"TARGMAX=JOIN:,PRIVMSG:4,NAMES:1 CHATHISTORY={HISTORY_LIMIT} "
+            ":are supported by this server",
+        )
+        self.on_motd(client, "")
+
+    def on_motd(self, client: FakeClient, params: str) -> None:
+        self.numeric(client, "375", f":- {self.name} Message of the Day -")
+        self.numeric(client, "372", ":- This is a fake server for load testing")
+        self.numeric(client, "376", ":End of /MOTD command.")
+
+    def on_ping(self, client: FakeClient, params: str) -> None:
+        client.send(f":{self.name} PONG {self.name} {params}")
+
+    def on_pong(self, client: FakeClient, params: str) -> None:
+        pass
+
+    def on_join(self, client: FakeClient, params: str) -> None:
+        for channel in params.split(" ")[0].lstrip(":").split(","):
+            if not channel.startswith("#") or channel in client.channels:
+                continue
+            members = self.channels.setdefault(channel, set())
+            members.add(client)
+            client.channels.add(channel)
+            self.fan_out(channel, f":{client.mask} JOIN :{channel}")
+            if topic := self.topics.get(channel):
+                self.numeric(client, "332", f"{channel} :{topic}")
+            else:
+                self.numeric(client, "331", f"{channel} :No topic is set")
+            self.on_names(client, channel)
+
+    def on_part(self, client: FakeClient, params: str) -> None:
+        channel, _, reason = params.partition(" ")
+        if channel not in client.channels:
+            self.numeric(client, "442", f"{channel} :You're not on that channel")
+            return
+        self.fan_out(channel, f":{client.mask} PART {channel} {reason}".rstrip())
+        self.leave(client, channel)
+
+    def on_names(self, client: FakeClient, params: str) -> None:
+        channel = params.split(" ")[0]
+        nicks = [member.nick for member in self.channels.get(channel, ())]
+        for start in range(0, len(nicks), 50):
+            chunk = " ".join(nicks[start : start + 50])
+            self.numeric(client, "353", f"= {channel} :{chunk}")
+        self.numeric(client, "366", f"{channel} :End of /NAMES list.")
+
+    def on_list(self, client: FakeClient, params: str) -> None:
+        self.numeric(client, "321", "Channel :Users  Name")
+        for channel, members in self.channels.items():
+            topic = self.topics.get(channel, "")
+            self.numeric(client, "322", f"{channel} {len(members)} :[+nt] {topic}")
+        self.numeric(client, "323", ":End of /LIST")
+
+    def on_topic(self, client: FakeClient, params: str) -> None:
+        channel, _, topic = params.partition(" ")
+        if topic:
+            self.topics[channel] = topic.lstrip(":")
+            self.fan_out(channel, f":{client.mask} TOPIC {channel} {topic}")
+        elif current := self.topics.get(channel):
+            self.numeric(client, "332", f"{channel} :{current}")
+        else:
+            self.numeric(client, "331", f"{channel} :No topic is set")
+
+    def on_privmsg(
+        self, client: FakeClient, params: str, command: str = "PRIVMSG"
+    ) -> None:
+        targets, _, text = params.partition(" ")
+        for target in targets.split(","):
+            line = f":{client.mask} {command} {target} {text}"
+            if target.lower() == "nickserv":
+                self.nickserv(client, text)
+                continue
+            if target.startswith("#"):
+                if target not in self.channels:
+                    self.numeric(client, "403", f"{target} :No such channel")
+                    continue
+                recipients = self.channels[target] - {client}
+            elif recipient := self.clients.get(target):
+                recipients = {recipient}
+            else:
+                self.numeric(client, "401", f"{target} :No such nick/channel")
+                continue
+            # Live copies carry the same server time as the stored one
+            tags = {"time": self.remember(self.history_key(client, target), line)}
+            if "echo-message" in client.caps:
+                client.send(line, tags)
+            for recipient in recipients:
+                recipient.send(line, tags)
+
+    def on_chathistory(self, client: FakeClient, params: str) -> None:
+        subcommand, target, reference, limit = (params.split(" ") + [""] * 4)[:4]
+        subcommand = subcommand.upper()
+        timestamp = reference.removeprefix("timestamp=")
+        valid_reference = reference.startswith("timestamp=") or (
+            reference == "*" and subcommand == "LATEST"
+        )
+        if (
+            subcommand not in ("LATEST", "BEFORE", "AFTER")
+            or not limit.isdigit()
+            or not valid_reference
+        ):
+            client.send(
+                f":{self.name} FAIL CHATHISTORY INVALID_PARAMS {subcommand} "
+                ":Unsupported request"
+            )
+            return
+        limit = min(int(limit), HISTORY_LIMIT)
+        lines = list(self.history.get(self.history_key(client, target), ()))
+        match subcommand:
+            case "LATEST" if reference == "*":
+                selected = lines[-limit:]
+            case "LATEST":
+                selected = [line for line in lines if line[0] > timestamp][-limit:]
+            case "BEFORE":
+                selected = [line for line in lines if line[0] < timestamp][-limit:]
+            case "AFTER":
+                selected = [line for line in lines if line[0] > timestamp][:limit]
+        batch = f"history{next(self.batch_ids)}"
+        client.send(f":{self.name} BATCH +{batch} chathistory {target}")
+        for sent, line in selected:
+            client.send(line, {"batch": batch, "time": sent})
+        client.send(f":{self.name} BATCH -{batch}")
+
+    def on_notice(self, client: FakeClient, params: str) -> None:
+        self.on_privmsg(client, params, "NOTICE")
+
+    def on_quit(self, client: FakeClient, params: str) -> None:
+        client.send(f"ERROR :Closing Link: {client.host} (Quit)")
+        self.quit(client, params.lstrip(":") or "Client Quit")
+        client.writer.close()
+
+    def quit(self, client: FakeClient, reason: str) -> None:
+        if self.clients.get(client.nick) is not client:
+            return
+        del self.clients[client.nick]
+        line = f":{client.mask} QUIT :{reason}"
+        notified = set()
+        for channel in list(client.channels):
+            for member in self.channels.get(channel, ()):
+                if member is not client and member not in notified:
+                    member.send(line)
+                    notified.add(member)
+            self.leave(client, channel)
+
+    def leave(self, client: FakeClient, channel: str) -> None:
+        client.channels.discard(channel)
+        members = self.channels.get(channel, set())
+        members.discard(client)
+        if not members:
+            self.channels.pop(channel, None)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = FakeIrcServer(
+        chatter_rate=args.chatter_rate,
+        chatter_channel=args.channel,
+        ping_interval=args.ping_interval,
+        accounts=dict(account.split(":", 1) for account in args.account),
+    )
+    ssl_context = None
+    if args.tls_cert:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.tls_cert, args.tls_key)
+    await server.start(args.host, args.port, ssl_context)
+    print(f"fakeircd listening on {args.host}:{server.port}")
+    await server.server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6667)
+    parser.add_argument("--chatter-rate", type=float, default=0.0)
+    parser.add_argument("--channel", default="#main_chat")
+    parser.add_argument("--ping-interval", type=float, default=30.0)
+    parser.add_argument("--tls-cert", help="serve TLS with this PEM certificate")
+    parser.add_argument("--tls-key", help="private key for --tls-cert")
+    parser.add_argument(
+        "--account",
+        action="append",
+        default=[],
+        metavar="NAME:PASSWORD",
+        help="an account for SASL PLAIN and NickServ IDENTIFY (repeatable)",
+    )
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
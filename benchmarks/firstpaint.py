@@ -0,0 +1,85 @@
+"""Measure the server-side cost of painting a route
+
+    python -m benchmarks.firstpaint --iterations 200
+
+Drives main.show_route on a real flet Page whose connection records the
+commands that would go over the websocket, and reports the time from the route
+change to the update being sent, plus its payload, with and without the
+per-page view cache. Also times the rules.txt read with and without the asset
+cache, and building the ChatView control tree (which is not mounted here, as
+mounting starts an IRC session).
+"""
+import argparse
+import time
+
+from flet_core.page import Page
+
+from benchmarks.recording import RecordingConnection
+from benchmarks.replay import percentile
+from helpers.assets import assets
+from main import show_route
+from views.chat import ChatView
+from views.home import RULES_PATH
+
+
+def navigate(iterations: int, cached: bool) -> dict[str, float]:
+    conn = RecordingConnection()
+    page = Page(conn, "bench", loop=None)
+    views = {}
+    timings = []
+    payload = 0
+    for _ in range(iterations):
+        if not cached:
+            views = {}
+        # A route change away and back, e.g. a closed dialog or a browser back
+        page.route = "/"
+        before = conn.payload_bytes
+        start = time.perf_counter()
+        show_route(page, views)
+        timings.append(time.perf_counter() - start)
+        payload += conn.payload_bytes - before
+    timings.sort()
+    return {
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "payload_bytes": payload / iterations,
+    }
+
+
+def time_call(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def read_uncached() -> str:
+    with open(RULES_PATH) as f:
+        return f.read()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'route /':<16}{'p50 ms':>9}{'p99 ms':>9}{'payload B':>11}")
+    for name, cached in (("rebuild", False), ("cached", True)):
+        result = navigate(args.iterations, cached)
+        print(
+            f"{name:<16}{result['p50_ms']:>9.3f}{result['p99_ms']:>9.3f}"
+            f"{result['payload_bytes']:>11.0f}"
+        )
+
+    print(f"\n{'rules.txt':<16}{'ms':>9}")
+    print(f"{'open/read':<16}{time_call(read_uncached, args.iterations):>9.4f}")
+    assets.read_text(RULES_PATH)
+    cached_read = time_call(lambda: assets.read_text(RULES_PATH), args.iterations)
+    print(f"{'asset cache':<16}{cached_read:>9.4f}")
+
+    build = time_call(lambda: ChatView()._build_add_commands(), args.iterations)
+    print(f"\nChatView build {build:.3f} ms per construction")
+
+
+if __name__ == "__main__":
+    main()
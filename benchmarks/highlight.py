@@ -0,0 +1,61 @@
+"""Compare highlight matching cost as the number of watch words grows
+
+    python -m benchmarks.highlight --words 1,10,100,1000
+
+Matches the privmsg corpus against the user's nick plus N generated watch
+words, once with the Aho-Corasick HighlightRules and once with one
+word-boundary regex per rule, the obvious alternative.
+"""
+import argparse
+import random
+import re
+import time
+
+from benchmarks import corpora
+from helpers.highlight import HighlightRules
+
+
+class RegexRules:
+    def __init__(self, nick: str, words: list[str]) -> None:
+        self.patterns = [
+            re.compile(rf"(?<!\w){re.escape(word)}(?!\w)", re.IGNORECASE)
+            for word in [nick, *words]
+        ]
+
+    def matches(self, text: str) -> bool:
+        return any(pattern.search(text) for pattern in self.patterns)
+
+
+def watch_words(count: int) -> list[str]:
+    rng = random.Random(5)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(4, 10))) for _ in range(count)]
+
+
+def run(rules, texts: list[str]) -> tuple[float, int]:
+    start = time.perf_counter()
+    hits = sum(rules.matches(text) for text in texts)
+    return (time.perf_counter() - start) / len(texts), hits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", default="1,10,100,1000")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    texts = [
+        raw.rstrip("\r\n").split(" :", 1)[1]
+        for raw in corpora.privmsg_stream(args.messages)
+    ]
+    print(f"{'words':>6}{'automaton us':>14}{'regex us':>10}{'hits':>7}")
+    for count in map(int, args.words.split(",")):
+        words = watch_words(count) + ["gecko"]
+        automaton, hits = run(HighlightRules(corpora.NICK, words), texts)
+        regex, regex_hits = run(RegexRules(corpora.NICK, words), texts)
+        assert hits == regex_hits
+        print(f"{count:>6}{automaton * 1e6:>14.2f}{regex * 1e6:>10.2f}{hits:>7}")
+
+
+if __name__ == "__main__":
+    main()
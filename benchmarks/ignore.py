@@ -0,0 +1,80 @@
+"""Time a spam wave through the view with and without the spammers ignored
+
+    python -m benchmarks.ignore --spammers 50 --masks 1,100,1000
+
+Replays a channel where most lines come from a few spammers, the way the
+reactor feeds a page: each raw line is checked against the IgnoreList, then
+parsed, handled and rendered. The spammers are ignored by nick, next to N
+unrelated wildcard masks, and compared with showing every line.
+"""
+import argparse
+import random
+import time
+
+from benchmarks import corpora
+from benchmarks.replay import make_view, percentile
+from helpers.memory import memory_budget
+from irc.client import IrcMessage
+
+
+def spam_wave(count: int, spammers: list[str], share: float) -> list[str]:
+    rng = random.Random(7)
+    wave = []
+    for raw in corpora.privmsg_stream(count):
+        if rng.random() < share:
+            nick = rng.choice(spammers)
+            raw = f":{corpora.user_mask(nick)} PRIVMSG {corpora.CHANNEL} :BUY NOW\r\n"
+        wave.append(raw)
+    return wave
+
+
+def replay(lines: list[str], masks: list[str]) -> tuple[list[int], int]:
+    view = make_view()
+    irc_client = view.irc_client
+    ignores = irc_client.client.ignores
+    for mask in masks:
+        ignores.add(mask, ["privmsg"])
+    latencies = []
+    dropped = 0
+    for raw in lines:
+        start = time.perf_counter_ns()
+        if ignores and ignores.drops(raw):
+            dropped += 1
+        else:
+            irc_client.current_buf_changed = False
+            irc_client.handle_message(IrcMessage.from_raw(raw))
+            if irc_client.current_buf_changed:
+                view.page.update()
+        latencies.append(time.perf_counter_ns() - start)
+    memory_budget.forget(view)
+    latencies.sort()
+    return latencies, dropped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spammers", type=int, default=50)
+    parser.add_argument("--masks", default="1,100,1000")
+    parser.add_argument("--share", type=float, default=0.9)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    spammers = [f"spam{i}" for i in range(args.spammers)]
+    lines = spam_wave(args.messages, spammers, args.share)
+    runs = {"shown": []}
+    for count in map(int, args.masks.split(",")):
+        runs[f"{count} masks"] = spammers + [
+            f"*!*@*.spamhost{i}.net" for i in range(count)
+        ]
+    print(f"{'ignoring':<12}{'dropped':>9}{'wave ms':>9}{'p50 us':>9}{'p99 us':>9}")
+    for name, masks in runs.items():
+        latencies, dropped = replay(lines, masks)
+        print(
+            f"{name:<12}{dropped:>9}{sum(latencies) / 1e6:>9.1f}"
+            f"{percentile(latencies, 50) / 1000:>9.1f}"
+            f"{percentile(latencies, 99) / 1000:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Drive N headless chat sessions against a local fake IRC server
+
+    python -m benchmarks.loadgen --sessions 10,50,100,200 --chatter-rate 20
+
+Each session is a real ChatView/ViewIrcClient pair on a stub page, connected
+over TCP to benchmarks.fakeircd running in a child process and read by the
+shared irc.reactor thread, as in the web app. For every step the
+driver reports worker CPU, resident memory, event-loop lag and delivery latency
+of the server's timestamped chatter lines.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import socket
+import time
+
+from benchmarks import fakeircd
+from benchmarks.replay import make_view, percentile
+from irc.reactor import reactor
+
+
+def run_server(port: int, chatter_rate: float, channel: str) -> None:
+    async def serve() -> None:
+        server = fakeircd.FakeIrcServer(
+            chatter_rate=chatter_rate, chatter_channel=channel
+        )
+        await server.start("127.0.0.1", port)
+        await server.server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"fakeircd did not start on port {port}")
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Session:
+    def __init__(self, index: int, latencies: list[int]) -> None:
+        self.view = make_view(f"load{index}", offline=False)
+        self.irc_client = self.view.irc_client
+        self.latencies = latencies
+        self.ready = asyncio.Event()
+        self.running = True
+
+    def connect(self, port: int, channel: str) -> None:
+        self.irc_client.client.connect("127.0.0.1", port)
+        self.irc_client.client.join(channel)
+
+    def attach(self) -> None:
+        loop = asyncio.get_running_loop()
+        reactor.register(
+            self.irc_client.client, lambda: loop.call_soon_threadsafe(self.ready.set)
+        )
+
+    async def listen(self) -> None:
+        irc_client = self.irc_client
+        while self.running:
+            await self.ready.wait()
+            self.ready.clear()
+            irc_client.current_buf_changed = False
+            for message in irc_client.client.get_all_messages():
+                irc_client.handle_message(message)
+                if message.command == "PRIVMSG" and " ts=" in message.params:
+                    sent = int(message.params.rsplit("ts=", 1)[1])
+                    self.latencies.append(time.time_ns() - sent)
+            if irc_client.current_buf_changed:
+                self.view.page.update()
+
+    def close(self) -> None:
+        self.running = False
+        self.ready.set()
+        self.irc_client.client.disconnect()
+
+
+async def measure_lag(interval: float, lags: list[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - expected)
+
+
+async def run_step(count: int, args: argparse.Namespace) -> dict[str, float]:
+    latencies = []
+    sessions = [Session(i, latencies) for i in range(count)]
+    for session in sessions:
+        await asyncio.to_thread(session.connect, args.port, args.channel)
+        session.attach()
+    tasks = [asyncio.create_task(session.listen()) for session in sessions]
+    await asyncio.sleep(args.warmup)
+
+    latencies.clear()
+    lags = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(0.05, lags, stop))
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    stop.set()
+    await lag_task
+
+    memory = rss_bytes()
+    for session in sessions:
+        session.close()
+    await asyncio.gather(*tasks)
+
+    latencies.sort()
+    lags.sort()
+    return {
+        "sessions": count,
+        "cpu_percent": 100 * cpu / wall,
+        "rss_mib": memory / 2**20,
+        "lag_p99_ms": percentile(lags, 99) * 1000 if lags else 0.0,
+        "delivered": len(latencies),
+        "latency_p50_ms": percentile(latencies, 50) / 1e6 if latencies else 0.0,
+        "latency_p99_ms": percentile(latencies, 99) / 1e6 if latencies else 0.0,
+    }
+
+
+async def drive(args: argparse.Namespace) -> None:
+    print(
+        f"{'sessions':>9}{'cpu %':>8}{'rss MiB':>9}{'lag p99':>9}"
+        f"{'lines':>9}{'p50 ms':>9}{'p99 ms':>9}"
+    )
+    for count in args.sessions:
+        result = await run_step(count, args)
+        print(
+            f"{result['sessions']:>9}{result['cpu_percent']:>8.1f}"
+            f"{result['rss_mib']:>9.1f}{result['lag_p99_ms']:>9.1f}"
+            f"{result['delivered']:>9}{result['latency_p50_ms']:>9.1f}"
+            f"{result['latency_p99_ms']:>9.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sessions",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=[10, 50, 100],
+    )
+    parser.add_argument("--chatter-rate", type=float, default=10.0)
+    parser.add_argument("--channel", default="#main_chat")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    args.port = args.port or free_port()
+    server = multiprocessing.Process(
+        target=run_server,
+        args=(args.port, args.chatter_rate, args.channel),
+        daemon=True,
+    )
+    server.start()
+    try:
+        wait_for_server(args.port)
+        asyncio.run(drive(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Time message handling during a flood of logged lines on a slow log sink
+
+    python -m benchmarks.logflood --messages 20000 --stall-ms 0.2
+
+Replays unhandled numerics, each of which is logged, through SessionState
+while the log stream stalls on every write the way stderr does under
+journald backpressure. Compares writing records synchronously (what print()
+did) with the queued, rate-limited log pipeline.
+"""
+import argparse
+import io
+import logging
+import time
+
+from benchmarks import corpora
+from benchmarks.replay import StubSocket, percentile
+from helpers.logs import JsonFormatter, log_pipeline
+from irc.client import IrcBaseClient, IrcMessage
+from irc.state import SessionState
+
+
+class StallingStream(io.StringIO):
+    def __init__(self, stall: float) -> None:
+        super().__init__()
+        self.stall = stall
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        time.sleep(self.stall)
+        self.lines += text.count("\n")
+        return len(text)
+
+
+def flood(count: int) -> list[str]:
+    return [
+        f":{corpora.SERVER} 999 {corpora.NICK} :flood line {i}\r\n"
+        for i in range(count)
+    ]
+
+
+def replay(lines: list[str]) -> list[int]:
+    client = IrcBaseClient(corpora.NICK, "lizardchat-web")
+    client.socket = StubSocket()
+    client.connected = True
+    state = SessionState(client)
+    latencies = []
+    for raw in lines:
+        start = time.perf_counter_ns()
+        state.process(IrcMessage.from_raw(raw))
+        latencies.append(time.perf_counter_ns() - start)
+    latencies.sort()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--stall-ms", type=float, default=0.2)
+    args = parser.parse_args()
+
+    lines = flood(args.messages)
+    root = logging.getLogger("lizardchat")
+    print(f"{'logging':<10}{'wave ms':>9}{'p50 us':>9}{'p99 us':>9}{'written':>9}")
+    for mode in ("sync", "pipeline"):
+        stream = StallingStream(args.stall_ms / 1000)
+        if mode == "sync":
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(JsonFormatter())
+            root.setLevel(logging.INFO)
+            root.addHandler(handler)
+            latencies = replay(lines)
+            root.removeHandler(handler)
+        else:
+            log_pipeline.start(stream=stream)
+            latencies = replay(lines)
+            log_pipeline.stop()
+        print(
+            f"{mode:<10}{sum(latencies) / 1e6:>9.1f}"
+            f"{percentile(latencies, 50) / 1000:>9.1f}"
+            f"{percentile(latencies, 99) / 1000:>9.1f}{stream.lines:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
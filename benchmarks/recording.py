@@ -0,0 +1,28 @@
+"""A flet connection that records what a page would send over the websocket"""
+import json
+
+from flet_core.connection import Connection
+from flet_core.protocol import CommandEncoder, PageCommandsBatchResponsePayload
+
+
+class RecordingConnection(Connection):
+    def __init__(self) -> None:
+        super().__init__()
+        self.next_id = 0
+        self.payload_bytes = 0
+
+    def send_commands(
+        self, session_id: str, commands: list
+    ) -> PageCommandsBatchResponsePayload:
+        self.payload_bytes += len(
+            json.dumps(commands, cls=CommandEncoder, separators=(",", ":"))
+        )
+        results = []
+        for command in commands:
+            if command.name == "add":
+                ids = []
+                for _ in command.commands:
+                    self.next_id += 1
+                    ids.append(f"_{self.next_id}")
+                results.append(" ".join(ids))
+        return PageCommandsBatchResponsePayload(results=results, error="")
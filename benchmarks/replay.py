@@ -0,0 +1,278 @@
+"""Replay IRC traffic corpora through the protocol, state and view layers
+
+Run from the repository root:
+
+    python -m benchmarks.replay
+    python -m benchmarks.replay --stage protocol --corpus names_5000
+    python -m benchmarks.replay --update-baselines
+
+The state stage runs the headless SessionState engine only. The view stage
+renders into real Flet controls attached to a stub page, so no browser or
+network connection is needed. page.update() is counted but not serialized.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks import corpora
+from helpers.memory import memory_budget
+from irc.client import IrcBaseClient, IrcMessage
+from irc.state import SessionState
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+# p99 growth below this many microseconds is run-to-run noise on a shared VM
+LATENCY_SLACK_US = 50
+# Small corpora are replayed more often so a single pause can't decide a run
+MIN_SAMPLED_MESSAGES = 2000
+
+
+class StubSession:
+    def __init__(self, **values) -> None:
+        self.values = values
+
+    def get(self, key: str):
+        return self.values.get(key)
+
+    def set(self, key: str, value) -> None:
+        self.values[key] = value
+
+
+class StubPage:
+    def __init__(self, nick: str = corpora.NICK) -> None:
+        self.session = StubSession(
+            nickname=nick, username="lizardchat-web", password=None
+        )
+        self.client_ip = "127.0.0.1"
+        self.route = "/chat"
+        self.updates = 0
+
+    def update(self, *controls) -> None:
+        self.updates += 1
+
+    def run_task(self, handler, *args) -> None:
+        pass
+
+    def go(self, route: str) -> None:
+        self.route = route
+
+    def show_dialog(self, dialog) -> None:
+        pass
+
+    def close_dialog(self) -> None:
+        pass
+
+
+class StubSocket:
+    def __init__(self) -> None:
+        self.sent = 0
+
+    def send(self, data: bytes) -> int:
+        self.sent += len(data)
+        return len(data)
+
+    def shutdown(self, how: int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def make_view(nick: str = corpora.NICK, offline: bool = True):
+    from views.chat import ChatView
+    from views.viewirc import ViewIrcClient
+
+    view = ChatView()
+    view.page = StubPage(nick)
+    view.irc_client = ViewIrcClient(view)
+    if offline:
+        view.irc_client.client.socket = StubSocket()
+        view.irc_client.client.connected = True
+    view.add_buffer("<server>")
+    view.add_buffer(corpora.CHANNEL)
+    view.set_active_buffer(corpora.CHANNEL)
+    return view
+
+
+def replay_protocol(lines: list[str]) -> list[int]:
+    latencies = []
+    for raw in lines:
+        start = time.perf_counter_ns()
+        IrcMessage.from_raw(raw)
+        latencies.append(time.perf_counter_ns() - start)
+    return latencies
+
+
+def replay_state(lines: list[str]) -> list[int]:
+    client = IrcBaseClient(corpora.NICK, "lizardchat-web")
+    client.socket = StubSocket()
+    client.connected = True
+    state = SessionState(client)
+    latencies = []
+    for raw in lines:
+        start = time.perf_counter_ns()
+        state.process(IrcMessage.from_raw(raw))
+        latencies.append(time.perf_counter_ns() - start)
+    return latencies
+
+
+def replay_view(lines: list[str]) -> list[int]:
+    view = make_view()
+    irc_client = view.irc_client
+    latencies = []
+    for raw in lines:
+        start = time.perf_counter_ns()
+        irc_client.current_buf_changed = False
+        irc_client.handle_message(IrcMessage.from_raw(raw))
+        if irc_client.current_buf_changed:
+            view.page.update()
+        latencies.append(time.perf_counter_ns() - start)
+    memory_budget.forget(view)
+    return latencies
+
+
+STAGES = {"protocol": replay_protocol, "state": replay_state, "view": replay_view}
+
+
+def percentile(values: list[int], p: float) -> int:
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def calibrate(repeat: int) -> float:
+    """Seconds a fixed stdlib workload takes right now, best of repeat"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        " ".join(str(i) for i in range(100_000)).split(" ")
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(stage: str, lines: list[str], repeat: int = 1) -> dict[str, float]:
+    """Timings are the best of repeat runs (more for small corpora), which
+    keeps scheduler noise on a shared machine out of the regression check"""
+    calibration = calibrate(repeat)
+    replay = STAGES[stage]
+    runs = max(repeat, -(-MIN_SAMPLED_MESSAGES // len(lines)))
+    runs = [sorted(replay(lines)) for _ in range(runs)]
+    calibration = min(calibration, calibrate(repeat))
+    elapsed = min(sum(latencies) for latencies in runs) / 1e9
+
+    tracemalloc.start()
+    replay(lines)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "messages": len(lines),
+        "throughput": len(lines) / elapsed,
+        "p50_us": min(percentile(latencies, 50) for latencies in runs) / 1000,
+        "p99_us": min(percentile(latencies, 99) for latencies in runs) / 1000,
+        "peak_kib": peak / 1024,
+        "calibration": calibration,
+    }
+
+
+def regressions(
+    result: dict[str, float], baseline: dict[str, float], tolerance: float
+) -> list[str]:
+    # Loosen the tolerance by how much slower the machine runs now than when
+    # the baseline was recorded (CPU frequency, noisy neighbours), never tighten
+    slowdown = result["calibration"] / baseline.get(
+        "calibration", result["calibration"]
+    )
+    allowed = tolerance * max(1.0, slowdown)
+    failures = []
+    if result["throughput"] * allowed < baseline["throughput"]:
+        failures.append(
+            f"throughput {result['throughput']:.0f}/s "
+            f"(baseline {baseline['throughput']:.0f}/s)"
+        )
+    if result["p99_us"] > baseline["p99_us"] * allowed + LATENCY_SLACK_US:
+        failures.append(
+            f"p99_us {result['p99_us']:.1f} (baseline {baseline['p99_us']:.1f})"
+        )
+    if result["peak_kib"] > baseline["peak_kib"] * tolerance:
+        failures.append(
+            f"peak_kib {result['peak_kib']:.1f} (baseline {baseline['peak_kib']:.1f})"
+        )
+    return failures
+
+
+def machine() -> dict[str, str | int]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def load_baselines() -> dict:
+    try:
+        with open(BASELINES_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", action="append", choices=sorted(corpora.CORPORA))
+    parser.add_argument("--stage", action="append", choices=sorted(STAGES))
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update-baselines", action="store_true")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    failed = False
+    # Timings only compare on the machine the baselines were recorded on
+    recorded = baselines.get("machine", {})
+    if not args.update_baselines and recorded:
+        if {key: recorded.get(key) for key in machine()} != machine():
+            print(
+                f"Note: baselines were recorded on {recorded.get('processor')} "
+                f"({recorded.get('cpus')} CPUs, Python {recorded.get('python')}); "
+                "timings from this machine may not compare"
+            )
+    print(
+        f"{'benchmark':<28}{'msgs':>8}{'msg/s':>12}"
+        f"{'p50 us':>10}{'p99 us':>10}{'peak KiB':>11}"
+    )
+    for corpus_name in args.corpus or corpora.CORPORA:
+        lines = corpora.CORPORA[corpus_name]()
+        for stage in args.stage or STAGES:
+            key = f"{corpus_name}/{stage}"
+            result = measure(stage, lines, args.repeat)
+            print(
+                f"{key:<28}{result['messages']:>8}{result['throughput']:>12.0f}"
+                f"{result['p50_us']:>10.1f}{result['p99_us']:>10.1f}"
+                f"{result['peak_kib']:>11.0f}"
+            )
+            if args.update_baselines:
+                baselines[key] = result
+            elif key in baselines:
+                for failure in regressions(result, baselines[key], args.tolerance):
+                    print(f"  REGRESSION {key}: {failure}")
+                    failed = True
+
+    if args.update_baselines:
+        baselines["machine"] = {
+            **machine(),
+            "tolerance": args.tolerance,
+            "repeat": args.repeat,
+            "recorded": datetime.date.today().isoformat(),
+        }
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baselines written to {BASELINES_PATH}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
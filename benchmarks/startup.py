@@ -0,0 +1,79 @@
+"""Time a cold worker from its first import to the first rendered views
+
+    python -m benchmarks.startup --runs 10
+
+Each run is a fresh interpreter that imports main, routes "/" on a flet Page
+whose connection records the websocket commands (benchmarks.recording),
+and then builds the ChatView control tree the first /chat visit would send.
+Times are from the start of the import. "eager" imports views.chat and the IRC
+stack up front, the way main used to; "lazy" leaves it to the first /chat.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+STAGES = ("import", "home", "chat")
+
+
+def child(eager: bool) -> None:
+    start = time.perf_counter()
+    if eager:
+        import views.chat
+    import main
+    imported = time.perf_counter()
+
+    from flet_core.page import Page
+
+    from benchmarks.recording import RecordingConnection
+
+    page = Page(RecordingConnection(), "bench", loop=None)
+    page.route = "/"
+    main.show_route(page, {})
+    home = time.perf_counter()
+
+    from views.chat import ChatView
+
+    ChatView()._build_add_commands()
+    chat = time.perf_counter()
+    timings = (imported - start, home - start, chat - start)
+    print(json.dumps(dict(zip(STAGES, timings))))
+
+
+def run(eager: bool) -> dict[str, float]:
+    command = [sys.executable, "-m", "benchmarks.startup", "--child"]
+    if eager:
+        command.append("--eager")
+    output = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.eager)
+        return
+
+    modes = {"eager": True, "lazy": False}
+    # Alternate the modes so drift in machine load hits both alike
+    runs = {name: [] for name in modes}
+    for _ in range(args.runs):
+        for name, eager in modes.items():
+            runs[name].append(run(eager))
+    print(f"{'median ms':<10}{'import':>9}{'HomeView':>10}{'ChatView':>10}")
+    for name, results in runs.items():
+        medians = [statistics.median(r[stage] for r in results) for stage in STAGES]
+        print(
+            f"{name:<10}{medians[0] * 1e3:>9.1f}{medians[1] * 1e3:>10.1f}"
+            f"{medians[2] * 1e3:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Measure login time-to-ready against a local fakeircd behind a latency proxy
+
+    python -m benchmarks.timetoready --rtt 20 --runs 20
+
+Ready means the autojoin channel's NAMES list has arrived and, when a password
+is given, the account is identified. Three logins are compared:
+
+    legacy  NICK/USER, then JOIN and NickServ IDENTIFY once registered
+    cold    CAP LS 302 and SASL PLAIN with nothing cached about the server
+    warm    the same, with CAP REQ pipelined from the cached CAP LS reply
+
+The proxy delays every chunk by half the RTT in each direction, so the numbers
+are dominated by the round trips each login needs.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from benchmarks import fakeircd
+from benchmarks.loadgen import free_port, wait_for_server
+from benchmarks.replay import percentile
+from irc.caps import cap_cache
+from irc.client import IrcBaseClient
+
+CHANNEL = "#main_chat"
+PASSWORD = "hunter2"
+
+
+async def pipe(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, delay: float
+) -> None:
+    loop = asyncio.get_running_loop()
+    while data := await reader.read(65536):
+        loop.call_later(delay, writer.write, data)
+    loop.call_later(delay, writer.close)
+
+
+def run_server(port: int, proxy_port: int, rtt: float, nicks: list[str]) -> None:
+    async def proxy(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        upstream_reader, upstream_writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        await asyncio.gather(
+            pipe(reader, upstream_writer, rtt / 2),
+            pipe(upstream_reader, writer, rtt / 2),
+            return_exceptions=True,
+        )
+
+    async def serve() -> None:
+        server = fakeircd.FakeIrcServer(
+            accounts={nick: PASSWORD for nick in nicks}
+        )
+        await server.start("127.0.0.1", port)
+        proxy_server = await asyncio.start_server(proxy, "127.0.0.1", proxy_port)
+        await proxy_server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def login(
+    mode: str, nick: str, port: int, password: str | None
+) -> tuple[float, float]:
+    """Seconds until joined and until ready (joined and identified)"""
+    if mode == "cold":
+        cap_cache.offered.clear()
+    client = IrcBaseClient(nick, nick, password)
+    start = time.perf_counter()
+    if mode == "legacy":
+        client.connect("127.0.0.1", port, negotiate=False)
+        client.join_channels([CHANNEL])
+        if password:
+            client.send_private_message("NickServ", f"IDENTIFY {password}")
+    else:
+        client.connect("127.0.0.1", port, autojoin=[CHANNEL])
+    joined = None
+    identified = not password or client.sasl_authenticated
+    while joined is None or not identified:
+        message = client.get_message(timeout=5)
+        if message is None:
+            continue
+        if message.command == "366":
+            joined = time.perf_counter() - start
+        elif message.command == "NOTICE" and "identified" in message.params:
+            identified = True
+    ready = time.perf_counter() - start
+    client.disconnect()
+    return joined, ready
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rtt", type=float, default=20.0, help="milliseconds")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    port = args.port or free_port()
+    proxy_port = free_port()
+    modes = ("legacy", "cold", "warm")
+    runs = []
+    for password in (None, PASSWORD):
+        for mode in modes:
+            for _ in range(args.runs):
+                runs.append((mode, password, f"ready{len(runs)}"))
+    server = multiprocessing.Process(
+        target=run_server,
+        args=(port, proxy_port, args.rtt / 1000, [nick for *_, nick in runs]),
+        daemon=True,
+    )
+    server.start()
+    try:
+        wait_for_server(proxy_port)
+        results = {}
+        for mode, password, nick in runs:
+            timings = results.setdefault((mode, password), ([], []))
+            joined, ready = login(mode, nick, proxy_port, password)
+            timings[0].append(joined)
+            timings[1].append(ready)
+        print(
+            f"{'login':<8}{'password':>10}{'joined ms':>11}{'ready ms':>10}"
+            f"{'RTTs':>6}"
+        )
+        for (mode, password), (joined, ready) in results.items():
+            joined.sort()
+            ready.sort()
+            print(
+                f"{mode:<8}{'yes' if password else 'no':>10}"
+                f"{percentile(joined, 50) * 1000:>11.1f}"
+                f"{percentile(ready, 50) * 1000:>10.1f}"
+                f"{percentile(ready, 50) * 1000 / args.rtt:>6.1f}"
+            )
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Compare full and resumed TLS handshakes against a local fakeircd
+
+    python -m benchmarks.tlshandshake --connections 200
+
+Generates a throwaway self-signed certificate with the openssl CLI, serves
+benchmarks.fakeircd over TLS in a child process and connects through
+irc.tls.TlsSessionCache, once without a cached session and once reusing it.
+Each connection registers so the server's TLS 1.3 session ticket is received,
+as it is for real clients.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import ssl
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import fakeircd
+from benchmarks.loadgen import free_port, wait_for_server
+from benchmarks.replay import percentile
+from irc.tls import TlsSessionCache
+
+HOSTNAME = "localhost"
+
+
+def make_certificate(directory: Path) -> tuple[str, str]:
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", f"/CN={HOSTNAME}",
+            "-addext", f"subjectAltName=DNS:{HOSTNAME},IP:127.0.0.1",
+            "-keyout", str(key), "-out", str(cert),
+        ],
+        check=True,
+        capture_output=True,
+    )  # fmt: skip
+    return str(cert), str(key)
+
+
+def run_server(port: int, cert: str, key: str) -> None:
+    async def serve() -> None:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+        server = fakeircd.FakeIrcServer()
+        await server.start("127.0.0.1", port, context)
+        await server.server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def register(tls_socket: ssl.SSLSocket, nick: str) -> None:
+    tls_socket.sendall(f"NICK {nick}\r\nUSER {nick} 0 * :{nick}\r\n".encode())
+    received = b""
+    while b" 001 " not in received:
+        data = tls_socket.recv(4096)
+        if not data:
+            raise ConnectionError("fakeircd closed the connection")
+        received += data
+
+
+def handshakes(
+    cache: TlsSessionCache, port: int, count: int, resume: bool
+) -> tuple[list[float], int]:
+    timings = []
+    reused = 0
+    for i in range(count):
+        if not resume:
+            cache.forget(HOSTNAME, port)
+        sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+        start = time.perf_counter()
+        tls_socket = cache.wrap(sock, HOSTNAME, port)
+        timings.append(time.perf_counter() - start)
+        reused += tls_socket.session_reused
+        register(tls_socket, f"tls{i}")
+        cache.remember(HOSTNAME, port, tls_socket)
+        tls_socket.sendall(b"QUIT :done\r\n")
+        while tls_socket.recv(4096):
+            pass
+        tls_socket.close()
+    timings.sort()
+    return timings, reused
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    port = args.port or free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = make_certificate(Path(directory))
+        server = multiprocessing.Process(
+            target=run_server, args=(port, cert, key), daemon=True
+        )
+        server.start()
+        try:
+            wait_for_server(port)
+            cache = TlsSessionCache(cafile=cert)
+            # Warm up the context and get a first ticket
+            handshakes(cache, port, 5, resume=True)
+            print(f"{'handshake':<10}{'p50 ms':>9}{'p99 ms':>9}{'resumed':>9}")
+            for name, resume in (("full", False), ("resumed", True)):
+                timings, reused = handshakes(cache, port, args.connections, resume)
+                print(
+                    f"{name:<10}{percentile(timings, 50) * 1000:>9.2f}"
+                    f"{percentile(timings, 99) * 1000:>9.2f}"
+                    f"{reused:>5}/{len(timings)}"
+                )
+        finally:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
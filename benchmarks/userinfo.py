@@ -0,0 +1,68 @@
+"""Count the WHOIS requests many sessions send when opening user cards
+
+    python -m benchmarks.userinfo --sessions 100 --nicks 500 --rounds 20
+
+Every round, each session opens the card of one nick, with popular nicks
+picked more often, and the WHOIS replies for that round arrive afterwards,
+so lookups of the same nick within a round overlap. Compares the clicks with
+the WHOIS requests actually sent through the shared user info cache.
+"""
+import argparse
+import random
+import time
+
+from benchmarks import corpora
+from benchmarks.channellist import make_state
+from irc.client import IrcMessage
+from irc.userinfo import user_info
+
+
+def whois_reply(nick: str) -> list[str]:
+    mask = corpora.user_mask(nick)
+    username, host = mask.split("!", 1)[1].split("@")
+    prefix = f":{corpora.SERVER}"
+    return [
+        f"{prefix} 311 {corpora.NICK} {nick} {username} {host} * :{nick} Lizard",
+        f"{prefix} 312 {corpora.NICK} {nick} {corpora.SERVER} :Lizard",
+        f"{prefix} 317 {corpora.NICK} {nick} 42 1700000000 :seconds idle",
+        f"{prefix} 319 {corpora.NICK} {nick} :@{corpora.CHANNEL}",
+        f"{prefix} 318 {corpora.NICK} {nick} :End of /WHOIS list.",
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--nicks", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(8)
+    nicks = [nick.lstrip("@%+") for nick in corpora.nicks(args.nicks, seed=8)]
+    weights = [1 / (rank + 1) for rank in range(len(nicks))]
+    states = [make_state(f"viewer{i}") for i in range(args.sessions)]
+    sent = []
+    for state in states:
+        state.client.whois = lambda nick, state=state: sent.append((state, nick))
+
+    clicks = answered = 0
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for state in states:
+            nick = rng.choices(nicks, weights)[0]
+            state.lookup_user(nick, lambda info: None)
+            clicks += 1
+        for state, nick in sent[answered:]:
+            for raw in whois_reply(nick):
+                state.process(IrcMessage.from_raw(raw))
+        answered = len(sent)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'cards opened':<20}{clicks:>8}")
+    print(f"{'WHOIS sent':<20}{len(sent):>8}")
+    print(f"{'answered from cache':<20}{user_info.hits:>8}")
+    print(f"{'us per card':<20}{elapsed / clicks * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import os
+import threading
+
+
+class AssetCache:
+    """Process-wide cache of small text files, re-read when their mtime changes"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.files: dict[str, tuple[int, str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def read_text(self, path: str) -> str:
+        mtime = os.stat(path).st_mtime_ns
+        cached = self.files.get(path)
+        if cached is not None and cached[0] == mtime:
+            self.hits += 1
+            return cached[1]
+        with open(path) as f:
+            text = f.read()
+        with self.lock:
+            self.files[path] = (mtime, text)
+            self.misses += 1
+        return text
+
+    def preload(self, directory: str) -> int:
+        """Read every file in directory into the cache, returning how many"""
+        paths = [entry.path for entry in os.scandir(directory) if entry.is_file()]
+        for path in paths:
+            self.read_text(path)
+        return len(paths)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.files.clear()
+
+
+assets = AssetCache()
@@ -0,0 +1,148 @@
+import ipaddress
+import logging
+import os
+import threading
+import time
+
+from helpers import config
+
+log = logging.getLogger("lizardchat.bans")
+
+IpNetwork = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+IPV4_MAPPED = ipaddress.IPv6Network("::ffff:0:0/96")
+
+
+def parse_network(entry: str) -> IpNetwork:
+    """Address or CIDR range, with IPv4-mapped IPv6 ranges stored as IPv4
+
+    Dual-stack listeners report IPv4 clients as ::ffff:a.b.c.d and match()
+    looks those up as IPv4, so bans have to be stored the same way.
+    """
+    network = ipaddress.ip_network(entry, strict=False)
+    if network.version == 6 and network.subnet_of(IPV4_MAPPED):
+        address = network.network_address.ipv4_mapped
+        return ipaddress.IPv4Network(f"{address}/{network.prefixlen - 96}")
+    return network
+
+
+class PrefixTrie:
+    """Binary trie of network prefixes; lookups walk at most one node per bit"""
+
+    def __init__(self, bits: int) -> None:
+        self.bits = bits
+        self.root = {}
+
+    def insert(self, network: IpNetwork) -> None:
+        node = self.root
+        address = int(network.network_address)
+        for i in range(network.prefixlen):
+            bit = (address >> (self.bits - 1 - i)) & 1
+            node = node.setdefault(bit, {})
+            if "network" in node and i + 1 < network.prefixlen:
+                return  # Already covered by a shorter prefix
+        node["network"] = network
+
+    def match(self, address: int) -> IpNetwork | None:
+        node = self.root
+        if "network" in node:
+            return node["network"]
+        for i in range(self.bits):
+            node = node.get((address >> (self.bits - 1 - i)) & 1)
+            if node is None:
+                return None
+            if "network" in node:
+                return node["network"]
+        return None
+
+
+class BanList:
+    """Process-wide IP/CIDR bans loaded from bannedips.txt
+
+    The file holds one address or CIDR range per line; lines starting with # are
+    comments. It is re-read when its mtime changes, checked at most once per
+    reload_interval seconds on lookup.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 2.0) -> None:
+        self.path = path
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        self.count = 0
+        self.mtime = None
+        self.checked_at = 0.0
+
+    def load(self) -> None:
+        tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        count = 0
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            mtime, lines = None, []
+        for line in lines:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                network = parse_network(line)
+            except ValueError:
+                log.warning("Ignoring invalid ban entry %r in %s", line, self.path)
+                continue
+            tries[network.version].insert(network)
+            count += 1
+        self.tries, self.count, self.mtime = tries, count, mtime
+
+    def refresh(self) -> None:
+        now = time.monotonic()
+        if now - self.checked_at < self.reload_interval:
+            return
+        with self.lock:
+            self.checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self.mtime:
+                self.load()
+
+    def match(self, ip: str | None) -> IpNetwork | None:
+        if not ip:
+            return None
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        self.refresh()
+        return self.tries[address.version].match(int(address))
+
+    def is_banned(self, ip: str | None) -> bool:
+        return self.match(ip) is not None
+
+    def ban(self, ip: str) -> None:
+        network = parse_network(ip)
+        with self.lock:
+            with open(self.path, "a+") as f:
+                f.seek(0)
+                existing = f.read()
+                # Older ip_ban wrote entries without a trailing newline
+                if existing and not existing.endswith("\n"):
+                    f.write("\n")
+                if network.prefixlen == network.max_prefixlen:
+                    f.write(f"{network.network_address}\n")
+                else:
+                    f.write(f"{network}\n")
+            self.tries[network.version].insert(network)
+            self.count += 1
+            try:
+                self.mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                pass
+
+
+ban_list = BanList(config.BANNED_IPS_FILE)
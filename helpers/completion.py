@@ -0,0 +1,116 @@
+import bisect
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator
+
+# Most recent speakers remembered per buffer, ranked first when completing
+RECENT_SPEAKERS = 50
+# Most candidates one Tab completion cycles through
+COMPLETION_LIMIT = 100
+
+
+class SortedIndex:
+    """Values kept in order of a (casefolded) key
+
+    Inserts and removals bisect into two parallel lists, and values whose key
+    starts with a prefix are a contiguous run found with one more bisect.
+    """
+
+    def __init__(self, items: Iterable[tuple[str, Any]] = ()) -> None:
+        self.keys: list[str] = []
+        self.values: list[Any] = []
+        self.reset(items)
+
+    def reset(self, items: Iterable[tuple[str, Any]]) -> None:
+        """Replace the contents, keeping the same list objects"""
+        items = sorted(dict(items).items(), key=lambda item: item[0])
+        self.keys[:] = [key for key, _ in items]
+        self.values[:] = [value for _, value in items]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        i = bisect.bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def get(self, key: str, default: Any = None) -> Any:
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.values[i]
+        return default
+
+    def insert(self, key: str, value: Any) -> int:
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            self.values[i] = value
+        else:
+            self.keys.insert(i, key)
+            self.values.insert(i, value)
+        return i
+
+    def remove(self, key: str) -> int | None:
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+            del self.values[i]
+            return i
+        return None
+
+    def prefixed(self, prefix: str) -> Iterator[Any]:
+        i = bisect.bisect_left(self.keys, prefix)
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            yield self.values[i]
+            i += 1
+
+
+class RecentSpeakers:
+    """Casefolded nicks of a buffer's latest speakers, most recent last"""
+
+    def __init__(self, size: int = RECENT_SPEAKERS) -> None:
+        self.size = size
+        self.nicks: OrderedDict[str, None] = OrderedDict()
+
+    def spoke(self, key: str) -> None:
+        self.nicks[key] = None
+        self.nicks.move_to_end(key)
+        if len(self.nicks) > self.size:
+            self.nicks.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        self.nicks.pop(key, None)
+
+    def newest_first(self) -> Iterator[str]:
+        return reversed(self.nicks)
+
+
+class TabCompletion:
+    """Cycles through the candidates for the word before the cursor
+
+    The input is only ever completed at its end, so the state is the text
+    before the word, the candidates and the value last written to the input;
+    Tab on an input that still holds that value moves to the next candidate.
+    """
+
+    def __init__(self) -> None:
+        self.head = ""
+        self.candidates: list[str] = []
+        self.position = 0
+        self.value = None
+
+    def is_cycling(self, value: str) -> bool:
+        return bool(self.candidates) and value == self.value
+
+    def start(self, head: str, candidates: list[str]) -> str | None:
+        self.head = head
+        self.candidates = candidates
+        self.position = 0
+        self.value = None
+        return self.current() if candidates else None
+
+    def cycle(self, step: int = 1) -> str:
+        self.position = (self.position + step) % len(self.candidates)
+        return self.current()
+
+    def current(self) -> str:
+        self.value = self.head + self.candidates[self.position]
+        return self.value
@@ -0,0 +1,23 @@
+import os
+
+IRC_HOST = os.environ.get("LIZARDCHAT_IRC_HOST", "irc.lizard.fun")
+IRC_TLS = os.environ.get("LIZARDCHAT_IRC_TLS", "1") != "0"
+IRC_PORT = int(os.environ.get("LIZARDCHAT_IRC_PORT", "6697" if IRC_TLS else "6667"))
+IRC_CA_FILE = os.environ.get("LIZARDCHAT_IRC_CA_FILE") or None
+SESSION_GRACE_PERIOD = float(os.environ.get("LIZARDCHAT_SESSION_GRACE", "120"))
+MEMORY_BUDGET_MB = int(os.environ.get("LIZARDCHAT_MEMORY_BUDGET_MB", "1024"))
+MEMORY_KEEP_LINES = int(os.environ.get("LIZARDCHAT_MEMORY_KEEP_LINES", "500"))
+CONNECTION_DB = os.environ.get("LIZARDCHAT_CONNECTION_DB", "connections.sqlite3")
+BANNED_IPS_FILE = os.environ.get("LIZARDCHAT_BANNED_IPS", "bannedips.txt")
+PROFILE_DIR = os.environ.get("LIZARDCHAT_PROFILE_DIR", "profiles")
+TRACE_DIR = os.environ.get("LIZARDCHAT_TRACE_DIR", "traces")
+MAX_SESSIONS_PER_IP = int(os.environ.get("LIZARDCHAT_MAX_SESSIONS_PER_IP", "5"))
+SESSION_RATE_PER_IP = float(os.environ.get("LIZARDCHAT_SESSION_RATE_PER_IP", "6"))
+SESSION_RATE_PER_SUBNET = float(
+    os.environ.get("LIZARDCHAT_SESSION_RATE_PER_SUBNET", "30")
+)
+LIST_CACHE_TTL = float(os.environ.get("LIZARDCHAT_LIST_CACHE_TTL", "300"))
+WHOIS_CACHE_TTL = float(os.environ.get("LIZARDCHAT_WHOIS_CACHE_TTL", "300"))
+LOG_LEVEL = os.environ.get("LIZARDCHAT_LOG_LEVEL", "INFO")
+LOG_RATE = float(os.environ.get("LIZARDCHAT_LOG_RATE", "50"))
+LOG_SAMPLE = os.environ.get("LIZARDCHAT_LOG_SAMPLE", "")
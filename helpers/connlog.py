@@ -0,0 +1,200 @@
+"""Indexed log of which nick connected from which IP
+
+    python -m helpers.connlog import connections.txt
+"""
+import ipaddress
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from helpers import config
+
+log = logging.getLogger("lizardchat.connlog")
+
+# Queued by flush() to end the writer's current batch early
+FLUSH = None
+# Seconds flush() waits for queued logins to be written
+FLUSH_TIMEOUT = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS connections (
+    id INTEGER PRIMARY KEY,
+    nick TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    connected_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS connections_nick_nocase
+    ON connections (nick COLLATE NOCASE, connected_at);
+CREATE INDEX IF NOT EXISTS connections_ip ON connections (ip, connected_at);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class ConnectionLog:
+    """SQLite (WAL) store of logins, written in batches by a background thread"""
+
+    def __init__(self, path: str, batch_interval: float = 0.5) -> None:
+        self.path = path
+        self.batch_interval = batch_interval
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.db = None
+        self.writer = None
+
+    def connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        return db
+
+    def open(self) -> None:
+        with self.lock:
+            if self.db is None:
+                self.db = self.connect()
+                self.writer = threading.Thread(
+                    target=self.write_batches, name="connection-log", daemon=True
+                )
+                self.writer.start()
+
+    def record(self, nick: str, ip: str | None) -> None:
+        """Queue a login; never blocks on disk"""
+        self.open()
+        self.queue.put((nick, ip or "", time.time()))
+
+    def write_batches(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.batch_interval
+            while batch[-1] is not FLUSH:
+                if (remaining := deadline - time.monotonic()) <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not FLUSH]
+            try:
+                with self.lock:
+                    with self.db:
+                        self.db.executemany(
+                            "INSERT INTO connections (nick, ip, connected_at) "
+                            "VALUES (?, ?, ?)",
+                            rows,
+                        )
+            except sqlite3.Error:
+                # e.g. a locked database or a full disk; keep the writer going
+                log.exception("Could not record %d connections", len(rows))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT) -> bool:
+        """Wait for queued logins to be written; False if that took too long"""
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            if not self.queue.unfinished_tasks:
+                return True
+        self.queue.put(FLUSH)
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                if (remaining := deadline - time.monotonic()) <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def latest_ip(self, nick: str) -> str | None:
+        """The address nick last logged in from, matching nicks in any case"""
+        self.open()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT ip FROM connections WHERE nick = ? COLLATE NOCASE "
+                "ORDER BY connected_at DESC LIMIT 1",
+                (nick,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def nicks_for_ip(self, ip: str, limit: int = 50) -> list[str]:
+        self.open()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT DISTINCT nick FROM connections WHERE ip = ? "
+                "ORDER BY connected_at DESC LIMIT ?",
+                (ip, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def import_legacy(self, path: str) -> int:
+        """Import the old append-only connections.txt once
+
+        Entries were written as "nick,ip" without a separator, so a record's IP
+        and the next record's nick share a comma-separated field. The old
+        writer only ever logged IPv4 addresses (or "None"), and IRC nicks
+        cannot start with a digit, which makes the boundaries unambiguous.
+        """
+        self.open()
+        with self.lock:
+            done = self.db.execute(
+                "SELECT value FROM meta WHERE key = 'legacy_import'"
+            ).fetchone()
+        if done:
+            return 0
+        with open(path) as f:
+            entries = parse_legacy(f.read())
+        # Preserve file order: later entries are more recent
+        start = time.time() - len(entries)
+        with self.lock:
+            with self.db:
+                self.db.executemany(
+                    "INSERT INTO connections (nick, ip, connected_at) VALUES (?, ?, ?)",
+                    [(nick, ip, start + i) for i, (nick, ip) in enumerate(entries)],
+                )
+                self.db.execute(
+                    "INSERT INTO meta (key, value) VALUES ('legacy_import', ?)",
+                    (path,),
+                )
+        return len(entries)
+
+
+def split_address(field: str) -> tuple[str, str]:
+    """Split "1.2.3.4nick" into ("1.2.3.4", "nick")
+
+    Only IPv4 is recognised: nicks may start with hex digits, so an IPv6
+    address could absorb the start of the next nick.
+    """
+    for end in range(len(field), 0, -1):
+        try:
+            ipaddress.IPv4Address(field[:end])
+        except ValueError:
+            continue
+        return field[:end], field[end:]
+    return "", field
+
+
+def parse_legacy(text: str) -> list[tuple[str, str]]:
+    entries = []
+    for line in text.splitlines():
+        fields = line.split(",")
+        nick = fields[0]
+        for field in fields[1:]:
+            ip, next_nick = split_address(field)
+            if not ip and field.startswith("None"):
+                ip, next_nick = "", field[len("None") :]
+            if nick:
+                entries.append((nick, ip))
+            nick = next_nick
+    return entries
+
+
+connection_log = ConnectionLog(config.CONNECTION_DB)
+
+
+if __name__ == "__main__":
+    match sys.argv[1:]:
+        case ["import", path]:
+            print(f"Imported {connection_log.import_legacy(path)} connections")
+        case _:
+            print(__doc__.strip())
@@ -0,0 +1,112 @@
+from collections import deque
+from typing import Iterable, Iterator
+
+HIGHLIGHT_WORDS_KEY = "lizardchat.highlight_words"
+HIGHLIGHT_NOTIFY_KEY = "lizardchat.highlight_notify"
+
+
+def is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class Automaton:
+    """Aho-Corasick automaton over a fixed set of patterns
+
+    search() walks the text once, following failure links on mismatches, so
+    its cost depends on the text and the number of matches but not on how
+    many patterns there are.
+    """
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        # Lengths of the patterns that end at each state, via failure links too
+        self.output: list[tuple[int, ...]] = [()]
+        for pattern in patterns:
+            self.add(pattern)
+        self.link()
+
+    def add(self, pattern: str) -> None:
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        if pattern and len(pattern) not in self.output[state]:
+            self.output[state] += (len(pattern),)
+
+    def link(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                self.output[child] += self.output[self.fail[child]]
+
+    def search(self, text: str) -> Iterator[tuple[int, int]]:
+        """(start, end) of every pattern occurrence in text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length in output[state]:
+                yield i + 1 - length, i + 1
+
+
+class HighlightRules:
+    """The user's own nick plus watch words, matched as whole words
+
+    Matching is case-insensitive. The automaton is rebuilt lazily, only after
+    the nick or the word list has changed.
+    """
+
+    def __init__(self, nick: str = "", words: Iterable[str] = ()) -> None:
+        self.nick = nick
+        self.words: list[str] = []
+        self.notify = True
+        self.automaton = None
+        self.set_words(words)
+
+    def set_nick(self, nick: str) -> None:
+        if nick.casefold() != self.nick.casefold():
+            self.automaton = None
+        self.nick = nick
+
+    def set_words(self, words: Iterable[str]) -> None:
+        self.words = sorted({word.casefold() for word in words if word.strip()})
+        self.automaton = None
+
+    def add(self, word: str) -> bool:
+        if not word.strip() or word.casefold() in self.words:
+            return False
+        self.set_words([*self.words, word])
+        return True
+
+    def remove(self, word: str) -> bool:
+        if word.casefold() not in self.words:
+            return False
+        self.set_words(w for w in self.words if w != word.casefold())
+        return True
+
+    def matches(self, text: str) -> bool:
+        if self.automaton is None:
+            patterns = [*self.words, self.nick.casefold()] if self.nick else self.words
+            self.automaton = Automaton(patterns)
+        folded = text.casefold()
+        for start, end in self.automaton.search(folded):
+            if (start == 0 or not is_word_char(folded[start - 1])) and (
+                end == len(folded) or not is_word_char(folded[end])
+            ):
+                return True
+        return False
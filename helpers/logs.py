@@ -0,0 +1,174 @@
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+from helpers import config
+from helpers.ratelimit import TokenBucket
+
+# Records waiting for the writer thread; beyond this they are dropped
+LOG_QUEUE_SIZE = 10000
+# Structured fields copied from a record's extra= into its JSON line
+LOG_FIELDS = ("session", "nick", "command", "buffer", "dropped")
+
+session_ids = itertools.count(1)
+
+
+def parse_sample_rates(spec: str) -> dict[str, float]:
+    """"registration=0.1,unhandled=0.01" -> {"lizardchat.registration": 0.1, ...}"""
+    rates = {}
+    for item in spec.split(","):
+        category, _, rate = item.partition("=")
+        if category.strip() and rate:
+            rates[f"lizardchat.{category.strip()}"] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "category": record.name,
+            "message": record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            if (value := getattr(record, field, None)) is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class CategoryLimiter(logging.Filter):
+    """Per-category sampling and rate limit, applied before a record is queued
+
+    Records a category loses to its rate limit are counted, and the count is
+    attached as "dropped" to the next record of that category that gets out.
+    """
+
+    def __init__(self, sample_rates: dict[str, float], rate: float) -> None:
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.buckets: dict[str, TokenBucket] = {}
+        self.dropped: dict[str, int] = {}
+
+    def admit(self, category: str) -> int | None:
+        """None if a record of category is dropped, else how many were before it"""
+        sample_rate = self.sample_rates.get(category, 1.0)
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            return None
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(category)
+            if bucket is None:
+                bucket = self.buckets[category] = TokenBucket(self.rate, self.rate, now)
+            if bucket.refill(now) < 1:
+                self.dropped[category] = self.dropped.get(category, 0) + 1
+                return None
+            bucket.tokens -= 1
+            return self.dropped.pop(category, 0)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # SessionLog asks before the record is even built
+        if getattr(record, "admitted", False):
+            return True
+        if (dropped := self.admit(record.name)) is None:
+            return False
+        if dropped:
+            record.dropped = dropped
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the logging thread: a full queue drops the record"""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.overflowed = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.overflowed += 1
+
+
+class SessionLog(logging.LoggerAdapter):
+    """Adds the IRC session's id and current nick to every record
+
+    Sampling and rate limits are checked before the record is built, so a
+    flood of dropped records costs a token bucket lookup each.
+    """
+
+    def __init__(self, category: str, client) -> None:
+        super().__init__(logging.getLogger(f"lizardchat.{category}"), {})
+        self.client = client
+
+    def log(self, level: int, msg: str, *args, **kwargs) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        if (dropped := log_pipeline.admit(self.logger.name)) is None:
+            return
+        kwargs["extra"] = {
+            "session": self.client.session_id,
+            "nick": self.client.nick,
+            "dropped": dropped or None,
+            "admitted": True,
+            **kwargs.get("extra", {}),
+        }
+        self.logger.log(level, msg, *args, **kwargs)
+
+
+class LogPipeline:
+    """The lizardchat loggers' queue and the thread that writes it to stderr"""
+
+    def __init__(self) -> None:
+        self.handler = None
+        self.limiter = None
+        self.listener = None
+
+    def admit(self, category: str) -> int | None:
+        return self.limiter.admit(category) if self.limiter is not None else 0
+
+    def start(
+        self,
+        level: str = config.LOG_LEVEL,
+        rate: float = config.LOG_RATE,
+        sample_rates: str = config.LOG_SAMPLE,
+        stream=None,
+    ) -> None:
+        if self.listener is not None:
+            return
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        writer = logging.StreamHandler(stream or sys.stderr)
+        writer.setFormatter(JsonFormatter())
+        self.handler = DroppingQueueHandler(log_queue)
+        self.limiter = CategoryLimiter(parse_sample_rates(sample_rates), rate)
+        self.handler.addFilter(self.limiter)
+        root = logging.getLogger("lizardchat")
+        root.setLevel(level.upper())
+        root.addHandler(self.handler)
+        root.propagate = False
+        self.listener = logging.handlers.QueueListener(log_queue, writer)
+        self.listener.start()
+
+    def stop(self) -> None:
+        """Write out what is queued and detach the handler"""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        logging.getLogger("lizardchat").removeHandler(self.handler)
+        self.listener = self.limiter = None
+
+
+log_pipeline = LogPipeline()
@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from helpers import config
+
+
+class MemoryBudget:
+    """Estimated memory held by every session's buffers, with LRU eviction
+
+    Owners (chat views) report an estimated size per buffer. When the process
+    total goes over the limit, the least recently viewed inactive buffers are
+    marked, and each owner shrinks its own marked buffers the next time it
+    reports or drains lines, on its own thread: first compacted (rendered
+    controls dropped, lines kept as records) and, if that is not enough,
+    trimmed down to their most recent lines.
+    """
+
+    def __init__(self, limit_bytes: int, keep_lines: int) -> None:
+        self.limit_bytes = limit_bytes
+        self.keep_lines = keep_lines
+        self.lock = threading.RLock()
+        self.usage: dict[tuple[int, str], int] = {}
+        # Unmarked buffers, least recently viewed first; eviction scans only
+        # these, so it stays cheap while marked buffers wait to be reclaimed
+        self.unmarked: OrderedDict[tuple[int, str], None] = OrderedDict()
+        # Bumped when a buffer could newly be marked; a scan that found nothing
+        # to mark is not repeated until it changes
+        self.generation = 0
+        self.exhausted_at = -1
+        self.owners: dict[int, Any] = {}
+        # Buffers to shrink and their sizes when marked, by owner
+        self.marked: dict[int, dict[str, int]] = {}
+        self.marked_bytes = 0
+        self.total = 0
+        self.compactions = 0
+        self.trims = 0
+
+    def update(self, owner: Any, buffer_name: str, size: int) -> None:
+        if self.limit_bytes <= 0:
+            return
+        key = (id(owner), buffer_name)
+        with self.lock:
+            self.owners[id(owner)] = owner
+            if key not in self.usage:
+                self.unmarked[key] = None
+                self.generation += 1
+            self.total += size - self.usage.get(key, 0)
+            self.usage[key] = size
+            if self.total - self.marked_bytes > self.limit_bytes:
+                self.evict()
+            if id(owner) in self.marked:
+                self.reclaim(owner)
+
+    def touch(self, owner: Any, buffer_name: str) -> None:
+        with self.lock:
+            key = (id(owner), buffer_name)
+            # A buffer being viewed is not shrunk, so it need not stay marked
+            size = self.marked.get(id(owner), {}).pop(buffer_name, None)
+            if size is not None:
+                self.marked_bytes -= size
+                self.unmarked[key] = None
+            if key in self.unmarked:
+                self.unmarked.move_to_end(key)
+                self.generation += 1
+
+    def forget(self, owner: Any) -> None:
+        with self.lock:
+            if self.owners.pop(id(owner), None) is None:
+                return
+            self.unmark(id(owner))
+            for key in [key for key in self.usage if key[0] == id(owner)]:
+                self.total -= self.usage.pop(key)
+                self.unmarked.pop(key, None)
+
+    def evict(self) -> None:
+        # Other owners' buffers are only marked here; changing them from this
+        # thread would race with their own appends
+        if self.exhausted_at == self.generation:
+            return
+        marking = []
+        for key in self.unmarked:
+            if self.total - self.marked_bytes <= self.limit_bytes:
+                break
+            owner_id, buffer_name = key
+            if buffer_name == self.owners[owner_id].active_buffer:
+                continue
+            size = self.usage[key]
+            self.marked.setdefault(owner_id, {})[buffer_name] = size
+            self.marked_bytes += size
+            marking.append(key)
+        for key in marking:
+            del self.unmarked[key]
+        if self.total - self.marked_bytes > self.limit_bytes:
+            self.exhausted_at = self.generation
+
+    def unmark(self, owner_id: int) -> dict[str, int]:
+        buffers = self.marked.pop(owner_id, {})
+        self.marked_bytes -= sum(buffers.values())
+        # Back where they were: still the least recently viewed
+        for buffer_name in reversed(buffers):
+            self.generation += 1
+            self.unmarked[(owner_id, buffer_name)] = None
+            self.unmarked.move_to_end((owner_id, buffer_name), last=False)
+        return buffers
+
+    def reclaim(self, owner: Any) -> None:
+        """Shrink owner's marked buffers; called from the owner's own thread"""
+        with self.lock:
+            for buffer_name in self.unmark(id(owner)):
+                key = (id(owner), buffer_name)
+                if key not in self.usage or buffer_name == owner.active_buffer:
+                    continue
+                for phase in (self.compact, self.trim):
+                    if self.total <= self.limit_bytes:
+                        break
+                    size = phase(owner, buffer_name)
+                    if size is not None:
+                        self.total += size - self.usage[key]
+                        self.usage[key] = size
+
+    def compact(self, owner: Any, buffer_name: str) -> int | None:
+        size = owner.compact_buffer(buffer_name)
+        if size is not None:
+            self.compactions += 1
+        return size
+
+    def trim(self, owner: Any, buffer_name: str) -> int | None:
+        size = owner.trim_buffer(buffer_name, self.keep_lines)
+        if size is not None:
+            self.trims += 1
+        return size
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            sessions = {}
+            for (owner_id, _), size in self.usage.items():
+                sessions[owner_id] = sessions.get(owner_id, 0) + size
+            return {
+                "total_bytes": self.total,
+                "limit_bytes": self.limit_bytes,
+                "sessions": len(sessions),
+                "buffers": len(self.usage),
+                "largest_session_bytes": max(sessions.values(), default=0),
+                "compactions": self.compactions,
+                "trims": self.trims,
+            }
+
+
+memory_budget = MemoryBudget(config.MEMORY_BUDGET_MB * 2**20, config.MEMORY_KEEP_LINES)
@@ -0,0 +1,120 @@
+import cProfile
+import datetime
+import os
+import threading
+import tracemalloc
+
+from helpers import config
+
+
+class WorkerProfiler:
+    """On-demand cProfile and tracemalloc capture for the whole worker process
+
+    On Python 3.12+ cProfile is backed by sys.monitoring, so a single enabled
+    profile sees every thread and therefore every session in the worker.
+    """
+
+    def __init__(self, output_dir: str = "profiles", top_allocations: int = 50) -> None:
+        self.output_dir = output_dir
+        self.top_allocations = top_allocations
+        self.lock = threading.Lock()
+        self.profile = None
+        self.timer = None
+        self.start_snapshot = None
+        self.last_snapshot = None
+        # Set while tracing runs because of us, to be stopped once no profile
+        # or memory baseline needs it
+        self.started_tracemalloc = False
+
+    @property
+    def running(self) -> bool:
+        return self.profile is not None
+
+    def start(self, seconds: float) -> bool:
+        with self.lock:
+            if self.profile is not None:
+                return False
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                self.started_tracemalloc = True
+            self.start_snapshot = tracemalloc.take_snapshot()
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+            self.timer = threading.Timer(seconds, self.stop)
+            self.timer.daemon = True
+            self.timer.start()
+            return True
+
+    def stop(self) -> list[str]:
+        with self.lock:
+            if self.profile is None:
+                return []
+            self.profile.disable()
+            if self.timer:
+                self.timer.cancel()
+            os.makedirs(self.output_dir, exist_ok=True)
+            stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            stats_path = os.path.join(self.output_dir, f"profile-{stamp}.pstats")
+            self.profile.dump_stats(stats_path)
+            end_snapshot = tracemalloc.take_snapshot()
+            alloc_path = os.path.join(self.output_dir, f"allocations-{stamp}.txt")
+            self.write_allocation_diff(alloc_path, end_snapshot, self.start_snapshot)
+            self.profile = None
+            self.timer = None
+            self.start_snapshot = None
+            self.release_tracemalloc()
+            return [stats_path, alloc_path]
+
+    def release_tracemalloc(self) -> None:
+        # Called with the lock held; tracing slows down every allocation
+        if self.started_tracemalloc and self.profile is None and not self.last_snapshot:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def memory_snapshot(self) -> str | None:
+        """Take a baseline snapshot, or diff against the baseline and drop it
+
+        Tracing runs from the baseline to the diff, so growth over long uptimes
+        can be followed without restarting the worker; it is stopped after the
+        diff unless it was already running before the baseline.
+        """
+        with self.lock:
+            if self.last_snapshot is None:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(25)
+                    self.started_tracemalloc = True
+                self.last_snapshot = tracemalloc.take_snapshot()
+                return None
+            snapshot = tracemalloc.take_snapshot()
+            os.makedirs(self.output_dir, exist_ok=True)
+            stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.output_dir, f"allocations-{stamp}.txt")
+            self.write_allocation_diff(path, snapshot, self.last_snapshot)
+            self.last_snapshot = None
+            self.release_tracemalloc()
+            return path
+
+    def write_allocation_diff(
+        self,
+        path: str,
+        snapshot: tracemalloc.Snapshot,
+        previous: tracemalloc.Snapshot,
+    ) -> None:
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        snapshot = snapshot.filter_traces(filters)
+        previous = previous.filter_traces(filters)
+        with open(path, "w") as f:
+            current, peak = tracemalloc.get_traced_memory()
+            f.write(f"Traced memory: current={current} peak={peak}\n\n")
+            f.write(f"Top {self.top_allocations} allocation changes by line:\n")
+            for stat in snapshot.compare_to(previous, "lineno")[: self.top_allocations]:
+                f.write(f"{stat}\n")
+            f.write(f"\nTop {self.top_allocations} allocations by line:\n")
+            for stat in snapshot.statistics("lineno")[: self.top_allocations]:
+                f.write(f"{stat}\n")
+
+
+profiler = WorkerProfiler(config.PROFILE_DIR)
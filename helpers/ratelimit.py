@@ -0,0 +1,172 @@
+import ipaddress
+import threading
+import time
+from collections import Counter
+
+from helpers import config
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def refill(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return self.tokens
+
+    def full(self, now: float) -> bool:
+        return self.refill(now) >= self.burst
+
+
+def subnet_of(ip: str) -> str:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+class SessionLimiter:
+    """Admission control for new chat sessions, per client IP and subnet
+
+    Each IP and each /24 (IPv4) or /64 (IPv6) has a token bucket of new sessions
+    per minute, and each IP may hold at most max_sessions live sessions. A
+    sweeper drops buckets that have refilled and have no live sessions.
+    """
+
+    def __init__(
+        self,
+        ip_per_minute: float,
+        subnet_per_minute: float,
+        max_sessions: int,
+        sweep_interval: float = 60.0,
+    ) -> None:
+        self.ip_rate = ip_per_minute / 60
+        self.ip_burst = max(1.0, ip_per_minute)
+        self.subnet_rate = subnet_per_minute / 60
+        self.subnet_burst = max(1.0, subnet_per_minute)
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self.lock = threading.Lock()
+        self.ip_buckets: dict[str, TokenBucket] = {}
+        self.subnet_buckets: dict[str, TokenBucket] = {}
+        self.active: Counter[str] = Counter()
+        self.rejections: Counter[str] = Counter()
+        self.admitted = 0
+        self.sweeper = None
+
+    def buckets(self, ip: str, now: float) -> tuple[TokenBucket, TokenBucket]:
+        ip_bucket = self.ip_buckets.get(ip)
+        if ip_bucket is None:
+            ip_bucket = self.ip_buckets[ip] = TokenBucket(
+                self.ip_rate, self.ip_burst, now
+            )
+        subnet = subnet_of(ip)
+        subnet_bucket = self.subnet_buckets.get(subnet)
+        if subnet_bucket is None:
+            subnet_bucket = self.subnet_buckets[subnet] = TokenBucket(
+                self.subnet_rate, self.subnet_burst, now
+            )
+        return ip_bucket, subnet_bucket
+
+    def evaluate(self, ip: str, now: float) -> str | None:
+        ip_bucket, subnet_bucket = self.buckets(ip, now)
+        if self.active[ip] >= self.max_sessions:
+            return "sessions"
+        if ip_bucket.refill(now) < 1:
+            return "ip_rate"
+        if subnet_bucket.refill(now) < 1:
+            return "subnet_rate"
+        return None
+
+    def check(self, ip: str | None) -> str | None:
+        """Return a rejection message if a new session would be refused"""
+        if not ip:
+            return None
+        with self.lock:
+            reason = self.evaluate(ip, time.monotonic())
+            if reason:
+                self.rejections[reason] += 1
+        return self.describe(reason)
+
+    def admit(self, ip: str | None) -> str | None:
+        """Reserve a session slot, or return why the session is refused"""
+        if not ip:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            if reason := self.evaluate(ip, now):
+                self.rejections[reason] += 1
+                return self.describe(reason)
+            ip_bucket, subnet_bucket = self.buckets(ip, now)
+            ip_bucket.tokens -= 1
+            subnet_bucket.tokens -= 1
+            self.active[ip] += 1
+            self.admitted += 1
+            if self.sweeper is None:
+                self.sweeper = threading.Thread(
+                    target=self.sweep, name="ratelimit-sweeper", daemon=True
+                )
+                self.sweeper.start()
+        return None
+
+    def release(self, ip: str) -> None:
+        with self.lock:
+            self.active[ip] -= 1
+            if self.active[ip] <= 0:
+                del self.active[ip]
+
+    @staticmethod
+    def describe(reason: str | None) -> str | None:
+        match reason:
+            case "sessions":
+                return "Too many open sessions from your address"
+            case "ip_rate" | "subnet_rate":
+                return "Too many new sessions, please wait a minute and try again"
+        return None
+
+    def sweep(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            now = time.monotonic()
+            with self.lock:
+                for ip in [
+                    ip
+                    for ip, bucket in self.ip_buckets.items()
+                    if bucket.full(now) and ip not in self.active
+                ]:
+                    del self.ip_buckets[ip]
+                for subnet in [
+                    subnet
+                    for subnet, bucket in self.subnet_buckets.items()
+                    if bucket.full(now)
+                ]:
+                    del self.subnet_buckets[subnet]
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "admitted": self.admitted,
+                "active_sessions": sum(self.active.values()),
+                "tracked_ips": len(self.ip_buckets),
+                "tracked_subnets": len(self.subnet_buckets),
+                "rejected_sessions": self.rejections["sessions"],
+                "rejected_ip_rate": self.rejections["ip_rate"],
+                "rejected_subnet_rate": self.rejections["subnet_rate"],
+            }
+
+
+session_limiter = SessionLimiter(
+    config.SESSION_RATE_PER_IP,
+    config.SESSION_RATE_PER_SUBNET,
+    config.MAX_SESSIONS_PER_IP,
+)
@@ -0,0 +1,73 @@
+import secrets
+import threading
+import time
+from typing import Any
+
+from helpers import config
+
+SESSION_TOKEN_KEY = "lizardchat.session_token"
+
+
+class DetachedSession:
+    def __init__(self, irc_client: Any, view: Any, expires_at: float) -> None:
+        self.irc_client = irc_client
+        self.view = view
+        self.expires_at = expires_at
+
+
+class SessionStore:
+    """Live IRC sessions whose browser went away, kept for a grace period
+
+    A browser that comes back with the same token within the grace period
+    reattaches to the running IRC connection instead of registering again.
+    Sessions that are not claimed in time are logged out.
+    """
+
+    def __init__(self, grace_period: float) -> None:
+        self.grace_period = grace_period
+        self.lock = threading.Lock()
+        self.sessions: dict[str, DetachedSession] = {}
+        self.sweeper = None
+
+    @staticmethod
+    def new_token() -> str:
+        return secrets.token_urlsafe(32)
+
+    def detach(self, token: str, irc_client: Any, view: Any) -> None:
+        with self.lock:
+            self.sessions[token] = DetachedSession(
+                irc_client, view, time.monotonic() + self.grace_period
+            )
+            if self.sweeper is None:
+                self.sweeper = threading.Thread(
+                    target=self.sweep, name="session-sweeper", daemon=True
+                )
+                self.sweeper.start()
+
+    def reattach(self, token: str) -> DetachedSession | None:
+        with self.lock:
+            return self.sessions.pop(token, None)
+
+    def discard(self, token: str) -> None:
+        with self.lock:
+            self.sessions.pop(token, None)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def sweep(self) -> None:
+        while True:
+            time.sleep(min(5.0, self.grace_period))
+            now = time.monotonic()
+            with self.lock:
+                expired = [
+                    token
+                    for token, session in self.sessions.items()
+                    if session.expires_at <= now
+                ]
+                sessions = [self.sessions.pop(token) for token in expired]
+            for session in sessions:
+                session.irc_client.expire()
+
+
+session_store = SessionStore(config.SESSION_GRACE_PERIOD)
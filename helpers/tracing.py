@@ -0,0 +1,135 @@
+import datetime
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from itertools import count
+
+from helpers import config
+
+
+class MessageTrace:
+    """Timestamps taken as a single IRC message moves through the client"""
+
+    __slots__ = ("trace_id", "command", "marks")
+
+    def __init__(
+        self, trace_id: int, command: str = "", started: int | None = None
+    ) -> None:
+        self.trace_id = trace_id
+        self.command = command
+        self.marks = [("start", started or time.perf_counter_ns())]
+
+    def mark(self, stage: str, at: int | None = None) -> None:
+        self.marks.append((stage, at or time.perf_counter_ns()))
+
+    def stage_durations(self) -> list[tuple[str, int, int]]:
+        """Return (stage, start_ns, duration_ns) for every stage after start"""
+        durations = []
+        for (_, previous), (stage, current) in zip(self.marks, self.marks[1:]):
+            durations.append((stage, previous, current - previous))
+        return durations
+
+    def total(self) -> int:
+        return self.marks[-1][1] - self.marks[0][1]
+
+
+class MessageTracer:
+    """Samples messages and keeps their finished traces in a ring buffer"""
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        capacity: int = 10000,
+        output_dir: str = "traces",
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.traces = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.ids = count(1)
+
+    @classmethod
+    def from_env(cls) -> "MessageTracer":
+        sample_rate = float(os.environ.get("LIZARDCHAT_TRACE_SAMPLE_RATE", "0"))
+        capacity = int(os.environ.get("LIZARDCHAT_TRACE_CAPACITY", "10000"))
+        return cls(sample_rate, capacity, config.TRACE_DIR)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start(self, started: int | None = None) -> MessageTrace | None:
+        """Sampled trace beginning now, or at an earlier perf_counter_ns()"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        return MessageTrace(next(self.ids), started=started)
+
+    def finish(self, trace: MessageTrace) -> None:
+        with self.lock:
+            self.traces.append(trace)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.traces.clear()
+
+    def snapshot(self) -> list[MessageTrace]:
+        with self.lock:
+            return list(self.traces)
+
+    def percentiles(
+        self, percentiles: tuple[float, ...] = (50, 99)
+    ) -> dict[str, dict[str, float]]:
+        """Per-stage and total latency percentiles in milliseconds"""
+        samples: dict[str, list[int]] = {}
+        for trace in self.snapshot():
+            for stage, _, duration in trace.stage_durations():
+                samples.setdefault(stage, []).append(duration)
+            samples.setdefault("total", []).append(trace.total())
+        summary = {}
+        for stage, durations in samples.items():
+            durations.sort()
+            summary[stage] = {
+                f"p{p:g}": durations[
+                    min(len(durations) - 1, int(len(durations) * p / 100))
+                ]
+                / 1e6
+                for p in percentiles
+            }
+            summary[stage]["count"] = len(durations)
+        return summary
+
+    def to_chrome_trace(self) -> dict:
+        """Build a Chrome trace-event document (chrome://tracing, Perfetto)"""
+        events = []
+        pid = os.getpid()
+        for trace in self.snapshot():
+            for stage, start, duration in trace.stage_durations():
+                events.append(
+                    {
+                        "name": stage,
+                        "cat": trace.command or "message",
+                        "ph": "X",
+                        "ts": start / 1000,
+                        "dur": duration / 1000,
+                        "pid": pid,
+                        "tid": trace.trace_id,
+                    }
+                )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self) -> tuple[str, int]:
+        """Write the trace to a new file in output_dir; returns the path and
+        the number of events"""
+        document = self.to_chrome_trace()
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.output_dir, f"trace-{stamp}.json")
+        with open(path, "w") as f:
+            json.dump(document, f)
+        return path, len(document["traceEvents"])
+
+
+tracer = MessageTracer.from_env()
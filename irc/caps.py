@@ -0,0 +1,57 @@
+import base64
+import threading
+
+# IRCv3 capabilities the client asks for when the server offers them
+WANTED_CAPS = (
+    "sasl",
+    "multi-prefix",
+    "server-time",
+    "message-tags",
+    "batch",
+    "echo-message",
+    "draft/chathistory",
+)
+SASL_FAILED = ("902", "904", "905", "906", "907", "908")
+
+
+def parse_caps(caps: str) -> dict[str, str]:
+    """Parse "sasl=PLAIN,EXTERNAL multi-prefix" into {"sasl": "PLAIN,EXTERNAL", ...}"""
+    parsed = {}
+    for cap in caps.lstrip(":").split():
+        name, _, value = cap.partition("=")
+        parsed[name.lstrip("-~=")] = value
+    return parsed
+
+
+def sasl_plain(username: str, password: str) -> list[str]:
+    """AUTHENTICATE payloads for SASL PLAIN, split into 400 byte chunks"""
+    payload = base64.b64encode(
+        f"{username}\0{username}\0{password}".encode("utf-8")
+    ).decode("ascii")
+    chunks = [payload[i : i + 400] for i in range(0, len(payload), 400)]
+    if len(chunks[-1]) == 400:
+        chunks.append("+")
+    return chunks
+
+
+class CapCache:
+    """Capabilities each server offered on its last CAP LS
+
+    Lets the next registration to the same server send its CAP REQ (and SASL
+    start) in the same write as CAP LS instead of waiting a round trip for it.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.offered: dict[tuple[str, int], dict[str, str]] = {}
+
+    def get(self, hostname: str, port: int) -> dict[str, str] | None:
+        with self.lock:
+            return self.offered.get((hostname, port))
+
+    def set(self, hostname: str, port: int, caps: dict[str, str]) -> None:
+        with self.lock:
+            self.offered[(hostname, port)] = caps
+
+
+cap_cache = CapCache()
@@ -0,0 +1,146 @@
+import bisect
+import contextlib
+import threading
+import time
+from typing import Callable
+
+from helpers import config
+
+# Channels shown per browser page; listeners also hear about every this many
+LIST_PAGE = 50
+# Seconds before an unfinished LIST is given up on (its session went away)
+LIST_TIMEOUT = 60
+
+
+class ChannelEntry:
+    __slots__ = ("name", "users", "topic", "haystack")
+
+    def __init__(self, name: str, users: int, topic: str) -> None:
+        self.name = name
+        self.users = users
+        self.topic = topic
+        # What filters search, casefolded once
+        self.haystack = f"{name} {topic}".casefold()
+
+
+class ChannelIndex:
+    """Channels from one LIST reply, kept ordered by user count as they arrive
+
+    Entries are bisected into (-users, name) order, so sorting by users costs
+    nothing at query time; name order is built once per change, on first use.
+    Filtering scans the casefolded haystacks, and a query that extends the
+    previous one only rescans the previous matches.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.keys: list[tuple[int, str]] = []
+        self.by_users: list[ChannelEntry] = []
+        self.by_name: list[ChannelEntry] | None = None
+        self.version = 0
+        # (query, sort, version, matches) of the last filtered search
+        self.last = ("", "", -1, [])
+
+    def __len__(self) -> int:
+        return len(self.by_users)
+
+    def add(self, entry: ChannelEntry) -> None:
+        key = (-entry.users, entry.haystack)
+        with self.lock:
+            i = bisect.bisect_left(self.keys, key)
+            self.keys.insert(i, key)
+            self.by_users.insert(i, entry)
+            self.by_name = None
+            self.version += 1
+
+    def ordered(self, sort: str) -> list[ChannelEntry]:
+        if sort != "name":
+            return self.by_users
+        if self.by_name is None:
+            self.by_name = sorted(self.by_users, key=lambda entry: entry.haystack)
+        return self.by_name
+
+    def search(
+        self, query: str = "", sort: str = "users", offset: int = 0, limit: int = 0
+    ) -> tuple[int, list[ChannelEntry]]:
+        """Total matches and the page of them starting at offset"""
+        query = query.strip().casefold()
+        limit = limit or LIST_PAGE
+        with self.lock:
+            if not query:
+                matches = self.ordered(sort)
+            else:
+                last_query, last_sort, version, matches = self.last
+                narrowing = last_query in query and version == self.version
+                if not (narrowing and last_sort == sort):
+                    matches = self.ordered(sort)
+                matches = [entry for entry in matches if query in entry.haystack]
+                self.last = (query, sort, self.version, matches)
+            return len(matches), matches[offset : offset + limit]
+
+
+class ChannelListing:
+    """One server's LIST reply as it streams in, shared by every browser"""
+
+    def __init__(self) -> None:
+        self.index = ChannelIndex()
+        self.started = time.monotonic()
+        self.completed = None
+        self.listeners: list[Callable[[], None]] = []
+
+    def fresh(self, ttl: float, now: float) -> bool:
+        if self.completed is None:
+            return now - self.started < LIST_TIMEOUT
+        return now - self.completed < ttl
+
+    def subscribe(self, listener: Callable[[], None]) -> None:
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[], None]) -> None:
+        with contextlib.suppress(ValueError):
+            self.listeners.remove(listener)
+
+    def notify(self) -> None:
+        for listener in list(self.listeners):
+            listener()
+
+    def add(self, name: str, users: int, topic: str) -> None:
+        self.index.add(ChannelEntry(name, users, topic))
+        if len(self.index) % LIST_PAGE == 0:
+            self.notify()
+
+    def end(self) -> None:
+        self.completed = time.monotonic()
+        self.notify()
+
+
+class ChannelListCache:
+    """The latest LIST reply per server, shared by every session
+
+    A browser opened while a listing is fresh, or still arriving, reuses it;
+    only a missing or expired listing makes the asking session send LIST.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.listings: dict[tuple[str, int], ChannelListing] = {}
+        self.fetches = 0
+
+    def get(self, server: tuple[str, int]) -> tuple[ChannelListing, bool]:
+        """The server's listing, and whether the caller has to fetch it"""
+        now = time.monotonic()
+        with self.lock:
+            listing = self.listings.get(server)
+            if listing is not None and listing.fresh(self.ttl, now):
+                return listing, False
+            listing = self.listings[server] = ChannelListing()
+            self.fetches += 1
+            return listing, True
+
+    def clear(self) -> None:
+        with self.lock:
+            self.listings.clear()
+
+
+channel_lists = ChannelListCache(config.LIST_CACHE_TTL)
@@ -1,8 +1,17 @@
 import select
 import socket
+import ssl
+import threading
 from random import randint
 from typing import Self
 
+from helpers.logs import SessionLog, session_ids
+from helpers.tracing import tracer
+from irc.caps import SASL_FAILED, WANTED_CAPS, cap_cache, parse_caps, sasl_plain
+from irc.ignore import IgnoreList
+from irc.isupport import ISupport
+from irc.tls import tls_sessions
+
 
 class IrcUser:
     def __init__(self, nick: str, username: str, host: str, realname: str = None):
@@ -31,11 +40,38 @@ class IrcUser:
             raise ValueError("Invalid user string " + raw) from exc
 
 
+# Bytes queued for a server that is not reading before the session gives up
+MAX_OUTBOX = 1 << 20
+# A non-blocking socket that has to wait before the call can go on
+WOULD_BLOCK = (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError)
+
+TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+def unescape_tag(value: str) -> str:
+    if "\\" not in value:
+        return value
+    unescaped, chars = [], iter(value)
+    for char in chars:
+        if char == "\\":
+            char = TAG_ESCAPES.get(next(chars, ""), "")
+        unescaped.append(char)
+    return "".join(unescaped)
+
+
 class IrcMessage:
-    def __init__(self, source: IrcUser | str | None, command: str, params: str) -> None:
+    def __init__(
+        self,
+        source: IrcUser | str | None,
+        command: str,
+        params: str,
+        tags: dict[str, str] | None = None,
+    ) -> None:
         self.source = source
         self.command = command
         self.params = params
+        self.tags = tags or {}
+        self.trace = None
 
     def __str__(self) -> str:
         return f"<Message source={self.source} command={self.command}>"
@@ -57,10 +93,14 @@ class IrcMessage:
     def from_raw(cls, raw: str) -> Self:
         """Construct a Message object from raw IRC server output"""
         stripped = raw.strip("\r\n")
+        tags = {}
         try:
             if stripped.startswith("@"):
-                raise NotImplementedError("This client currently does not support tags")
-            elif stripped.startswith(":"):
+                raw_tags, stripped = stripped[1:].split(" ", 1)
+                for tag in raw_tags.split(";"):
+                    key, _, value = tag.partition("=")
+                    tags[key] = unescape_tag(value)
+            if stripped.startswith(":"):
                 src, cmd, *params = stripped.split(" ")
                 src = src[1:]
                 try:
@@ -70,7 +110,7 @@ class IrcMessage:
             else:
                 src = None
                 cmd, *params = stripped.split(" ")
-            return cls(src, cmd, " ".join(params))
+            return cls(src, cmd, " ".join(params), tags)
         except ValueError as exc:
             raise ValueError("Invalid message string " + raw) from exc
 
@@ -80,30 +120,200 @@ class IrcBaseClient:
         self.nick = nick
         self.password = password
         self.username = username
+        self.session_id = next(session_ids)
+        self.log = SessionLog("registration", self)
         self.socket = None
+        # Held across a whole write, so lines from different threads never
+        # interleave, and around each call into the socket, which the reactor
+        # thread reads while page threads write (an SSL object is not
+        # thread-safe)
+        self.send_lock = threading.Lock()
+        self.socket_lock = threading.Lock()
+        # Written data the server could not take yet, sent by the reactor
+        self.outbox = bytearray()
         self.connected = False
         self.is_oper = False
-
-    def connect(self, hostname: str, port: int = 6667) -> None:
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect((hostname, port))
-        self.socket.settimeout(10)
-        self.initial_auth()
+        self.inbox = None
+        self.reactor = None
+        self.isupport = ISupport()
+        self.ignores = IgnoreList(self.isupport)
+        self.server = None
+        # Where server messages come from, from the 001 reply once registered
+        self.server_name = None
+        self.autojoin = []
+        self.caps: set[str] = set()
+        self.cap_offered: dict[str, str] = {}
+        self.cap_requested = None
+        self.cap_retried = False
+        self.negotiating = True
+        self.sasl_pending = False
+        self.sasl_authenticated = False
+        self.stale_sasl_replies = 0
+
+    def connect(
+        self,
+        hostname: str,
+        port: int = 6667,
+        tls: bool = False,
+        autojoin: list[str] = (),
+        negotiate: bool = True,
+    ) -> None:
+        """Register with the server, negotiating IRCv3 capabilities and SASL
+
+        Registration is pipelined: CAP LS, NICK and USER go out in one write, and
+        when the server's capabilities are known from an earlier connection the
+        CAP REQ and SASL start go with them. Channels in autojoin are joined in
+        the same write as CAP END. Returns once the first 005 line has arrived.
+        """
+        self.socket = socket.create_connection((hostname, port), timeout=10)
+        if tls:
+            self.socket = tls_sessions.wrap(self.socket, hostname, port)
+        self.server = (hostname, port)
+        self.server_name = hostname
+        self.autojoin = list(autojoin)
+        if negotiate:
+            self.start_registration()
+        else:
+            self.initial_auth()
 
         while True:
-            message = self.get_message()
+            message = self.get_message(timeout=1)
             if message:
-                print(repr(message).strip())
+                self.log.info(
+                    "%s %s",
+                    message.command,
+                    message.params,
+                    extra={"command": message.command},
+                )
                 match message.command:
+                    case "CAP":
+                        self.negotiate(message)
+                    case "AUTHENTICATE" if self.sasl_pending and message.params == "+":
+                        self.send_lines(
+                            [
+                                IrcMessage(None, "AUTHENTICATE", chunk)
+                                for chunk in sasl_plain(self.nick, self.password)
+                            ]
+                        )
+                    case "903":  # SASL authentication successful
+                        self.sasl_authenticated = True
+                        self.sasl_pending = False
+                        self.end_negotiation()
+                    case code if code in SASL_FAILED or (
+                        code == "421" and " AUTHENTICATE " in f" {message.params}"
+                    ):
+                        if self.stale_sasl_replies:
+                            self.stale_sasl_replies -= 1
+                        else:
+                            self.sasl_pending = False
+                            self.end_negotiation()
+                    case "001":
+                        # The server's own name, which may differ from hostname
+                        if isinstance(message.source, str):
+                            self.server_name = message.source
+                        if self.negotiating:
+                            # Registered without CAP END: no capability support
+                            self.negotiating = False
+                            self.join_channels(self.autojoin)
                     case "005":
+                        self.isupport.update(message.params)
                         break
                     case "433":  # Nickname already in use
                         self.nick = f"Guest_{randint(10, 99)}"
-                        self.initial_auth()
-                        break
+                        self.set_nick(self.nick)
 
+        if tls:
+            tls_sessions.remember(hostname, port, self.socket)
         self.connected = True
 
+    def start_registration(self) -> None:
+        lines = [
+            IrcMessage(None, "CAP", "LS 302"),
+            IrcMessage(None, "NICK", self.nick),
+            IrcMessage(None, "USER", f"{self.username} 0 * :{self.username}"),
+        ]
+        if (offered := cap_cache.get(*self.server)) is not None:
+            lines.extend(self.request_caps(offered))
+        self.send_lines(lines)
+
+    def request_caps(self, offered: dict[str, str]) -> list[IrcMessage]:
+        """CAP REQ for the wanted caps, then the SASL start or CAP END
+
+        The server handles lines in order, so without SASL there is nothing to
+        wait for: CAP END (and the autojoin JOINs) can follow the request.
+        """
+        wanted = [cap for cap in WANTED_CAPS if cap in offered]
+        if "sasl" in wanted:
+            mechanisms = offered["sasl"]
+            if not self.password or mechanisms and "PLAIN" not in mechanisms.split(","):
+                wanted.remove("sasl")
+        self.cap_requested = wanted
+        lines = []
+        if wanted:
+            lines.append(IrcMessage(None, "CAP", f"REQ :{' '.join(wanted)}"))
+        if "sasl" in wanted:
+            self.sasl_pending = True
+            lines.append(IrcMessage(None, "AUTHENTICATE", "PLAIN"))
+        elif self.negotiating:
+            lines.extend(self.negotiation_end_lines())
+        return lines
+
+    def negotiate(self, message: IrcMessage) -> None:
+        _, subcommand, *rest = message.params.split(" ", 2)
+        rest = rest[0] if rest else ""
+        match subcommand:
+            case "LS" if rest.startswith("* "):  # More LS lines follow
+                self.cap_offered.update(parse_caps(rest[2:]))
+            case "LS":
+                self.cap_offered.update(parse_caps(rest))
+                cap_cache.set(*self.server, dict(self.cap_offered))
+                if self.cap_requested is None:
+                    self.send_lines(self.request_caps(self.cap_offered))
+            case "ACK":
+                for cap in rest.lstrip(":").split():
+                    if cap.startswith("-"):
+                        self.caps.discard(cap[1:])
+                    else:
+                        self.caps.add(cap)
+                if self.negotiating and not self.sasl_pending:
+                    self.end_negotiation()
+            case "NAK" if self.cap_requested is not None:
+                # The request built from a cached LS was refused; LS has arrived
+                # by now, so ask again for what this server actually offers
+                if self.sasl_pending:
+                    self.stale_sasl_replies += 1
+                    self.sasl_pending = False
+                if self.cap_retried:
+                    self.end_negotiation()
+                elif lines := self.request_caps(self.cap_offered):
+                    self.cap_retried = True
+                    self.send_lines(lines)
+            case "NEW":
+                offered = parse_caps(rest)
+                self.cap_offered.update(offered)
+                wanted = [
+                    cap for cap in WANTED_CAPS if cap in offered and cap != "sasl"
+                ]
+                if wanted:
+                    self.send(IrcMessage(None, "CAP", f"REQ :{' '.join(wanted)}"))
+            case "DEL":
+                for cap in parse_caps(rest):
+                    self.cap_offered.pop(cap, None)
+                    self.caps.discard(cap)
+
+    def negotiation_end_lines(self) -> list[IrcMessage]:
+        self.negotiating = False
+        lines = [IrcMessage(None, "CAP", "END")]
+        lines.extend(
+            IrcMessage(None, "JOIN", batch)
+            for batch in self.isupport.batch_targets("JOIN", self.autojoin)
+        )
+        return lines
+
+    def end_negotiation(self) -> None:
+        if self.negotiating:
+            self.send_lines(self.negotiation_end_lines())
+
     def initial_auth(self):
         if self.password:
             self.send(IrcMessage(None, "PASS", self.password))
@@ -111,21 +321,81 @@ class IrcBaseClient:
         self.send(IrcMessage(None, "USER", f"{self.username} 0 * :{self.username}"))
 
     def send(self, message: IrcMessage) -> None:
-        raw = bytes(message)
-        self.socket.send(raw)
-
-    def get_message(self) -> IrcMessage | None:
-        readable, _, _ = select.select([self.socket], [], [], 0)
-        if readable:
+        self.write(bytes(message))
+
+    def send_lines(self, messages: list[IrcMessage]) -> None:
+        """Send several lines in one write"""
+        self.write(b"".join(bytes(message) for message in messages))
+
+    def write(self, data: bytes) -> None:
+        """Write all of data, from any thread
+
+        Until the reactor takes the socket over, this blocks (within the
+        connection timeout). After that the socket is non-blocking: what the
+        server cannot take yet is queued and sent by the reactor once the
+        socket is writable, so a slow server never stalls the reactor thread,
+        which answers PINGs for every session.
+        """
+        with self.send_lock:
+            if self.reactor is None:
+                remaining = memoryview(data)
+                while remaining:
+                    with self.socket_lock:
+                        remaining = remaining[self.socket.send(remaining) :]
+                return
+            if len(self.outbox) + len(data) > MAX_OUTBOX:
+                raise ConnectionError("IRC server stopped reading")
+            watched = bool(self.outbox)
+            self.outbox += data
+            if not self.send_outbox() and not watched:
+                self.reactor.watch_writes(self)
+
+    def flush(self) -> bool:
+        """Send queued data the socket now has room for; True once all is sent"""
+        with self.send_lock:
+            return self.send_outbox()
+
+    def send_outbox(self) -> bool:
+        # Called with send_lock held. A TLS write that has to wait is retried
+        # with the same data at the front of the outbox, as OpenSSL requires
+        while self.outbox:
+            try:
+                with self.socket_lock:
+                    sent = self.socket.send(self.outbox)
+            except WOULD_BLOCK:
+                return False
+            del self.outbox[:sent]
+        return True
+
+    def get_message(self, timeout: float = 0) -> IrcMessage | None:
+        if self.inbox is not None:
+            # Lines are read and parsed by the shared reactor thread
+            try:
+                message = self.inbox.popleft()
+            except IndexError:
+                return None
+            if message.trace:
+                message.trace.mark("queue")
+            return message
+        # TLS sockets can hold decrypted bytes that select() does not see
+        readable = isinstance(self.socket, ssl.SSLSocket) and self.socket.pending()
+        if readable or select.select([self.socket], [], [], timeout)[0]:
+            trace = tracer.start()
             # Read reply one byte at a time
             reply = b""
             while c := self.socket.recv(1):
                 reply = reply + c
                 if c == b"\n":
+                    if trace:
+                        trace.mark("recv")
                     message = IrcMessage.from_raw(reply.decode("utf-8"))
                     if message.command == "PING":
                         self.pong(message.params[1:])
                         return None
+                    if trace:
+                        trace.command = message.command
+                        trace.mark("parse")
+                        message.trace = trace
                     return message
 
     def get_all_messages(self) -> list[IrcMessage]:
@@ -137,14 +407,42 @@ class IrcBaseClient:
     def join(self, channel: str) -> None:
         self.send(IrcMessage(None, "JOIN", channel))
 
+    def join_channels(self, channels: list[str]) -> None:
+        for batch in self.isupport.batch_targets("JOIN", channels):
+            self.send(IrcMessage(None, "JOIN", batch))
+
     def part(self, channel: str, reason: str) -> None:
         self.send(IrcMessage(None, "PART", f"{channel} {reason}"))
 
-    def send_private_message(self, to: str, text: str) -> None:
-        self.send(IrcMessage(None, "PRIVMSG", f"{to} {text}"))
+    def send_private_message(self, to: str | list[str], text: str) -> None:
+        self.send_to_targets("PRIVMSG", to, text)
+
+    def send_notice(self, message_target: str | list[str], text: str) -> None:
+        self.send_to_targets("NOTICE", message_target, text)
+
+    def send_to_targets(
+        self, command: str, targets: str | list[str], text: str
+    ) -> None:
+        if isinstance(targets, str):
+            targets = [targets]
+        reserved = len(f" :{text}".encode())
+        for batch in self.isupport.batch_targets(command, targets, reserved):
+            self.send(IrcMessage(None, command, f"{batch} :{text}"))
+
+    def chathistory(
+        self, subcommand: str, target: str, reference: str, limit: int
+    ) -> None:
+        self.send(
+            IrcMessage(
+                None, "CHATHISTORY", f"{subcommand} {target} {reference} {limit}"
+            )
+        )
+
+    def whois(self, nick: str) -> None:
+        self.send(IrcMessage(None, "WHOIS", nick))
 
-    def send_notice(self, message_target: str, text: str) -> None:
-        self.send(IrcMessage(None, "NOTICE", f"{message_target} {text}"))
+    def list_channels(self) -> None:
+        self.send(IrcMessage(None, "LIST", ""))
 
     def get_names(self, channel: str) -> None:
         self.send(IrcMessage(None, "NAMES", channel))
@@ -181,6 +479,8 @@ class IrcBaseClient:
 
     def disconnect(self, message: str = "Quitting") -> None:
         self.send(IrcMessage(None, "QUIT", message))
+        if self.reactor:
+            self.reactor.unregister(self)
         self.socket.shutdown(socket.SHUT_RDWR)
         self.socket.close()
         self.connected = False
@@ -0,0 +1,161 @@
+import re
+from typing import Iterable
+
+from irc.isupport import ISupport
+
+IGNORES_KEY = "lizardchat.ignores"
+# /ignore types and the commands each one hides
+IGNORE_TYPES = {
+    "privmsg": ("PRIVMSG",),
+    "notice": ("NOTICE",),
+    "joins": ("JOIN", "PART", "QUIT"),
+}
+# Dropped by the reactor before parsing; JOIN/PART/QUIT still have to update
+# channel members, so SessionState only hides their lines
+EARLY_COMMANDS = ("PRIVMSG", "NOTICE")
+
+
+def normalize_mask(mask: str) -> str:
+    """Complete a bare nick or a partial mask to nick!user@host"""
+    if "!" not in mask and "@" not in mask:
+        return f"{mask}!*@*"
+    if "!" not in mask:
+        return f"*!{mask}"
+    if "@" not in mask:
+        return f"{mask}@*"
+    return mask
+
+
+def glob_pattern(mask: str) -> str:
+    # Only * and ? are wildcards; nicks may contain [ ] \ and the like
+    return "".join(
+        ".*" if char == "*" else "." if char == "?" else re.escape(char)
+        for char in mask
+    )
+
+
+class IgnoreList:
+    """nick!user@host glob masks, each hiding some of the IGNORE_TYPES
+
+    Masks are compiled per command into sets of plain nicks ("nick!*@*") and
+    hosts ("*!*@host"), a tuple of host suffixes ("*!*@*.host") and one regex
+    alternation of everything else, rebuilt lazily after a change or a new
+    CASEMAPPING. The reactor thread reads the list
+    while the page edits it, so edits replace self.masks instead of mutating it,
+    and compiled matchers are cached along with the masks they were built from.
+    """
+
+    def __init__(self, isupport: ISupport) -> None:
+        self.isupport = isupport
+        self.masks: dict[str, tuple[str, ...]] = {}
+        # (masks, casemapping, matchers), replaced as one so a compile racing
+        # an edit can never pass off matchers for old masks as current
+        self.compiled = None
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def set_masks(self, entries: Iterable[tuple[str, Iterable[str]]]) -> None:
+        masks = {}
+        for mask, types in entries:
+            if mask.strip() and (types := tuple(t for t in types if t in IGNORE_TYPES)):
+                masks[normalize_mask(mask)] = types
+        self.masks = masks
+
+    def others(self, mask: str) -> list[tuple[str, tuple[str, ...]]]:
+        folded = self.isupport.casefold(normalize_mask(mask))
+        return [
+            item
+            for item in self.masks.items()
+            if self.isupport.casefold(item[0]) != folded
+        ]
+
+    def add(self, mask: str, types: Iterable[str] = IGNORE_TYPES) -> str:
+        mask = normalize_mask(mask)
+        self.set_masks([*self.others(mask), (mask, types)])
+        return mask
+
+    def remove(self, mask: str) -> bool:
+        others = self.others(mask)
+        if len(others) == len(self.masks):
+            return False
+        self.set_masks(others)
+        return True
+
+    def compile(
+        self, masks: dict[str, tuple[str, ...]]
+    ) -> dict[str, tuple[set[str], set[str], tuple, re.Pattern]]:
+        nicks: dict[str, set[str]] = {}
+        hosts: dict[str, set[str]] = {}
+        suffixes: dict[str, list[str]] = {}
+        patterns: dict[str, list[str]] = {}
+        for mask, types in masks.items():
+            folded = self.isupport.casefold(mask)
+            nick, _, rest = folded.partition("!")
+            user, _, host = rest.partition("@")
+            literal_host = host.lstrip("*")
+            for command in {c for name in types for c in IGNORE_TYPES[name]}:
+                if rest == "*@*" and not any(char in nick for char in "*?"):
+                    nicks.setdefault(command, set()).add(nick)
+                elif nick == user == "*" and not any(c in literal_host for c in "*?"):
+                    if literal_host == host:
+                        hosts.setdefault(command, set()).add(host)
+                    else:
+                        suffixes.setdefault(command, []).append(literal_host)
+                else:
+                    patterns.setdefault(command, []).append(glob_pattern(folded))
+        commands = nicks.keys() | hosts.keys() | suffixes.keys() | patterns.keys()
+        matchers = {
+            command: (
+                nicks.get(command, set()),
+                hosts.get(command, set()),
+                tuple(suffixes.get(command, ())),
+                re.compile("|".join(patterns[command]), re.DOTALL)
+                if command in patterns
+                else None,
+            )
+            for command in commands
+        }
+        return matchers
+
+    def matches(self, source: str, command: str) -> bool:
+        """Whether a nick!user@host source is ignored for a command"""
+        masks, casemapping = self.masks, self.isupport.casemapping
+        compiled = self.compiled
+        if compiled is not None and compiled[0] is masks and compiled[1] == casemapping:
+            matchers = compiled[2]
+        else:
+            matchers = self.compile(masks)
+            self.compiled = (masks, casemapping, matchers)
+        if (matcher := matchers.get(command)) is None:
+            return False
+        nicks, hosts, suffixes, pattern = matcher
+        folded = self.isupport.casefold(source)
+        host = folded.rpartition("@")[2]
+        return (
+            folded.partition("!")[0] in nicks
+            or host in hosts
+            or (suffixes and host.endswith(suffixes))
+            or (pattern is not None and pattern.fullmatch(folded) is not None)
+        )
+
+    def drops(self, line: str) -> bool:
+        """Whether a raw server line is an ignored PRIVMSG or NOTICE
+
+        Only the source and command are split off, so a dropped line never
+        reaches IrcMessage.from_raw, the handlers or the page.
+        """
+        if line.startswith("@"):
+            tags, _, line = line.partition(" ")
+            # chathistory pages are counted whole; batch_ended filters them
+            if "batch=" in tags:
+                return False
+        if not line.startswith(":"):
+            return False
+        source, _, rest = line[1:].partition(" ")
+        command = rest.partition(" ")[0]
+        return (
+            command in EARLY_COMMANDS
+            and "!" in source
+            and self.matches(source, command)
+        )
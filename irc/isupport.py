@@ -0,0 +1,147 @@
+import string
+from dataclasses import dataclass, field
+
+# Longest line a server accepts, including the trailing CRLF
+MAX_LINE_BYTES = 512
+
+CASEMAPPINGS = {
+    "ascii": str.maketrans(string.ascii_uppercase, string.ascii_lowercase),
+    "rfc1459": str.maketrans(
+        string.ascii_uppercase + "[]\\~", string.ascii_lowercase + "{}|^"
+    ),
+    "strict-rfc1459": str.maketrans(
+        string.ascii_uppercase + "[]\\", string.ascii_lowercase + "{}|"
+    ),
+}
+NICK_SPECIALS = "[]\\`_^{|}"
+NICK_FIRST = set(string.ascii_letters + NICK_SPECIALS)
+NICK_REST = NICK_FIRST | set(string.digits + "-")
+CHANNEL_FORBIDDEN = set(" ,\x07\r\n\0")
+
+
+@dataclass(slots=True)
+class ISupport:
+    """Server capabilities advertised in RPL_ISUPPORT (005)
+
+    Defaults are the RFC 1459 behaviour assumed before the server has sent 005.
+    """
+
+    casemapping: str = "rfc1459"
+    chantypes: str = "#&"
+    prefix_modes: str = "ov"
+    prefix_symbols: str = "@+"
+    nicklen: int | None = None
+    channellen: int | None = None
+    targmax: dict[str, int | None] = field(default_factory=dict)
+    tokens: dict[str, str] = field(default_factory=dict)
+
+    def update(self, params: str) -> None:
+        """Apply the TOKEN[=value] parameters of one 005 line"""
+        _, *tokens = params.split(" :", 1)[0].split(" ")
+        for token in tokens:
+            name, _, value = token.partition("=")
+            if name.startswith("-"):
+                self.tokens.pop(name[1:], None)
+                self.reset(name[1:])
+                continue
+            self.tokens[name] = value
+            match name:
+                case "CASEMAPPING" if value in CASEMAPPINGS:
+                    self.casemapping = value
+                case "CHANTYPES":
+                    self.chantypes = value
+                case "PREFIX" if value.startswith("(") and ")" in value:
+                    modes, symbols = value[1:].split(")", 1)
+                    self.prefix_modes, self.prefix_symbols = modes, symbols
+                case "NICKLEN" if value.isdigit():
+                    self.nicklen = int(value)
+                case "CHANNELLEN" if value.isdigit():
+                    self.channellen = int(value)
+                case "TARGMAX":
+                    self.targmax = {}
+                    for limit in filter(None, value.split(",")):
+                        command, _, count = limit.partition(":")
+                        self.targmax[command.upper()] = (
+                            int(count) if count.isdigit() else None
+                        )
+
+    def reset(self, name: str) -> None:
+        default = ISupport()
+        match name:
+            case "CASEMAPPING":
+                self.casemapping = default.casemapping
+            case "CHANTYPES":
+                self.chantypes = default.chantypes
+            case "PREFIX":
+                self.prefix_modes = default.prefix_modes
+                self.prefix_symbols = default.prefix_symbols
+            case "NICKLEN":
+                self.nicklen = None
+            case "CHANNELLEN":
+                self.channellen = None
+            case "TARGMAX":
+                self.targmax = {}
+
+    def casefold(self, name: str) -> str:
+        return name.translate(CASEMAPPINGS[self.casemapping])
+
+    def equal(self, a: str, b: str) -> bool:
+        return self.casefold(a) == self.casefold(b)
+
+    def is_channel(self, name: str) -> bool:
+        return bool(name) and name[0] in self.chantypes
+
+    def strip_prefix(self, name: str) -> tuple[str, str]:
+        """Split "@+nick" into ("@+", "nick")"""
+        nick = name.lstrip(self.prefix_symbols)
+        return name[: len(name) - len(nick)], nick
+
+    def nick_error(self, nick: str) -> str | None:
+        if not nick:
+            return "Nickname is empty"
+        if self.nicklen and len(nick) > self.nicklen:
+            return f"Nicknames can be at most {self.nicklen} characters"
+        if nick[0] not in NICK_FIRST or not set(nick) <= NICK_REST:
+            return (
+                "Nicknames use letters, digits and []\\`_^{|}- "
+                "and can't start with a digit or -"
+            )
+        return None
+
+    def channel_error(self, channel: str) -> str | None:
+        if not self.is_channel(channel):
+            return f"Channel names start with one of {self.chantypes}"
+        if self.channellen and len(channel) > self.channellen:
+            return f"Channel names can be at most {self.channellen} characters"
+        if set(channel) & CHANNEL_FORBIDDEN:
+            return "Channel names can't contain spaces or commas"
+        return None
+
+    def batch_targets(
+        self, command: str, targets: list[str], reserved: int = 0
+    ) -> list[str]:
+        """Comma-join targets into as few lines as TARGMAX and line length allow
+
+        reserved is the number of bytes the rest of the line needs after the
+        target list, e.g. the " :text" of a PRIVMSG.
+        """
+        command = command.upper()
+        if command in self.targmax:
+            limit = self.targmax[command]
+        else:
+            # Without TARGMAX only JOIN is safe to send to several targets at once
+            limit = None if command == "JOIN" else 1
+        room = MAX_LINE_BYTES - len(command) - len(" \r\n") - reserved
+        batches, batch, size = [], [], 0
+        for target in targets:
+            length = len(target.encode()) + (1 if batch else 0)
+            if batch and (
+                (limit is not None and len(batch) >= limit) or size + length > room
+            ):
+                batches.append(",".join(batch))
+                batch, size, length = [], 0, len(target.encode())
+            batch.append(target)
+            size += length
+        if batch:
+            batches.append(",".join(batch))
+        return batches
@@ -0,0 +1,242 @@
+import contextlib
+import logging
+import selectors
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from helpers.tracing import tracer
+from irc.client import WOULD_BLOCK, IrcBaseClient, IrcMessage
+
+log = logging.getLogger("lizardchat.reactor")
+
+
+class ReactorConnection:
+    __slots__ = ("client", "wake", "buffer")
+
+    def __init__(self, client: IrcBaseClient, wake: Callable[[], None]) -> None:
+        self.client = client
+        self.wake = wake
+        self.buffer = b""
+
+
+class IrcReactor:
+    """One selector thread that reads every session's IRC socket
+
+    Complete lines are parsed and queued on the owning client's inbox, PINGs are
+    answered in place and ignored messages dropped before parsing. The session's
+    wake callback is called once per read that queued anything, so only pages
+    that actually received data are scheduled. Writes the server cannot take
+    yet wait in the client's outbox until the socket is writable again.
+
+    Every session shares this thread, so a line that fails to parse or
+    dispatch is logged and dropped, and a connection that fails is closed;
+    neither stops reads for the others.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.selector = None
+        self.thread = None
+        self.waker_r = None
+        self.waker_w = None
+
+    def start(self) -> None:
+        self.selector = selectors.DefaultSelector()
+        self.waker_r, self.waker_w = socket.socketpair()
+        self.waker_r.setblocking(False)
+        self.selector.register(self.waker_r, selectors.EVENT_READ)
+        self.thread = threading.Thread(
+            target=self.run, name="irc-reactor", daemon=True
+        )
+        self.thread.start()
+
+    def register(self, client: IrcBaseClient, wake: Callable[[], None]) -> None:
+        # Registration is done; from here a partial TLS record must not hold
+        # up the thread every session is read on
+        client.socket.setblocking(False)
+        client.inbox = deque()
+        client.reactor = self
+        self.submit(("register", ReactorConnection(client, wake), None))
+
+    def unregister(self, client: IrcBaseClient) -> None:
+        if client.reactor is not self:
+            return
+        client.reactor = None
+        done = threading.Event()
+        self.submit(("unregister", client, done))
+        if threading.current_thread() is not self.thread:
+            done.wait(1)
+
+    def submit(self, request: tuple) -> None:
+        with self.lock:
+            if self.thread is None:
+                self.start()
+            self.pending.append(request)
+        self.waker_w.send(b"\0")
+
+    def watch_writes(self, client: IrcBaseClient) -> None:
+        self.submit(("write", client, None))
+
+    def connection_count(self) -> int:
+        return len(self.selector.get_map()) - 1 if self.selector else 0
+
+    def run(self) -> None:
+        while True:
+            for key, events in self.selector.select():
+                if key.data is None:
+                    self.apply_pending()
+                    continue
+                try:
+                    if events & selectors.EVENT_WRITE:
+                        self.flush(key.data)
+                    if events & selectors.EVENT_READ:
+                        self.read(key.data)
+                except Exception:
+                    log.exception(
+                        "Closing connection after a failed read or write",
+                        extra={"session": key.data.client.session_id},
+                    )
+                    self.close(key.data)
+
+    def apply_pending(self) -> None:
+        try:
+            while self.waker_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            with self.lock:
+                if not self.pending:
+                    return
+                action, target, done = self.pending.popleft()
+            if action == "register":
+                try:
+                    self.selector.register(
+                        target.client.socket, selectors.EVENT_READ, target
+                    )
+                except (OSError, ValueError):
+                    # The socket was closed before the reactor got to it
+                    log.exception(
+                        "Could not register connection",
+                        extra={"session": target.client.session_id},
+                    )
+                    self.close(target)
+            elif action == "write":
+                self.watch(target, selectors.EVENT_READ | selectors.EVENT_WRITE)
+            else:
+                self.remove(target)
+                done.set()
+
+    def watch(self, client: IrcBaseClient, events: int) -> None:
+        try:
+            key = self.selector.get_key(client.socket)
+        except (KeyError, ValueError):
+            return  # Unregistered or closed since
+        if key.events != events:
+            self.selector.modify(client.socket, events, key.data)
+
+    def flush(self, connection: ReactorConnection) -> None:
+        if connection.client.flush():
+            self.watch(connection.client, selectors.EVENT_READ)
+
+    def remove(self, client: IrcBaseClient) -> None:
+        with contextlib.suppress(KeyError, ValueError):
+            self.selector.unregister(client.socket)
+
+    def close(self, connection: ReactorConnection) -> None:
+        """Stop reading a connection and tell its session it is gone
+
+        The ERROR goes through the session's inbox like any server line, so
+        its state engine ends the session the same way a server ERROR does.
+        """
+        client = connection.client
+        self.remove(client)
+        client.reactor = None
+        client.inbox.append(IrcMessage(None, "ERROR", ":Connection closed"))
+        client.connected = False
+        self.wake(connection)
+
+    def wake(self, connection: ReactorConnection) -> None:
+        # Throttled and detached sessions process their lines right here
+        try:
+            connection.wake()
+        except Exception:
+            log.exception(
+                "Session failed to handle its lines",
+                extra={"session": connection.client.session_id},
+            )
+
+    def read(self, connection: ReactorConnection) -> None:
+        client = connection.client
+        # Taken only while tracing, for the recv stage of traced lines
+        recv_started = time.perf_counter_ns() if tracer.enabled else None
+        try:
+            with client.socket_lock:
+                data = client.socket.recv(4096)
+                # Drain what the TLS layer already decrypted; select() won't see it
+                tls = isinstance(client.socket, ssl.SSLSocket)
+                while tls and client.socket.pending():
+                    data += client.socket.recv(client.socket.pending())
+        except WOULD_BLOCK:
+            # Only part of a TLS record is in; select() reports the rest
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.close(connection)
+            return
+        received = None
+        if recv_started:
+            received = (recv_started, time.perf_counter_ns())
+
+        *lines, connection.buffer = (connection.buffer + data).split(b"\n")
+        queued = False
+        for line in lines:
+            if not line.strip(b"\r"):
+                continue
+            try:
+                queued |= self.dispatch(client, line, received)
+            except Exception:
+                log.exception(
+                    "Dropped a line that could not be handled: %r",
+                    line,
+                    extra={"session": client.session_id},
+                )
+        if queued:
+            self.wake(connection)
+
+    def dispatch(
+        self,
+        client: IrcBaseClient,
+        line: bytes,
+        received: tuple[int, int] | None = None,
+    ) -> bool:
+        """Parse a line onto the client's inbox; False if nothing was queued
+
+        received is when the recv() that returned the line started and ended,
+        if tracing is enabled.
+        """
+        line = line.decode("utf-8", errors="replace")
+        if client.ignores and client.ignores.drops(line):
+            return False
+        trace = tracer.start(received[0]) if received else None
+        if trace:
+            trace.mark("recv", received[1])
+        message = IrcMessage.from_raw(line)
+        if message.command == "PING":
+            client.pong(message.params[1:])
+            return False
+        if trace:
+            trace.command = message.command
+            trace.mark("parse")
+            message.trace = trace
+        client.inbox.append(message)
+        return True
+
+
+reactor = IrcReactor()
@@ -72,6 +72,7 @@ RPL_LIST = "322"
 RPL_LISTEND = "323"
 RPL_CHANNELMODEIS = "324"
 RPL_UNIQOPIS = "325"
+RPL_WHOISACCOUNT = "330"
 RPL_NOTOPIC = "331"
 RPL_TOPIC = "332"
 RPL_TOPICWHOTIME = "333"
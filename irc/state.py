@@ -0,0 +1,744 @@
+import datetime
+from dataclasses import dataclass
+from typing import Callable, TypeAlias
+
+from irc import formatchars, replycodes
+from irc.channellist import ChannelListing, channel_lists
+from irc.client import IrcBaseClient, IrcMessage, IrcUser
+from irc.userinfo import UserInfo, user_info
+from helpers.highlight import HighlightRules
+from helpers.logs import SessionLog
+
+
+HandlerResponse: TypeAlias = tuple[str, str]
+
+FORMAT_CHARS = (
+    formatchars.BOLD,
+    formatchars.ITALIC,
+    formatchars.UNDERLINE,
+    formatchars.STRIKETHROUGH,
+    formatchars.MONOSPACE,
+    formatchars.COLOR,
+    formatchars.RESET,
+)
+# Lines fetched per CHATHISTORY request, unless the server allows fewer
+HISTORY_PAGE = 50
+
+
+@dataclass(frozen=True, slots=True)
+class MessageAppended:
+    buffer: str
+    nick: str
+    text: str
+    # "%H:%M:%S" from the server-time tag, None to use the time it is shown
+    timestamp: str | None = None
+    # Someone else's message matching the user's highlight rules
+    highlight: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class MembersReset:
+    channel: str
+    nicks: list[str]
+
+
+@dataclass(frozen=True, slots=True)
+class MemberJoined:
+    channel: str
+    nick: str
+
+
+@dataclass(frozen=True, slots=True)
+class MemberParted:
+    channel: str
+    nick: str
+
+
+@dataclass(frozen=True, slots=True)
+class MemberQuit:
+    nick: str
+    channels: list[str]
+
+
+@dataclass(frozen=True, slots=True)
+class NickChanged:
+    old_nick: str
+    new_nick: str
+    is_self: bool
+    channels: list[str]
+
+
+@dataclass(frozen=True, slots=True)
+class TopicChanged:
+    channel: str
+    topic: str
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryLoaded:
+    buffer: str
+    # (timestamp, nick, text, highlight), oldest first; all older than the
+    # buffer's lines
+    lines: list[tuple[str, str, str, bool]]
+
+
+@dataclass(frozen=True, slots=True)
+class FatalError:
+    message: str
+
+
+StateEvent: TypeAlias = (
+    MessageAppended
+    | MembersReset
+    | MemberJoined
+    | MemberParted
+    | MemberQuit
+    | NickChanged
+    | TopicChanged
+    | HistoryLoaded
+    | FatalError
+)
+
+
+def parse_server_time(time: str | None) -> datetime.datetime | None:
+    try:
+        return datetime.datetime.fromisoformat(time) if time else None
+    except ValueError:
+        return None
+
+
+def server_time(message: IrcMessage) -> str | None:
+    """Local "%H:%M:%S" of the message's server-time tag, if it has one"""
+    if sent := parse_server_time(message.tags.get("time")):
+        return sent.astimezone().strftime("%H:%M:%S")
+    return None
+
+
+class SessionState:
+    """IRC session state, independent of any UI
+
+    Consumes IrcMessages and publishes StateEvents to subscribers, which are
+    called synchronously in the order they subscribed.
+    """
+
+    def __init__(self, client: IrcBaseClient) -> None:
+        self.client = client
+        # Channels and nicks are keyed by their casefolded form (see ISupport);
+        # members maps each channel to {folded nick: mode prefixes + nick}
+        self.members: dict[str, dict[str, str]] = {}
+        self.topics: dict[str, str] = {}
+        self.pending_names: dict[str, list[str]] = {}
+        # Open chathistory batches by reference tag: (target, messages)
+        self.batches: dict[str, tuple[str, list[IrcMessage]]] = {}
+        # Server time of the oldest line each buffer holds, the page size of
+        # its outstanding CHATHISTORY request and which buffers have no more
+        self.oldest: dict[str, str] = {}
+        self.history_pending: dict[str, int] = {}
+        self.history_fetched: set[str] = set()
+        self.history_complete: set[str] = set()
+        self.highlights = HighlightRules(client.nick)
+        # The shared listing this session's LIST reply is feeding, if any
+        self.listing: ChannelListing | None = None
+        # WHOIS replies being collected, by casefolded nick
+        self.whois: dict[str, UserInfo] = {}
+        self.subscribers: list[Callable[[StateEvent], None]] = []
+        self.log = SessionLog("unhandled", client)
+        self.handlers = MessageHandlers(client, self)
+
+    def subscribe(self, callback: Callable[[StateEvent], None]) -> None:
+        self.subscribers.append(callback)
+
+    def emit(self, event: StateEvent) -> None:
+        for callback in self.subscribers:
+            callback(event)
+
+    def fold(self, name: str) -> str:
+        return self.client.isupport.casefold(name)
+
+    def is_self(self, nick: str) -> bool:
+        return self.client.isupport.equal(nick, self.client.nick)
+
+    def process(self, message: IrcMessage) -> None:
+        if (batch := self.batches.get(message.tags.get("batch"))) is not None:
+            batch[1].append(message)
+            return
+        event = self.handle(message)
+        if message.trace:
+            message.trace.mark("handle")
+        if event is not None:
+            if event.buffer != "<server>" and "time" in message.tags:
+                self.oldest.setdefault(event.buffer, message.tags["time"])
+            self.emit(event)
+        if message.trace:
+            message.trace.mark("append")
+
+    def handle(self, message: IrcMessage) -> MessageAppended | None:
+        try:
+            handler = MESSAGE_HANDLERS[message.command]
+            to, content = handler(self.handlers, message)
+        except KeyError:
+            self.log.info(
+                "Unhandled %s %s",
+                message.command,
+                message.params,
+                extra={"command": message.command},
+            )
+            to = "<server>"
+            content = f"<!> {message.command} {message.params}"
+        if not all([to, content]) or self.ignored(message):
+            return None
+        # Replace format chars for now
+        for format_char in FORMAT_CHARS:
+            content = content.replace(format_char, "")
+
+        from_nick, *content = content.split(" ")
+        content = " ".join(content)
+        if to in ("*", self.client.server_name):
+            to = "<server>"
+        elif self.is_self(to):
+            to = self.fold(from_nick)
+        else:
+            to = self.fold(to)
+        highlight = False
+        if message.command in ("PRIVMSG", "NOTICE") and to != "<server>":
+            # The nick may have changed during registration, outside nick_changed
+            self.highlights.set_nick(self.client.nick)
+            highlight = not self.is_self(from_nick) and self.highlights.matches(
+                content
+            )
+        return MessageAppended(
+            to, from_nick, content, server_time(message), highlight
+        )
+
+    def ignored(self, message: IrcMessage) -> bool:
+        # Live PRIVMSG/NOTICE never get here (see IrcReactor.read), but
+        # chathistory pages and JOIN/PART/QUIT, which still update members, do
+        ignores = self.client.ignores
+        return (
+            bool(ignores)
+            and isinstance(message.source, IrcUser)
+            and ignores.matches(repr(message.source), message.command)
+        )
+
+    def request_history(self, buffer: str, older: bool = False) -> bool:
+        """Fetch the latest page of a buffer's history once, or with older=True
+        the page before its oldest line. Returns whether a request was sent.
+        """
+        buffer = self.fold(buffer)
+        if (
+            "draft/chathistory" not in self.client.caps
+            or buffer == "<server>"
+            or buffer in self.history_pending
+            or buffer in self.history_complete
+            or (buffer in self.history_fetched and not older)
+        ):
+            return False
+        limit = HISTORY_PAGE
+        server_limit = self.client.isupport.tokens.get("CHATHISTORY", "")
+        if server_limit.isdigit() and int(server_limit):
+            limit = min(limit, int(server_limit))
+        if buffer in self.oldest:
+            reference = f"timestamp={self.oldest[buffer]}"
+            self.client.chathistory("BEFORE", buffer, reference, limit)
+        else:
+            self.client.chathistory("LATEST", buffer, "*", limit)
+        self.history_pending[buffer] = limit
+        self.history_fetched.add(buffer)
+        return True
+
+    def batch_started(self, reference: str, target: str) -> None:
+        self.batches[reference] = (target, [])
+
+    def batch_ended(self, reference: str) -> None:
+        if (batch := self.batches.pop(reference, None)) is None:
+            return
+        target, messages = batch
+        buffer = self.fold(target)
+        limit = self.history_pending.pop(buffer, None)
+        # Anything at or after the oldest line already shown arrived live
+        cutoff = parse_server_time(self.oldest.get(buffer))
+        lines = []
+        for message in messages:
+            sent = parse_server_time(message.tags.get("time"))
+            if message.command not in ("PRIVMSG", "NOTICE") or (
+                cutoff and sent and sent >= cutoff
+            ):
+                continue
+            if (event := self.handle(message)) is not None:
+                lines.append(
+                    (event.timestamp or "", event.nick, event.text, event.highlight)
+                )
+        if messages and (sent := parse_server_time(messages[0].tags.get("time"))):
+            if cutoff is None or sent < cutoff:
+                self.oldest[buffer] = messages[0].tags["time"]
+        if limit is not None and len(messages) < limit:
+            self.history_complete.add(buffer)
+        self.emit(HistoryLoaded(buffer, lines))
+
+    def request_channel_list(self) -> ChannelListing:
+        """The server's channel listing, sending LIST only if no session has
+        a fresh one or is already receiving it
+        """
+        listing, fetch = channel_lists.get(self.client.server)
+        if fetch:
+            self.listing = listing
+            self.client.list_channels()
+        return listing
+
+    def channel_listed(self, channel: str, users: int, topic: str) -> None:
+        if self.listing is not None:
+            for format_char in FORMAT_CHARS:
+                topic = topic.replace(format_char, "")
+            self.listing.add(channel, users, topic)
+
+    def list_ended(self) -> None:
+        if self.listing is not None:
+            self.listing.end()
+            self.listing = None
+
+    def lookup_user(
+        self, nick: str, callback: Callable[[UserInfo | None], None]
+    ) -> tuple[UserInfo | None, bool]:
+        """Cached WHOIS details for nick, and whether callback will get newer
+        ones; WHOIS is only sent if no session has fresh details or is asking
+        """
+        return user_info.lookup(
+            self.client.server,
+            self.fold(nick),
+            callback,
+            lambda: self.client.whois(nick),
+        )
+
+    def cancel_lookup(
+        self, nick: str, callback: Callable[[UserInfo | None], None]
+    ) -> None:
+        user_info.cancel(self.client.server, self.fold(nick), callback)
+
+    def whois_reply(self, nick: str) -> UserInfo:
+        return self.whois.setdefault(self.fold(nick), UserInfo(nick))
+
+    def whois_ended(self, nick: str) -> None:
+        key = self.fold(nick)
+        user_info.store(self.client.server, key, self.whois.pop(key, None))
+
+    def channel_nicks(self, channel: str) -> list[str]:
+        return list(self.members.get(self.fold(channel), {}).values())
+
+    def channels_with(self, nick: str) -> list[str]:
+        key = self.fold(nick)
+        return [channel for channel, nicks in self.members.items() if key in nicks]
+
+    def member_joined(self, channel: str, nick: str) -> None:
+        channel = self.fold(channel)
+        self.members.setdefault(channel, {})[self.fold(nick)] = nick
+        self.emit(MemberJoined(channel, nick))
+
+    def member_parted(self, channel: str, nick: str) -> None:
+        channel = self.fold(channel)
+        if self.is_self(nick):
+            self.members.pop(channel, None)
+            self.topics.pop(channel, None)
+        else:
+            self.members.get(channel, {}).pop(self.fold(nick), None)
+        self.emit(MemberParted(channel, nick))
+
+    def member_quit(self, nick: str) -> None:
+        channels = self.channels_with(nick)
+        for channel in channels:
+            del self.members[channel][self.fold(nick)]
+        self.emit(MemberQuit(nick, channels))
+
+    def names_received(self, channel: str, names: list[str]) -> None:
+        self.pending_names.setdefault(self.fold(channel), []).extend(names)
+
+    def names_ended(self, channel: str) -> None:
+        channel = self.fold(channel)
+        names = self.pending_names.pop(channel, [])
+        members = {}
+        for name in names:
+            _, nick = self.client.isupport.strip_prefix(name)
+            members[self.fold(nick)] = name
+        self.members[channel] = members
+        self.emit(MembersReset(channel, names))
+
+    def nick_changed(self, old_nick: str, new_nick: str) -> None:
+        channels = self.channels_with(old_nick)
+        for channel in channels:
+            members = self.members[channel]
+            name = members.pop(self.fold(old_nick))
+            members[self.fold(new_nick)] = name[: len(name) - len(old_nick)] + new_nick
+        is_self = self.is_self(old_nick)
+        if is_self:
+            self.client.nick = new_nick
+        self.emit(NickChanged(old_nick, new_nick, is_self, channels))
+
+    def topic_changed(self, channel: str, topic: str) -> None:
+        channel = self.fold(channel)
+        self.topics[channel] = topic
+        self.emit(TopicChanged(channel, topic))
+
+
+class MessageHandlers:
+    def __init__(self, client: IrcBaseClient, state: SessionState) -> None:
+        self.client = client
+        self.state = state
+
+    def bounce(self, message: IrcMessage) -> HandlerResponse:
+        _, *content = message.params.split(" ")
+        content = " ".join(content)
+        return "<server>", f"<!> {content}"
+
+    def ping(self, message: IrcMessage) -> HandlerResponse:
+        self.client.pong(message)
+        return "", ""
+
+    def privmsg(self, message: IrcMessage) -> HandlerResponse:
+        to, *content = message.params.split(" ")
+        content = " ".join(content)[1:]
+        return to, f"{message.source.nick} {content}"
+
+    def join(self, message: IrcMessage) -> HandlerResponse:
+        nick = message.source.nick
+        channel = message.params[1:]
+        self.state.member_joined(channel, nick)
+        user_info.joined(
+            self.client.server,
+            self.state.fold(nick),
+            message.source.username,
+            message.source.host,
+            channel,
+        )
+        return channel, f"<!> {message.source.nick} joined {channel}"
+
+    def part(self, message: IrcMessage) -> HandlerResponse:
+        channel, *reason = message.params.split(" ")
+        reason = " ".join(reason).strip(":")
+        self.state.member_parted(channel, message.source.nick)
+        user_info.parted(
+            self.client.server, self.state.fold(message.source.nick), channel
+        )
+        return channel, f"<!> {message.source.nick} left {channel} ({reason})"
+
+    def users(self, message: IrcMessage) -> HandlerResponse:
+        _, *content = message.params.split(" ")
+        content = " ".join(content)
+        return "<server>", f"<!> {content[1:]}"
+
+    def motd(self, message: IrcMessage) -> HandlerResponse:
+        _, *content = message.params.split(" ")
+        content = " ".join(content)
+        return "<server>", f"<!> {content[1:]}"
+
+    def namreply(self, message: IrcMessage) -> HandlerResponse:
+        _, _, channel, *names = message.params.split(" ")
+        if names:
+            names[0] = names[0].strip(":")
+        self.state.names_received(channel, names)
+        return "", ""
+
+    def end_of_names(self, message: IrcMessage) -> HandlerResponse:
+        prefix, content = message.params.split(":", 1)
+        _, channel, *_ = prefix.split(" ")
+        self.state.names_ended(channel)
+        return "<server>", f"<!> {content}"
+
+    def topic(self, message: IrcMessage) -> HandlerResponse:
+        channel, *topic = message.params.split(" ")
+        topic = " ".join(topic).strip(":")
+        self.state.topic_changed(channel, topic)
+        return channel, f"<!> Topic changed to: {topic}"
+
+    def rpl_topic(self, message: IrcMessage) -> HandlerResponse:
+        _, channel, *topic = message.params.split(" ")
+        topic = " ".join(topic).strip(":")
+        self.state.topic_changed(channel, topic)
+        return channel, "<!> Topic changed"
+
+    def topic_who_time(self, message: IrcMessage) -> HandlerResponse:
+        prefix, timestamp = message.params.split(":")
+        _, channel, actor, _ = prefix.split(" ")
+        timestamp = datetime.datetime.fromtimestamp(int(timestamp)).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        return channel, f"<!> Topic set by {actor} on {timestamp}"
+
+    def luser(self, message: IrcMessage) -> HandlerResponse:
+        _, count, *remaining = message.params.split(" ")
+        remaining = " ".join(remaining)
+        return "<server>", f"<!> {count} {remaining[1:]}"
+
+    def no_topic(self, message: IrcMessage) -> HandlerResponse:
+        _, channel, *_ = message.params.split(" ")
+        self.state.topic_changed(channel, "")
+        return "", ""
+
+    def not_on_channel(self, message: IrcMessage) -> HandlerResponse:
+        _, channel, *_ = message.params.split(" ")
+        return "<server>", f"<!> You are not on channel {channel}"
+
+    def chan_op_privs_needed(self, message: IrcMessage) -> HandlerResponse:
+        _, channel, *_ = message.params.split(" ")
+        return "<server>", f"<!> You are not an operator on channel {channel}"
+
+    def need_more_params(self, message: IrcMessage) -> HandlerResponse:
+        _, command, *_ = message.params.split(" ")
+        return "<server>", f"<!> Not enough parameters given for command {command}"
+
+    def inviting(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, channel = message.params.split(" ")
+        return "<server>", f"<!> Inviting user {nick} to channel {channel}"
+
+    def user_on_channel(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, channel, *_ = message.params.split(" ")
+        return "<server>", f"<!> User {nick} is already on channel {channel}"
+
+    def user_not_in_channel(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, channel, *_ = message.params.split(" ")
+        return "<server>", f"<!> User {nick} is not on channel {channel}"
+
+    def no_such_server(self, message: IrcMessage) -> HandlerResponse:
+        _, server_name, *_ = message.params.split(" ")
+        return "<server>", f"<!> Server {server_name} does not exist"
+
+    def no_such_channel(self, message: IrcMessage) -> HandlerResponse:
+        _, channel_name, *_ = message.params.split(" ")
+        return "<server>", f"<!> Channel {channel_name} does not exist"
+
+    def cannot_send_to_channel(self, message: IrcMessage) -> HandlerResponse:
+        _, channel_name, *_ = message.params.split(" ")
+        return "<server>", f"<!> Cannot send to channel {channel_name}"
+
+    def too_many_channels(self, message: IrcMessage) -> HandlerResponse:
+        _, channel_name, *_ = message.params.split(" ")
+        return (
+            "<server>",
+            f"<!> Cannot join channel {channel_name}: You have joined too many channels",
+        )
+
+    def whois_user(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, username, host, _, *realname = message.params.split(" ")
+        info = self.state.whois_reply(nick)
+        info.nick, info.username, info.host = nick, username, host
+        info.realname = " ".join(realname)[1:]
+        return "", ""
+
+    def whois_server(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, server, *_ = message.params.split(" ")
+        self.state.whois_reply(nick).server = server
+        return "", ""
+
+    def whois_idle(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, idle, *_ = message.params.split(" ")
+        if idle.isdigit():
+            self.state.whois_reply(nick).idle = int(idle)
+        return "", ""
+
+    def whois_channels(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, *channels = message.params.split(" ")
+        isupport = self.client.isupport
+        # Long channel lists come in several 319 lines
+        self.state.whois_reply(nick).channels += [
+            isupport.strip_prefix(channel)[1]
+            for channel in " ".join(channels)[1:].split(" ")
+            if channel
+        ]
+        return "", ""
+
+    def whois_account(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, account, *_ = message.params.split(" ")
+        self.state.whois_reply(nick).account = account
+        return "", ""
+
+    def end_of_whois(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, *_ = message.params.split(" ")
+        self.state.whois_ended(nick)
+        return "", ""
+
+    def list_entry(self, message: IrcMessage) -> HandlerResponse:
+        _, channel, users, *topic = message.params.split(" ")
+        topic = " ".join(topic)[1:]
+        # Some servers put the channel modes in front: "[+nt] topic"
+        if topic.startswith("[+") and "] " in topic:
+            topic = topic.split("] ", 1)[1]
+        self.state.channel_listed(channel, int(users) if users.isdigit() else 0, topic)
+        return "", ""
+
+    def list_end(self, message: IrcMessage) -> HandlerResponse:
+        self.state.list_ended()
+        return "", ""
+
+    def i_support(self, message: IrcMessage) -> HandlerResponse:
+        self.client.isupport.update(message.params)
+        _, *response = message.params.split(" ")
+        response = " ".join(response)
+        return "<server>", f"<!> {response}"
+
+    def admin_info(self, message: IrcMessage) -> HandlerResponse:
+        _, *info = message.params.split(" ")
+        info = " ".join(info)[1:]
+        return "<server>", f"<!> Admin info: {info}"
+
+    def version(self, message: IrcMessage) -> HandlerResponse:
+        _, version, _, *comments = message.params.split(" ")
+        comments = " ".join(comments)[1:]
+        return "<server>", f"<!> Version: {version} {comments}"
+
+    def password_mismatch(self, message: IrcMessage) -> HandlerResponse:
+        return "<server>", f"<!> Password incorrect"
+
+    def no_oper_host(self, message: IrcMessage) -> HandlerResponse:
+        return "<server>", "<!> No O-lines for your host"
+
+    def youre_oper(self, message: IrcMessage) -> HandlerResponse:
+        self.client.is_oper = True
+        return "<server>", "<!> You are now an IRC operator"
+
+    def nick(self, message: IrcMessage) -> HandlerResponse:
+        new_nick = message.params.strip(":")
+        old_nick = message.source.nick
+        is_self = self.state.is_self(old_nick)
+        self.state.nick_changed(old_nick, new_nick)
+        user_info.renamed(
+            self.client.server,
+            self.state.fold(old_nick),
+            self.state.fold(new_nick),
+            new_nick,
+        )
+        if is_self:
+            return "<server>", f"<!> You are now known as {new_nick}"
+        else:
+            return (
+                "<server>",
+                f"<!> {message.source.nick} is now known as {message.params}",
+            )
+
+    def notice(self, message: IrcMessage) -> HandlerResponse:
+        target, *text = message.params.split(" ")
+        text = " ".join(text).strip(":")
+        source = message.source
+        if isinstance(message.source, IrcUser):
+            source = message.source.nick
+        return target, f"{source} {text}"
+
+    def quit(self, message: IrcMessage) -> HandlerResponse:
+        nick = message.source.nick
+        quit_message = message.params.strip(":")
+        self.state.member_quit(nick)
+        user_info.quit(self.client.server, self.state.fold(nick))
+        return "<server>", f"<!> {nick} has quit: {quit_message}"
+
+    def cap(self, message: IrcMessage) -> HandlerResponse:
+        # CAP NEW/DEL (cap-notify) can arrive at any time after registration
+        self.client.negotiate(message)
+        return "", ""
+
+    def batch(self, message: IrcMessage) -> HandlerResponse:
+        reference, *params = message.params.split(" ")
+        if reference.startswith("+") and params[:1] == ["chathistory"]:
+            if len(params) > 1:
+                self.state.batch_started(reference[1:], params[1])
+        elif reference.startswith("-"):
+            self.state.batch_ended(reference[1:])
+        return "", ""
+
+    def ignore(self, message: IrcMessage) -> HandlerResponse:
+        return "", ""
+
+    def mode(self, message: IrcMessage) -> HandlerResponse:
+        return "<server>", f"<!> MODE {message.params}"
+
+    def welcome(self, message: IrcMessage) -> HandlerResponse:
+        return "<server>", f"<!> {message.params.strip(":")}"
+
+    def not_registered(self, message: IrcMessage) -> HandlerResponse:
+        self.client.initial_auth()
+        self.client.join("#main_chat")
+        self.state.nick_changed(self.client.nick, self.client.nick)
+        return "", ""
+
+    def nickname_in_use(self, message: IrcMessage) -> HandlerResponse:
+        _, nick, *_ = message.params.split(" ")
+        return "<server>", f"<!> Nickname {nick} already in use"
+
+    def already_registered(self, message: IrcMessage) -> HandlerResponse:
+        return "", ""
+
+    def host_hidden(self, message: IrcMessage) -> HandlerResponse:
+        _, host, *_ = message.params.split(" ")
+        return "<server>", f"<!> {host} is now your displayed host"
+
+    def fatal_error(self, message: IrcMessage) -> HandlerResponse:
+        self.state.emit(FatalError(message.params))
+        return "", ""
+
+
+# Built once at import; each session calls these with its own MessageHandlers
+MESSAGE_HANDLERS: dict[
+    str, Callable[[MessageHandlers, IrcMessage], HandlerResponse]
+] = {
+    "ERROR": MessageHandlers.fatal_error,
+    "PRIVMSG": MessageHandlers.privmsg,
+    "JOIN": MessageHandlers.join,
+    "PART": MessageHandlers.part,
+    "TOPIC": MessageHandlers.topic,
+    "QUIT": MessageHandlers.quit,
+    "PING": MessageHandlers.ping,
+    "NICK": MessageHandlers.nick,
+    "NOTICE": MessageHandlers.notice,
+    "MODE": MessageHandlers.mode,
+    "CAP": MessageHandlers.cap,
+    "AUTHENTICATE": MessageHandlers.ignore,
+    "BATCH": MessageHandlers.batch,
+    replycodes.RPL_WELCOME: MessageHandlers.welcome,
+    replycodes.RPL_YOURHOST: MessageHandlers.welcome,
+    replycodes.RPL_CREATED: MessageHandlers.welcome,
+    replycodes.RPL_MYINFO: MessageHandlers.welcome,
+    replycodes.RPL_BOUNCE: MessageHandlers.bounce,
+    replycodes.RPL_LUSERCLIENT: MessageHandlers.users,
+    replycodes.RPL_LUSERME: MessageHandlers.users,
+    replycodes.RPL_LOCALUSERS: MessageHandlers.users,
+    replycodes.RPL_GLOBALUSERS: MessageHandlers.users,
+    replycodes.RPL_MOTD: MessageHandlers.motd,
+    replycodes.RPL_MOTDSTART: MessageHandlers.motd,
+    replycodes.ERR_NOMOTD: MessageHandlers.motd,
+    replycodes.RPL_ENDOFMOTD: MessageHandlers.motd,
+    replycodes.RPL_NAMREPLY: MessageHandlers.namreply,
+    replycodes.RPL_ENDOFNAMES: MessageHandlers.end_of_names,
+    replycodes.RPL_TOPIC: MessageHandlers.rpl_topic,
+    replycodes.RPL_TOPICWHOTIME: MessageHandlers.topic_who_time,
+    replycodes.RPL_LUSEROP: MessageHandlers.luser,
+    replycodes.RPL_LUSERUNKNOWN: MessageHandlers.luser,
+    replycodes.RPL_LUSERCHANNELS: MessageHandlers.luser,
+    replycodes.RPL_NOTOPIC: MessageHandlers.no_topic,
+    replycodes.RPL_INVITING: MessageHandlers.inviting,
+    replycodes.RPL_ISUPPORT: MessageHandlers.i_support,
+    replycodes.RPL_WHOISUSER: MessageHandlers.whois_user,
+    replycodes.RPL_WHOISSERVER: MessageHandlers.whois_server,
+    replycodes.RPL_WHOISOPERATOR: MessageHandlers.ignore,
+    replycodes.RPL_WHOISIDLE: MessageHandlers.whois_idle,
+    replycodes.RPL_WHOISCHANNELS: MessageHandlers.whois_channels,
+    replycodes.RPL_WHOISACCOUNT: MessageHandlers.whois_account,
+    replycodes.RPL_ENDOFWHOIS: MessageHandlers.end_of_whois,
+    replycodes.RPL_LISTSTART: MessageHandlers.ignore,
+    replycodes.RPL_LIST: MessageHandlers.list_entry,
+    replycodes.RPL_LISTEND: MessageHandlers.list_end,
+    replycodes.RPL_VERSION: MessageHandlers.version,
+    replycodes.RPL_ADMINLOC1: MessageHandlers.admin_info,
+    replycodes.RPL_ADMINLOC2: MessageHandlers.admin_info,
+    replycodes.RPL_ADMINEMAIL: MessageHandlers.admin_info,
+    replycodes.RPL_YOUREOPER: MessageHandlers.youre_oper,
+    replycodes.RPL_HOSTHIDDEN: MessageHandlers.host_hidden,
+    replycodes.ERR_NOTONCHANNEL: MessageHandlers.not_on_channel,
+    replycodes.ERR_CHANOPRIVSNEEDED: MessageHandlers.chan_op_privs_needed,
+    replycodes.ERR_NEEDMOREPARAMS: MessageHandlers.need_more_params,
+    replycodes.ERR_USERONCHANNEL: MessageHandlers.user_on_channel,
+    replycodes.ERR_NOSUCHSERVER: MessageHandlers.no_such_server,
+    replycodes.ERR_NOSUCHCHANNEL: MessageHandlers.no_such_channel,
+    replycodes.ERR_CANNOTSENDTOCHAN: MessageHandlers.cannot_send_to_channel,
+    replycodes.ERR_TOOMANYCHANNELS: MessageHandlers.too_many_channels,
+    replycodes.ERR_PASSWDMISMATCH: MessageHandlers.password_mismatch,
+    replycodes.ERR_NOOPERHOST: MessageHandlers.no_oper_host,
+    replycodes.ERR_NOTREGISTERED: MessageHandlers.not_registered,
+    replycodes.ERR_ALREADYREGISTERED: MessageHandlers.already_registered,
+    replycodes.ERR_NICKNAMEINUSE: MessageHandlers.nickname_in_use,
+}
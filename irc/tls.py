@@ -0,0 +1,61 @@
+import socket
+import ssl
+import threading
+
+from helpers import config
+
+
+class TlsSessionCache:
+    """One verifying SSLContext and the last TLS session per upstream server
+
+    Reusing the session lets reconnects and new web sessions resume instead of
+    doing a full handshake with the IRC server. TLS 1.3 tickets arrive after the
+    handshake, so remember() is called once the connection has read some data.
+    """
+
+    def __init__(self, cafile: str | None = None) -> None:
+        self.cafile = cafile
+        self.lock = threading.Lock()
+        self.context = None
+        self.sessions: dict[tuple[str, int], ssl.SSLSession] = {}
+        self.handshakes = 0
+        self.resumed = 0
+
+    def get_context(self) -> ssl.SSLContext:
+        with self.lock:
+            if self.context is None:
+                self.context = ssl.create_default_context(cafile=self.cafile)
+            return self.context
+
+    def wrap(self, sock: socket.socket, hostname: str, port: int) -> ssl.SSLSocket:
+        context = self.get_context()
+        # A session the server no longer accepts just falls back to a full handshake
+        tls_socket = context.wrap_socket(
+            sock,
+            server_hostname=hostname,
+            session=self.sessions.get((hostname, port)),
+        )
+        with self.lock:
+            self.handshakes += 1
+            if tls_socket.session_reused:
+                self.resumed += 1
+        return tls_socket
+
+    def remember(self, hostname: str, port: int, tls_socket: ssl.SSLSocket) -> None:
+        if tls_socket.session is not None:
+            with self.lock:
+                self.sessions[(hostname, port)] = tls_socket.session
+
+    def forget(self, hostname: str, port: int) -> None:
+        with self.lock:
+            self.sessions.pop((hostname, port), None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "handshakes": self.handshakes,
+            "resumed": self.resumed,
+            "cached_sessions": len(self.sessions),
+        }
+
+
+tls_sessions = TlsSessionCache(config.IRC_CA_FILE)
@@ -0,0 +1,162 @@
+import threading
+import time
+from typing import Callable
+
+from helpers import config
+
+# Seconds before an unanswered WHOIS is given up on (its session went away)
+LOOKUP_TIMEOUT = 10
+
+
+class UserInfo:
+    __slots__ = (
+        "nick",
+        "username",
+        "host",
+        "realname",
+        "account",
+        "server",
+        "channels",
+        "idle",
+        "updated",
+        "complete",
+    )
+
+    def __init__(self, nick: str, username: str = "", host: str = "") -> None:
+        self.nick = nick
+        self.username = username
+        self.host = host
+        self.realname = ""
+        self.account = ""
+        self.server = ""
+        # Without membership prefixes
+        self.channels: list[str] = []
+        # Idle seconds as of updated, None if the server did not say
+        self.idle: int | None = None
+        self.updated = time.monotonic()
+        # Set once the whole WHOIS reply is in
+        self.complete = False
+
+    def idle_now(self) -> int | None:
+        if self.idle is None:
+            return None
+        return self.idle + int(time.monotonic() - self.updated)
+
+
+class UserInfoCache:
+    """What WHOIS replies told any session about a nick, kept current from JOIN,
+    PART, NICK and QUIT
+
+    Entries are keyed by server and casefolded nick and shared by every session
+    on that server for ttl seconds. Concurrent lookups of the same nick are
+    answered by one WHOIS: the first asker sends it, later ones just wait for
+    the reply with it.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: dict[tuple[tuple[str, int], str], UserInfo] = {}
+        # Callbacks waiting on an outstanding WHOIS, and when it was sent
+        self.pending: dict[tuple[tuple[str, int], str], list[Callable]] = {}
+        self.sent: dict[tuple[tuple[str, int], str], float] = {}
+        self.lookups = 0
+        self.hits = 0
+
+    def get(self, server: tuple[str, int], key: str) -> UserInfo | None:
+        with self.lock:
+            return self.entries.get((server, key))
+
+    def fresh(self, info: UserInfo | None, now: float) -> bool:
+        return info is not None and info.complete and now - info.updated < self.ttl
+
+    def lookup(
+        self,
+        server: tuple[str, int],
+        key: str,
+        callback: Callable[[UserInfo | None], None],
+        whois: Callable[[], None],
+    ) -> tuple[UserInfo | None, bool]:
+        """The cached entry, and whether callback will be called with a newer one
+
+        Unless the entry is fresh, callback gets the new entry (or None for a
+        nick the server does not know) once the WHOIS reply is in; whois is
+        called to send one unless some session already has.
+        """
+        now = time.monotonic()
+        with self.lock:
+            info = self.entries.get((server, key))
+            if self.fresh(info, now):
+                self.hits += 1
+                return info, False
+            self.pending.setdefault((server, key), []).append(callback)
+            send = now - self.sent.get((server, key), -LOOKUP_TIMEOUT) >= LOOKUP_TIMEOUT
+            if send:
+                self.sent[(server, key)] = now
+                self.lookups += 1
+        if send:
+            whois()
+        return info, True
+
+    def store(self, server: tuple[str, int], key: str, info: UserInfo | None) -> None:
+        now = time.monotonic()
+        with self.lock:
+            if info is None:
+                self.entries.pop((server, key), None)
+            else:
+                info.complete = True
+                info.updated = now
+                self.entries[(server, key)] = info
+            if len(self.entries) % 100 == 0:
+                self.expire(now)
+            waiting = self.pending.pop((server, key), [])
+            self.sent.pop((server, key), None)
+        for callback in waiting:
+            callback(info)
+
+    def cancel(self, server: tuple[str, int], key: str, callback: Callable) -> None:
+        """Stop waiting for a WHOIS reply, e.g. when the card asking is closed"""
+        with self.lock:
+            if callback in (waiting := self.pending.get((server, key), [])):
+                waiting.remove(callback)
+                if not waiting:
+                    del self.pending[(server, key)]
+
+    def joined(
+        self, server: tuple[str, int], key: str, username: str, host: str, channel: str
+    ) -> None:
+        with self.lock:
+            if (info := self.entries.get((server, key))) is None:
+                return
+            if (info.username, info.host) != (username, host):
+                # Someone else has the nick now
+                del self.entries[(server, key)]
+            elif channel not in info.channels:
+                info.channels.append(channel)
+
+    def parted(self, server: tuple[str, int], key: str, channel: str) -> None:
+        with self.lock:
+            if (info := self.entries.get((server, key))) is not None:
+                info.channels = [name for name in info.channels if name != channel]
+
+    def renamed(
+        self, server: tuple[str, int], old_key: str, new_key: str, new_nick: str
+    ) -> None:
+        with self.lock:
+            if (info := self.entries.pop((server, old_key), None)) is not None:
+                info.nick = new_nick
+                self.entries[(server, new_key)] = info
+
+    def quit(self, server: tuple[str, int], key: str) -> None:
+        with self.lock:
+            self.entries.pop((server, key), None)
+
+    def expire(self, now: float) -> None:
+        # Called with the lock held
+        for key in [
+            key for key, info in self.entries.items() if now - info.updated >= self.ttl
+        ]:
+            del self.entries[key]
+
+
+user_info = UserInfoCache(config.WHOIS_CACHE_TTL)
@@ -1,25 +1,49 @@
 import flet as ft
 
-from views.chat import ChatView
+from helpers.assets import assets
+from helpers.logs import log_pipeline
 from views.home import HomeView
 
+# Read into the asset cache at startup rather than by the first visitor
+PRELOADED_ASSETS = "assets/text"
+
+
+def show_route(page: ft.Page, views: dict[str, ft.View]) -> None:
+    # Views are kept per page so navigating back and forth reuses their controls;
+    # leaving /chat ends its session, so the next visit builds a new ChatView
+    if page.route != "/chat":
+        views.pop("/chat", None)
+    page.views.clear()
+    if "/" not in views:
+        views["/"] = HomeView()
+    page.views.append(views["/"])
+    match page.route:
+        case "/chat":
+            if "/chat" not in views:
+                # The chat and IRC modules are imported on the first visit to
+                # /chat, so a fresh worker can serve the login page sooner
+                from views.chat import ChatView
+
+                views["/chat"] = ChatView()
+            page.views.append(views["/chat"])
+    page.update()
+
 
 def main(page: ft.Page) -> None:
     page.title = "Lizardnet Webchat"
     page.vertical_alignment = ft.MainAxisAlignment.CENTER
     page.horizontal_alignment = ft.CrossAxisAlignment.CENTER
     page.fonts = {"Cousine": "/fonts/Cousine-Regular.ttf"}
+    views: dict[str, ft.View] = {}
 
     def route_change(e: ft.RouteChangeEvent) -> None:
-        page.views.clear()
-        page.views.append(HomeView())
-        match page.route:
-            case "/chat":
-                page.views.append(ChatView())
-        page.update()
+        show_route(page, views)
 
     page.on_route_change = route_change
     page.go("/")
 
 
-ft.app(target=main, assets_dir="assets")
+if __name__ == "__main__":
+    log_pipeline.start()
+    assets.preload(PRELOADED_ASSETS)
+    ft.app(target=main, assets_dir="assets")
@@ -0,0 +1,38 @@
+import pytest
+
+from helpers.bans import BanList
+
+
+@pytest.fixture
+def bans(tmp_path):
+    return BanList(str(tmp_path / "bannedips.txt"), reload_interval=0)
+
+
+def test_ban_and_reload(bans):
+    bans.ban("192.0.2.7")
+    bans.ban("2001:db8::/32")
+    assert bans.is_banned("192.0.2.7")
+    assert bans.is_banned("2001:db8::1")
+    assert not bans.is_banned("192.0.2.8")
+
+    reloaded = BanList(bans.path, reload_interval=0)
+    assert reloaded.is_banned("192.0.2.7")
+    assert reloaded.is_banned("2001:db8:ffff::1")
+
+
+@pytest.mark.parametrize("client_ip", ["1.2.3.4", "::ffff:1.2.3.4"])
+def test_ipv4_mapped_ban(bans, client_ip):
+    bans.ban("::ffff:1.2.3.4")
+    assert bans.is_banned(client_ip)
+    assert BanList(bans.path, reload_interval=0).is_banned(client_ip)
+    with open(bans.path) as f:
+        assert f.read() == "1.2.3.4\n"
+
+
+def test_ipv4_mapped_range_in_file(bans):
+    with open(bans.path, "w") as f:
+        f.write("::ffff:10.0.0.0/104\n# comment\nnot an address\n")
+    assert bans.is_banned("::ffff:10.1.2.3")
+    assert bans.is_banned("10.1.2.3")
+    assert not bans.is_banned("11.0.0.1")
+    assert bans.count == 1
@@ -0,0 +1,48 @@
+import pytest
+
+from irc.client import IrcMessage, IrcUser
+
+
+def test_from_raw_user_source():
+    message = IrcMessage.from_raw(":nick!user@host PRIVMSG #chan :hello there\r\n")
+    assert isinstance(message.source, IrcUser)
+    assert (message.source.nick, message.source.username, message.source.host) == (
+        "nick",
+        "user",
+        "host",
+    )
+    assert message.command == "PRIVMSG"
+    assert message.params == "#chan :hello there"
+    assert message.tags == {}
+
+
+def test_from_raw_server_source():
+    message = IrcMessage.from_raw(":irc.server 001 me :Welcome")
+    assert message.source == "irc.server"
+    assert message.command == "001"
+    assert message.params == "me :Welcome"
+
+
+def test_from_raw_without_source():
+    message = IrcMessage.from_raw("PING :token")
+    assert message.source is None
+    assert message.command == "PING"
+    assert message.params == ":token"
+
+
+def test_from_raw_tags():
+    message = IrcMessage.from_raw(
+        r"@time=2024-01-01T00:00:00.000Z;msg=a\sb\:c;flag :n!u@h PRIVMSG #c :hi"
+    )
+    assert message.tags == {
+        "time": "2024-01-01T00:00:00.000Z",
+        "msg": "a b;c",
+        "flag": "",
+    }
+    assert message.command == "PRIVMSG"
+
+
+@pytest.mark.parametrize("raw", [":irc.server", "@a=b"])
+def test_from_raw_rejects_truncated_lines(raw):
+    with pytest.raises(ValueError):
+        IrcMessage.from_raw(raw)
@@ -0,0 +1,31 @@
+from helpers.connlog import parse_legacy, split_address
+
+
+def test_split_address():
+    assert split_address("1.2.3.4nick") == ("1.2.3.4", "nick")
+    assert split_address("10.0.0.12") == ("10.0.0.12", "")
+    assert split_address("nick") == ("", "nick")
+
+
+def test_parse_legacy():
+    text = "alice,1.2.3.4bob,5.6.7.8\ncarol,Nonedave,10.0.0.1"
+    assert parse_legacy(text) == [
+        ("alice", "1.2.3.4"),
+        ("bob", "5.6.7.8"),
+        ("carol", ""),
+        ("dave", "10.0.0.1"),
+    ]
+
+
+def test_parse_legacy_keeps_hex_nicks_whole():
+    assert parse_legacy("alice,1.2.3.4cafe,5.6.7.8") == [
+        ("alice", "1.2.3.4"),
+        ("cafe", "5.6.7.8"),
+    ]
+
+
+def test_parse_legacy_does_not_read_ipv6():
+    assert parse_legacy("alice,2001:db8::1bob,1.2.3.4") == [
+        ("alice", ""),
+        ("2001:db8::1bob", "1.2.3.4"),
+    ]
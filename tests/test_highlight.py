@@ -0,0 +1,42 @@
+from helpers.highlight import HighlightRules
+
+
+def test_nick_matches_whole_words_only():
+    rules = HighlightRules("Liz")
+    assert rules.matches("hey liz, you there?")
+    assert rules.matches("LIZ")
+    assert not rules.matches("lizard")
+    assert not rules.matches("liz_bot is back")
+
+
+def test_words():
+    rules = HighlightRules("me", ["Deploy", "on call"])
+    assert rules.words == ["deploy", "on call"]
+    assert rules.matches("who is ON CALL tonight")
+    assert rules.matches("deploy!")
+    assert not rules.matches("redeploying")
+
+
+def test_add_and_remove():
+    rules = HighlightRules()
+    assert rules.add("release")
+    assert not rules.add("Release")
+    assert not rules.add("  ")
+    assert rules.matches("release time")
+    assert rules.remove("RELEASE")
+    assert not rules.remove("release")
+    assert not rules.matches("release time")
+
+
+def test_set_nick_rebuilds():
+    rules = HighlightRules("old")
+    assert rules.matches("hi old")
+    rules.set_nick("new")
+    assert not rules.matches("hi old")
+    assert rules.matches("hi new")
+
+
+def test_overlapping_patterns():
+    rules = HighlightRules("", ["he", "she", "hers"])
+    assert rules.matches("ushers hers")
+    assert not rules.matches("ushers")
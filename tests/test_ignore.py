@@ -0,0 +1,68 @@
+from irc.ignore import IgnoreList, normalize_mask
+from irc.isupport import ISupport
+
+
+def make_list(*entries: tuple[str, tuple[str, ...]]) -> IgnoreList:
+    ignores = IgnoreList(ISupport())
+    ignores.set_masks(entries)
+    return ignores
+
+
+def test_normalize_mask():
+    assert normalize_mask("nick") == "nick!*@*"
+    assert normalize_mask("user@host") == "*!user@host"
+    assert normalize_mask("nick!user") == "nick!user@*"
+    assert normalize_mask("n!u@h") == "n!u@h"
+
+
+def test_nick_mask_is_case_insensitive():
+    ignores = make_list(("Troll", ("privmsg",)))
+    assert ignores.matches("tROLL!u@h", "PRIVMSG")
+    assert not ignores.matches("troll!u@h", "NOTICE")
+    assert not ignores.matches("trollface!u@h", "PRIVMSG")
+
+
+def test_host_and_suffix_masks():
+    ignores = make_list(
+        ("*!*@bad.example", ("notice",)), ("*!*@*.spam.example", ("notice",))
+    )
+    assert ignores.matches("a!b@bad.example", "NOTICE")
+    assert ignores.matches("a!b@x.spam.example", "NOTICE")
+    assert not ignores.matches("a!b@good.example", "NOTICE")
+
+
+def test_glob_mask_only_treats_star_and_question_as_wildcards():
+    ignores = make_list(("[bot]?!*@*", ("joins",)))
+    for command in ("JOIN", "PART", "QUIT"):
+        assert ignores.matches("[bot]1!u@h", command)
+    assert not ignores.matches("b1!u@h", "JOIN")
+
+
+def test_add_replaces_and_remove():
+    ignores = IgnoreList(ISupport())
+    assert ignores.add("troll", ["privmsg"]) == "troll!*@*"
+    ignores.add("TROLL", ["notice"])
+    assert list(ignores.masks.items()) == [("TROLL!*@*", ("notice",))]
+    assert not ignores.matches("troll!u@h", "PRIVMSG")
+    assert ignores.remove("troll")
+    assert not ignores.remove("troll")
+    assert not ignores.matches("troll!u@h", "NOTICE")
+
+
+def test_matchers_follow_mask_changes():
+    ignores = make_list(("one", ("privmsg",)))
+    assert ignores.matches("one!u@h", "PRIVMSG")
+    ignores.set_masks([("two", ("privmsg",))])
+    assert not ignores.matches("one!u@h", "PRIVMSG")
+    assert ignores.matches("two!u@h", "PRIVMSG")
+
+
+def test_drops():
+    ignores = make_list(("troll", ("privmsg", "joins")))
+    assert ignores.drops(":troll!u@h PRIVMSG #c :hi")
+    assert ignores.drops("@time=x :troll!u@h PRIVMSG #c :hi")
+    # chathistory lines are filtered when their batch ends
+    assert not ignores.drops("@batch=1 :troll!u@h PRIVMSG #c :hi")
+    # JOINs still update channel members
+    assert not ignores.drops(":troll!u@h JOIN #c")
+    assert not ignores.drops(":friend!u@h PRIVMSG #c :hi")
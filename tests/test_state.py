@@ -0,0 +1,97 @@
+import pytest
+
+from benchmarks.channellist import make_state
+from irc.client import IrcMessage
+from irc.state import (
+    MESSAGE_HANDLERS,
+    MemberJoined,
+    MemberParted,
+    MembersReset,
+    MessageAppended,
+    MessageHandlers,
+    NickChanged,
+    TopicChanged,
+)
+
+
+@pytest.fixture
+def state():
+    return make_state("me")
+
+
+def replay(state, *lines: str) -> list:
+    events = []
+    state.subscribe(events.append)
+    for raw in lines:
+        state.process(IrcMessage.from_raw(raw))
+    return events
+
+
+def test_handlers_are_message_handler_methods():
+    for command, handler in MESSAGE_HANDLERS.items():
+        assert getattr(MessageHandlers, handler.__name__) is handler, command
+
+
+def test_unhandled_command_goes_to_server_buffer(state):
+    events = replay(state, ":irc.server 999 me :odd")
+    assert events == [MessageAppended("<server>", "<!>", "999 me :odd")]
+
+
+def test_server_targets(state):
+    state.client.server_name = "irc.server"
+    events = replay(
+        state,
+        ":irc.server NOTICE * :Looking up your hostname",
+        ":irc.server NOTICE irc.server :Server notice",
+    )
+    assert [event.buffer for event in events] == ["<server>", "<server>"]
+
+
+def test_names_are_collected_until_end(state):
+    events = replay(
+        state,
+        ":irc.server 353 me = #Chan :me @Op",
+        ":irc.server 353 me = #Chan :+voice",
+        ":irc.server 366 me #Chan :End of /NAMES list.",
+    )
+    assert events[0] == MembersReset("#chan", ["me", "@Op", "+voice"])
+    assert state.members["#chan"] == {"me": "me", "op": "@Op", "voice": "+voice"}
+
+
+def test_membership(state):
+    events = replay(
+        state,
+        ":bob!u@h JOIN :#chan",
+        ":bob!u@h NICK :Bobby",
+        ":Bobby!u@h PART #chan",
+    )
+    assert MemberJoined("#chan", "bob") in events
+    assert NickChanged("bob", "Bobby", False, ["#chan"]) in events
+    assert MemberParted("#chan", "Bobby") in events
+    assert state.members["#chan"] == {}
+
+
+def test_privmsg_buffers_and_highlights(state):
+    events = replay(
+        state,
+        ":bob!u@h PRIVMSG #Chan :hi me",
+        ":bob!u@h PRIVMSG #chan :hi all",
+        ":Bob!u@h PRIVMSG me :psst",
+    )
+    assert events == [
+        MessageAppended("#chan", "bob", "hi me", highlight=True),
+        MessageAppended("#chan", "bob", "hi all"),
+        MessageAppended("bob", "Bob", "psst"),
+    ]
+
+
+def test_topic(state):
+    events = replay(state, ":irc.server 332 me #chan :the topic")
+    assert events[0] == TopicChanged("#chan", "the topic")
+
+
+def test_ignored_joins_still_update_members(state):
+    state.client.ignores.add("bob", ["joins"])
+    events = replay(state, ":bob!u@h JOIN :#chan")
+    assert events == [MemberJoined("#chan", "bob")]
+    assert state.members["#chan"] == {"bob": "bob"}
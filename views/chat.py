@@ -1,11 +1,62 @@
 import asyncio
 import contextlib
 import datetime
+import itertools
+import logging
+from typing import Callable
 
 import flet as ft
 
-from views.viewirc import ViewIrcClient
+from irc.channellist import LIST_PAGE, ChannelListing
+from irc.ignore import IGNORE_TYPES, IGNORES_KEY, normalize_mask
+from irc.isupport import ISupport
+from irc.state import SessionState
+from irc.userinfo import UserInfo
+from views.viewirc import DeferredUpdates, ViewIrcClient
+from helpers import config
+from helpers.bans import ban_list
 from helpers.colors import CustomColors
+from helpers.completion import (
+    COMPLETION_LIMIT,
+    RecentSpeakers,
+    SortedIndex,
+    TabCompletion,
+)
+from helpers.connlog import connection_log
+from helpers.highlight import HIGHLIGHT_NOTIFY_KEY, HIGHLIGHT_WORDS_KEY
+from helpers.memory import memory_budget
+from helpers.profiling import profiler
+from helpers.ratelimit import session_limiter
+from helpers.sessions import SESSION_TOKEN_KEY, session_store
+from helpers.tracing import tracer
+
+buffer_log = logging.getLogger("lizardchat.buffers")
+
+TIMESTAMP_STYLE = ft.TextStyle(size=10)
+NICK_STYLE = ft.TextStyle(weight=ft.FontWeight.BOLD)
+MESSAGE_STYLE = ft.TextStyle(font_family="Cousine")
+HIGHLIGHT_STYLE = ft.TextStyle(
+    color=CustomColors.SEAFOAM, weight=ft.FontWeight.BOLD, font_family="Cousine"
+)
+AUTOJOIN_CHANNELS = ["#main_chat"]
+# Commands handled by ChatView.chat_submit, for Tab completion
+COMMAND_INDEX = SortedIndex(
+    (command, command)
+    for command in (
+        "/msg", "/join", "/part", "/invite", "/kick", "/motd", "/version",
+        "/oper", "/profile", "/quit", "/say", "/nick", "/ipban", "/memory",
+        "/limits", "/trace", "/highlight", "/ignore", "/list", "/help",
+    )
+)  # fmt: skip
+
+# Rough per-item heap estimates (see benchmarks/chatlines.py)
+LINE_CONTROL_BYTES = 3500
+LINE_RECORD_BYTES = 250
+NICKBOX_BYTES = 1500
+
+
+def line_size(message: str, rendered: bool) -> int:
+    return (LINE_CONTROL_BYTES if rendered else LINE_RECORD_BYTES) + len(message)
 
 
 class ChatView(ft.View):
@@ -14,6 +65,7 @@ class ChatView(ft.View):
         self.route = "/chat"
         self.chat_output = ChatOutput()
         self.user_list = UserList()
+        self.user_list.on_select = self.show_user_card
         self.user_list_collapsible = ft.ExpansionTile(
             title=ft.Text(value="Users"),
             maintain_state=True,
@@ -24,19 +76,12 @@ class ChatView(ft.View):
         self.chat_input = ChatInput()
         self.buffer_buttons = BufferButtons()
         self.topic_output = TopicOutput()
-        try:
-            with open("bannedips.txt", "r") as f:
-                self.banned_ips = f.readlines()
-        except FileNotFoundError:
-            self.banned_ips = []
-
-        try:
-            with open("connections.csv") as f:
-                self.connections = f.readlines()
-        except FileNotFoundError:
-            self.connections = []
 
         self.chat_input.on_submit = self.chat_submit
+        self.completion = TabCompletion()
+        # Joined channels by casefolded name, for Tab completion
+        self.channels = SortedIndex()
+        self.chat_output.on_scroll = self.chat_scrolled
         self.active_buffer = "<server>"
         self.appbar = ft.AppBar(
             title=ft.Row(
@@ -68,27 +113,97 @@ class ChatView(ft.View):
 
     def did_mount(self) -> None:
         super().did_mount()
-        self.irc_client = ViewIrcClient(self)
-        self.login()
-        self.add_buffer("<server>")
-        self.page.run_task(self.irc_client.listen)
+        self.session_token = self.page.client_storage.get(SESSION_TOKEN_KEY)
+        if self.session_token and (
+            detached := session_store.reattach(self.session_token)
+        ):
+            self.irc_client = detached.irc_client
+            self.irc_client.reattach(self)
+        elif ban_list.is_banned(self.page.client_ip):
+            self.reject("You are banned from this server")
+            return
+        elif reason := session_limiter.admit(self.page.client_ip):
+            self.reject(reason)
+            return
+        else:
+            self.session_token = session_store.new_token()
+            self.page.client_storage.set(SESSION_TOKEN_KEY, self.session_token)
+            try:
+                self.start_session()
+            except Exception:
+                # e.g. the IRC server refused or timed out the connection
+                session_limiter.release(self.page.client_ip)
+                raise
+            self.irc_client.admitted_ip = self.page.client_ip
+        # Only once there is an IRC session: setting a page handler to None
+        # does not remove it in flet, so a rejected page must never get these
         self.page.on_view_pop = lambda _: self.confirm_logout()
-        self.join("#main_chat")
-        self.page.on_disconnect = self.logout
+        self.page.on_disconnect = self.detach
         self.page.on_close = self.logout
         self.page.on_app_lifecycle_state_change = self.state_change
+        self.page.on_keyboard_event = self.key_pressed
+        self.page.update()
+
+    def start_session(self) -> None:
+        self.irc_client = ViewIrcClient(self)
+        self.user_list.isupport = self.irc_client.client.isupport
+        self.load_highlights()
+        self.load_ignores()
+        self.login()
+        self.add_buffer("<server>")
+        self.irc_client.attach()
+        # JOIN for these already went out with CAP END during registration
+        for channel_name in AUTOJOIN_CHANNELS:
+            self.add_buffer(channel_name)
+        self.set_active_buffer(AUTOJOIN_CHANNELS[-1])
+        self.page.run_task(self.set_buffer_after_delay)
         self.page.session.set("nickname", self.irc_client.client.nick)
-        if password := self.page.session.get("password"):
+        password = self.page.session.get("password")
+        if password and not self.irc_client.client.sasl_authenticated:
             self.irc_client.client.send_private_message(
                 "NickServ", f"IDENTIFY {password}"
             )
-        with open("connections.txt", "a") as f:
-            f.writelines([f"{self.page.session.get('nickname')},{self.page.client_ip}"])
-        self.page.update()
+        connection_log.record(self.page.session.get("nickname"), self.page.client_ip)
+
+    def restore(
+        self, old_view: "ChatView", state: SessionState, deferred: DeferredUpdates
+    ) -> None:
+        self.page.session.set("nickname", state.client.nick)
+        self.user_list.isupport = state.client.isupport
+        memory_budget.forget(old_view)
+        for buffer_name in old_view.chat_output.buffers:
+            if self.buffer_buttons.find_button(buffer_name) is None:
+                self.add_buffer(buffer_name)
+            self.chat_output.load_lines(
+                buffer_name, old_view.chat_output.lines(buffer_name)
+            )
+        deferred.stale_channels.update(state.members, state.topics)
+        self.apply_deferred(state, deferred)
+        self.set_active_buffer(old_view.active_buffer)
+
+    def apply_deferred(self, state: SessionState, deferred: DeferredUpdates) -> None:
+        for channel in deferred.stale_channels:
+            self.user_list.set_buffer_nicks(channel, state.channel_nicks(channel))
+            if channel in state.topics:
+                self.topic_output.set_buffer_topic(channel, state.topics[channel])
+        for buffer_name, lines in deferred.history.items():
+            self.prepend_history(buffer_name, lines)
+        for timestamp, buffer_name, nick, text, highlight in deferred.lines:
+            self.add_message_to_buffer(buffer_name, nick, text, timestamp, highlight)
+        for buffer_name, count in deferred.unread.items():
+            if buffer_name != self.active_buffer:
+                self.buffer_buttons.add_unread(buffer_name, count)
+        if deferred.error:
+            self.fatal_error(deferred.error)
 
     def state_change(self, e: ft.AppLifecycleStateChangeEvent):
-        if e.state == ft.AppLifecycleState.DETACH:
-            self.logout()
+        match e.state:
+            case ft.AppLifecycleState.DETACH:
+                self.detach(e)
+            case ft.AppLifecycleState.HIDE | ft.AppLifecycleState.PAUSE:
+                self.irc_client.throttle()
+            case ft.AppLifecycleState.SHOW | ft.AppLifecycleState.RESUME:
+                self.irc_client.resume()
 
     def chat_submit(self, e: ft.ControlEvent) -> None:
         if input_value := self.chat_input.value:
@@ -99,17 +214,32 @@ class ChatView(ft.View):
                         if len(remaining) >= 2:
                             target, *message = remaining
                             message = " ".join(message)
-                            self.set_active_buffer(target)
-                            self.irc_client.client.send_private_message(target, message)
-                            self.chat_output.add_message(
-                                self.page.session.get("nickname"), message
-                            )
+                            targets = target.split(",")
+                            client = self.irc_client.client
+                            client.send_private_message(targets, message)
+                            for target in targets:
+                                self.echo(target, message)
+                            self.set_active_buffer(targets[-1])
                     case "/join":
-                        if len(remaining) == 1:
-                            self.join(remaining[0])
+                        channels = [
+                            channel
+                            for arg in remaining
+                            for channel in arg.split(",")
+                            if channel
+                        ]
+                        isupport = self.irc_client.client.isupport
+                        errors = [
+                            error
+                            for channel in channels
+                            if (error := isupport.channel_error(channel))
+                        ]
+                        if channels and not errors:
+                            self.join(*channels)
                         else:
                             self.add_message_to_buffer(
-                                "<server>", "<!>", "Syntax: /join #channel"
+                                "<server>",
+                                "<!>",
+                                errors[0] if errors else "Syntax: /join #chan [...]",
                             )
                     case "/part":
                         if len(remaining) == 1:
@@ -146,9 +276,11 @@ class ChatView(ft.View):
                         if len(remaining) == 2:
                             name, password = remaining
                             self.irc_client.client.oper(name, password)
+                    case "/profile":
+                        if self.irc_client.client.is_oper:
+                            self.profile(remaining)
                     case "/quit":
-                        message = " ".join(remaining)
-                        self.irc_client.client.disconnect(message)
+                        self.logout(None, " ".join(remaining))
                         self.page.go("/")
                     case "/say":
                         if len(remaining) >= 1:
@@ -156,22 +288,39 @@ class ChatView(ft.View):
                             self.irc_client.client.send_private_message(
                                 self.active_buffer, message
                             )
-                            self.chat_output.add_message(
-                                self.page.session.get("nickname"), message
-                            )
+                            self.echo(self.active_buffer, message)
                     case "/nick":
                         if len(remaining) == 1:
                             nick = remaining[0]
-                            self.irc_client.client.set_nick(nick)
+                            isupport = self.irc_client.client.isupport
+                            if error := isupport.nick_error(nick):
+                                self.add_message_to_buffer("<server>", "<!>", error)
+                            else:
+                                self.irc_client.client.set_nick(nick)
                     case "/ipban":
                         if len(remaining) == 1:
                             nick = remaining[0]
                             self.ip_ban(nick)
+                    case "/memory":
+                        if self.irc_client.client.is_oper:
+                            self.memory_stats()
+                    case "/limits":
+                        if self.irc_client.client.is_oper:
+                            self.limit_stats()
+                    case "/trace":
+                        if self.irc_client.client.is_oper:
+                            self.trace(remaining)
+                    case "/highlight":
+                        self.highlight(remaining)
+                    case "/ignore":
+                        self.ignore(remaining)
+                    case "/list":
+                        self.browse_channels(" ".join(remaining))
                     case "/help":
                         self.add_message_to_buffer(
                             "<server>",
                             "<!>",
-                            "Available commands are /msg /join /part /invite /kick /motd /version /help",
+                            "Available commands are /msg /join /part /invite /kick /motd /version /list /highlight /ignore /help",
                         )
                     case _:
                         self.add_message_to_buffer(
@@ -181,13 +330,42 @@ class ChatView(ft.View):
                 self.irc_client.client.send_private_message(
                     self.chat_output.active_buffer, self.chat_input.value
                 )
-                self.chat_output.add_message(
-                    self.page.session.get("nickname"), self.chat_input.value
-                )
+                self.echo(self.chat_output.active_buffer, self.chat_input.value)
             self.chat_input.value = ""
         self.chat_input.focus()
         self.page.update()
 
+    def key_pressed(self, e: ft.KeyboardEvent) -> None:
+        if e.key == "Tab" and not (e.ctrl or e.alt or e.meta):
+            self.complete(-1 if e.shift else 1)
+
+    def complete(self, step: int = 1) -> None:
+        value = self.chat_input.value or ""
+        if self.completion.is_cycling(value):
+            completed = self.completion.cycle(step)
+        else:
+            word = value.rpartition(" ")[2]
+            head = value[: len(value) - len(word)]
+            completed = self.completion.start(
+                head, self.completion_candidates(word, at_start=not head)
+            )
+        if completed is not None:
+            self.chat_input.value = completed
+            self.chat_input.focus()
+            self.page.update()
+
+    def completion_candidates(self, word: str, at_start: bool) -> list[str]:
+        isupport = self.irc_client.client.isupport
+        if at_start and word.startswith("/"):
+            matches = COMMAND_INDEX.prefixed(word.lower())
+        elif isupport.is_channel(word):
+            matches = self.channels.prefixed(isupport.casefold(word))
+        else:
+            suffix = ": " if at_start else " "
+            nicks = self.user_list.complete(self.active_buffer, word)
+            return [nick + suffix for nick in nicks]
+        return [f"{match} " for match in itertools.islice(matches, COMPLETION_LIMIT)]
+
     def do_pop(self, e: ft.ControlEvent) -> None:
         self.logout(e)
         self.page.views.pop()
@@ -207,29 +385,88 @@ class ChatView(ft.View):
         self.page.show_dialog(logout_modal)
 
     def login(self) -> None:
-        self.irc_client.client.connect("irc.lizard.fun", 6667)
+        self.irc_client.client.connect(
+            config.IRC_HOST, config.IRC_PORT, config.IRC_TLS, AUTOJOIN_CHANNELS
+        )
 
-    def logout(self, e) -> None:
-        self.irc_client.client.disconnect()
+    def echo(self, buffer_name: str, message: str) -> None:
+        # With echo-message the server sends our own messages back to us
+        if "echo-message" not in self.irc_client.client.caps:
+            self.add_message_to_buffer(
+                buffer_name, self.page.session.get("nickname"), message
+            )
+
+    def logout(self, e, message: str = "Quitting") -> None:
+        self.page.on_keyboard_event.unsubscribe(self.key_pressed)
+        session_store.discard(self.session_token)
+        memory_budget.forget(self)
+        self.irc_client.release()
+        if self.irc_client.client.connected:
+            self.irc_client.client.disconnect(message)
+
+    def detach(self, e) -> None:
+        # Keep the IRC connection alive so a returning browser can reattach
+        if self.irc_client.client.connected and not self.irc_client.detached:
+            self.irc_client.detach()
+            session_store.detach(self.session_token, self.irc_client, self)
+
+    def buffer_key(self, buffer_name: str) -> str:
+        return self.irc_client.client.isupport.casefold(buffer_name)
 
     def add_buffer(self, buffer_name) -> None:
-        button = ft.TextButton(text=buffer_name)
+        buffer_name = self.buffer_key(buffer_name)
+        button = ft.TextButton(text=buffer_name, data=buffer_name)
         self.chat_output.register_buffer(buffer_name)
         self.user_list.register_buffer(buffer_name)
         self.topic_output.register_buffer(buffer_name)
         button.on_click = lambda _: self.set_active_buffer(buffer_name)
         self.buffer_buttons.add_button(button)
+        if self.irc_client.client.isupport.is_channel(buffer_name):
+            self.channels.insert(buffer_name, buffer_name)
 
-    def join(self, channel_name: str) -> None:
-        self.add_buffer(channel_name)
-        self.irc_client.client.join(channel_name)
-        self.set_active_buffer(channel_name)
+    def join(self, *channel_names: str) -> None:
+        for channel_name in channel_names:
+            self.add_buffer(channel_name)
+        self.irc_client.client.join_channels(list(channel_names))
+        self.set_active_buffer(channel_names[-1])
         self.page.update()
         self.page.run_task(self.set_buffer_after_delay)
 
+    def browse_channels(self, query: str) -> None:
+        listing = self.irc_client.state.request_channel_list()
+        browser = ChannelBrowser(listing, self.join_listed, query)
+        self.page.show_dialog(browser)
+        listing.subscribe(browser.listing_changed)
+        # Catch up on anything that arrived between rendering and subscribing
+        browser.listing_changed()
+
+    def join_listed(self, channel_name: str) -> None:
+        self.page.close_dialog()
+        if self.buffer_key(channel_name) in self.channels:
+            self.set_active_buffer(channel_name)
+        else:
+            self.join(channel_name)
+
     def part(self, channel_name: str, reason: str) -> None:
         self.irc_client.client.part(channel_name, reason)
-        self.buffer_buttons.remove_button(channel_name)
+        self.buffer_buttons.remove_button(self.buffer_key(channel_name))
+        self.channels.remove(self.buffer_key(channel_name))
+
+    def show_user_card(self, nick: str) -> None:
+        card = UserCard(nick, self.whisper_from_card, self.user_card_closed)
+        card.set_info(*self.irc_client.state.lookup_user(nick, card.reply_received))
+        self.page.show_dialog(card)
+        # A reply that beat show_dialog could not schedule its own refresh
+        if card.replied:
+            card.reply_received(card.info)
+
+    def user_card_closed(self, card: "UserCard") -> None:
+        # Otherwise the cache keeps the card, and its page, until a reply comes
+        self.irc_client.state.cancel_lookup(card.nick, card.reply_received)
+
+    def whisper_from_card(self, nick: str) -> None:
+        self.page.close_dialog()
+        self.start_whisper(nick)
 
     def start_whisper(self, nick: str) -> None:
         self.add_buffer(nick)
@@ -237,22 +474,144 @@ class ChatView(ft.View):
         self.page.update()
 
     def set_active_buffer(self, buffer_name: str) -> None:
+        buffer_name = self.buffer_key(buffer_name)
         if self.buffer_buttons.find_button(buffer_name) is None:
             self.add_buffer(buffer_name)
         self.active_buffer = buffer_name
+        self.buffer_buttons.clear_unread(buffer_name)
         self.chat_output.set_active_buffer(buffer_name)
+        memory_budget.touch(self, buffer_name)
+        memory_budget.update(self, buffer_name, self.buffer_size(buffer_name))
         self.user_list.set_active_buffer(buffer_name)
         self.topic_output.set_active_buffer(buffer_name)
         self.appbar.title = ft.Row(
             [ft.Text(self.active_buffer), ft.Image("/images/lizard_icon_small.png")]
         )
+        self.irc_client.state.request_history(buffer_name)
         self.page.update()
 
-    def add_message_to_buffer(self, buffer_name: str, nick: str, message: str) -> None:
-        buffer_name = buffer_name.lower()
+    def chat_scrolled(self, e: ft.OnScrollEvent) -> None:
+        # Follow new lines only while scrolled to the bottom, so a page of
+        # older history doesn't yank the view away from what is being read
+        self.chat_output.auto_scroll = e.pixels >= e.max_scroll_extent
+        if e.pixels <= e.min_scroll_extent:
+            self.irc_client.state.request_history(self.active_buffer, older=True)
+
+    def prepend_history(
+        self, buffer_name: str, lines: list[tuple[str, str, str]]
+    ) -> None:
+        if self.chat_output.prepend_lines(buffer_name, lines) is not None:
+            memory_budget.update(self, buffer_name, self.buffer_size(buffer_name))
+
+    def add_message_to_buffer(
+        self,
+        buffer_name: str,
+        nick: str,
+        message: str,
+        timestamp: str = None,
+        highlight: bool = False,
+    ) -> None:
+        buffer_name = self.buffer_key(buffer_name)
         if self.buffer_buttons.find_button(buffer_name) is None:
             self.add_buffer(buffer_name)
-        self.chat_output.add_message_to_buffer(buffer_name, nick, message)
+        self.chat_output.add_message_to_buffer(
+            buffer_name, nick, message, timestamp, highlight
+        )
+        self.user_list.spoke(buffer_name, nick)
+        if highlight and buffer_name != self.active_buffer:
+            self.mention(buffer_name, nick, message)
+        memory_budget.update(self, buffer_name, self.buffer_size(buffer_name))
+
+    def mention(self, buffer_name: str, nick: str, message: str) -> None:
+        self.buffer_buttons.add_mention(buffer_name)
+        if self.irc_client.state.highlights.notify:
+            # Sent with the next page update rather than one of its own
+            self.page.snack_bar = ft.SnackBar(
+                ft.Text(f"{nick} in {buffer_name}: {message}", no_wrap=True),
+                action="Show",
+                on_action=lambda _: self.set_active_buffer(buffer_name),
+                open=True,
+            )
+
+    def highlight(self, args: list[str]) -> None:
+        highlights = self.irc_client.state.highlights
+        match args:
+            case ["add", *words] if words:
+                added = [word for word in words if highlights.add(word)]
+                self.save_highlights()
+                reply = f"Highlighting {' '.join(added) or 'nothing new'}"
+            case ["del", *words] if words:
+                removed = [word for word in words if highlights.remove(word)]
+                self.save_highlights()
+                reply = f"No longer highlighting {' '.join(removed) or 'anything'}"
+            case ["notify", ("on" | "off") as setting]:
+                highlights.notify = setting == "on"
+                self.save_highlights()
+                reply = f"Highlight notifications {setting}"
+            case []:
+                words = " ".join(highlights.words) or "(none)"
+                reply = f"Highlighting your nick and: {words}"
+            case _:
+                reply = "Syntax: /highlight [add word ...|del word ...|notify on|off]"
+        self.add_message_to_buffer("<server>", "<!>", reply)
+
+    def save_highlights(self) -> None:
+        highlights = self.irc_client.state.highlights
+        self.page.client_storage.set(HIGHLIGHT_WORDS_KEY, highlights.words)
+        self.page.client_storage.set(HIGHLIGHT_NOTIFY_KEY, highlights.notify)
+
+    def load_highlights(self) -> None:
+        highlights = self.irc_client.state.highlights
+        highlights.set_words(self.page.client_storage.get(HIGHLIGHT_WORDS_KEY) or [])
+        notify = self.page.client_storage.get(HIGHLIGHT_NOTIFY_KEY)
+        highlights.notify = notify is None or bool(notify)
+
+    def ignore(self, args: list[str]) -> None:
+        ignores = self.irc_client.client.ignores
+        match args:
+            case ["add", mask, *types] if set(types) <= IGNORE_TYPES.keys():
+                mask = ignores.add(mask, types or IGNORE_TYPES)
+                self.save_ignores()
+                reply = f"Ignoring {mask} ({' '.join(ignores.masks[mask])})"
+            case ["del", mask]:
+                if ignores.remove(mask):
+                    self.save_ignores()
+                    reply = f"No longer ignoring {normalize_mask(mask)}"
+                else:
+                    reply = f"Not ignoring {normalize_mask(mask)}"
+            case []:
+                masks = [
+                    f"{mask} ({' '.join(types)})"
+                    for mask, types in ignores.masks.items()
+                ]
+                reply = f"Ignoring: {', '.join(masks) or '(nobody)'}"
+            case _:
+                types = "|".join(IGNORE_TYPES)
+                reply = f"Syntax: /ignore [add nick!user@host [{types} ...]|del mask]"
+        self.add_message_to_buffer("<server>", "<!>", reply)
+
+    def save_ignores(self) -> None:
+        masks = self.irc_client.client.ignores.masks
+        self.page.client_storage.set(
+            IGNORES_KEY, [[mask, list(types)] for mask, types in masks.items()]
+        )
+
+    def load_ignores(self) -> None:
+        self.irc_client.client.ignores.set_masks(
+            self.page.client_storage.get(IGNORES_KEY) or []
+        )
+
+    def buffer_size(self, buffer_name: str) -> int:
+        nick_count = len(self.user_list.buffers.get(buffer_name, ()))
+        return self.chat_output.sizes.get(buffer_name, 0) + nick_count * NICKBOX_BYTES
+
+    def compact_buffer(self, buffer_name: str) -> int | None:
+        if self.chat_output.compact_buffer(buffer_name) is not None:
+            return self.buffer_size(buffer_name)
+
+    def trim_buffer(self, buffer_name: str, keep_lines: int) -> int | None:
+        if self.chat_output.trim_buffer(buffer_name, keep_lines) is not None:
+            return self.buffer_size(buffer_name)
 
     async def set_buffer_after_delay(self) -> None:
         await asyncio.sleep(1)
@@ -270,37 +629,150 @@ class ChatView(ft.View):
         )
         self.page.show_dialog(error_modal)
 
+    def reject(self, reason: str) -> None:
+        # No IRC session was started, so nothing may reach for one: did_mount
+        # subscribes no page handlers, and the input cannot send
+        self.page.on_view_pop = lambda _: self.leave()
+        self.chat_input.disabled = True
+        reject_modal = ft.AlertDialog(
+            modal=True,
+            title=ft.Text("Error"),
+            content=ft.Text(reason),
+            actions=[
+                ft.TextButton("Back", on_click=lambda _: self.leave()),
+            ],
+        )
+        self.page.show_dialog(reject_modal)
+        self.page.update()
+
+    def leave(self) -> None:
+        self.page.close_dialog()
+        self.page.go("/")
+
     def ip_ban(self, nick: str) -> None:
         if self.irc_client.client.is_oper:
-            with open("connections.txt", "r") as f:
-                connections = [
-                    connection for connection in f.readlines() if nick in connection
-                ]
-            if connections:
-                nick, client_ip = connections[0].split(",")
-                with open("bannedips.txt", "w") as f:
-                    f.writelines([client_ip])
+            connection_log.flush()
+            if client_ip := connection_log.latest_ip(nick):
+                ban_list.ban(client_ip)
                 self.irc_client.client.kill(nick, "IP Banned")
 
+    def memory_stats(self) -> None:
+        stats = memory_budget.stats()
+        self.add_message_to_buffer(
+            "<server>",
+            "<!>",
+            f"Buffers use ~{stats['total_bytes'] // 2**20} MiB of "
+            f"{stats['limit_bytes'] // 2**20} MiB across {stats['sessions']} sessions "
+            f"and {stats['buffers']} buffers (largest session "
+            f"{stats['largest_session_bytes'] // 2**20} MiB, "
+            f"{stats['compactions']} compactions, {stats['trims']} trims)",
+        )
+
+    def limit_stats(self) -> None:
+        stats = session_limiter.stats()
+        self.add_message_to_buffer(
+            "<server>",
+            "<!>",
+            f"{stats['active_sessions']} sessions open, {stats['admitted']} admitted; "
+            f"rejected {stats['rejected_sessions']} over the session cap, "
+            f"{stats['rejected_ip_rate']} by IP rate, "
+            f"{stats['rejected_subnet_rate']} by subnet rate "
+            f"({stats['tracked_ips']} IPs, {stats['tracked_subnets']} subnets tracked)",
+        )
+
+    def trace(self, args: list[str]) -> None:
+        if not tracer.enabled:
+            self.add_message_to_buffer(
+                "<server>", "<!>", "Tracing is disabled (LIZARDCHAT_TRACE_SAMPLE_RATE)"
+            )
+            return
+        match args:
+            case ["dump"]:
+                path, event_count = tracer.export_chrome_trace()
+                self.add_message_to_buffer(
+                    "<server>", "<!>", f"Wrote {event_count} trace events to {path}"
+                )
+            case ["clear"]:
+                tracer.clear()
+                self.add_message_to_buffer("<server>", "<!>", "Trace buffer cleared")
+            case _:
+                for stage, stats in tracer.percentiles().items():
+                    self.add_message_to_buffer(
+                        "<server>",
+                        "<!>",
+                        f"{stage}: p50={stats['p50']:.3f}ms "
+                        f"p99={stats['p99']:.3f}ms n={stats['count']}",
+                    )
+
+    def profile(self, args: list[str]) -> None:
+        match args:
+            case ["stop"]:
+                if paths := profiler.stop():
+                    message = f"Profile written to {', '.join(paths)}"
+                else:
+                    message = "No profile running"
+            case ["mem"]:
+                path = profiler.memory_snapshot()
+                if path:
+                    message = f"Allocation diff written to {path}"
+                else:
+                    message = "Baseline taken; /profile mem again writes the diff"
+            case [seconds] if seconds.isdigit():
+                if profiler.start(int(seconds)):
+                    message = f"Profiling all sessions for {seconds}s"
+                else:
+                    message = "A profile is already running"
+            case _:
+                message = "Syntax: /profile <seconds> | /profile stop | /profile mem"
+        self.add_message_to_buffer("<server>", "<!>", message)
+
 
 class BufferButtons(ft.Row):
     def __init__(self) -> None:
         super().__init__()
         self.controls = []
+        self.unread = {}
+        self.mentions = {}
 
     def add_button(self, button: ft.TextButton) -> None:
         self.controls.append(button)
 
     def remove_button(self, buffer_name: str) -> None:
         self.controls = [
-            button for button in self.controls if button.text != buffer_name
+            button for button in self.controls if button.data != buffer_name
         ]
+        self.unread.pop(buffer_name, None)
+        self.mentions.pop(buffer_name, None)
 
     def find_button(self, buffer_name: str) -> ft.TextButton | None:
-        buttons = [button for button in self.controls if button.text == buffer_name]
+        buttons = [button for button in self.controls if button.data == buffer_name]
         with contextlib.suppress(IndexError):
             return buttons[0]
 
+    def add_unread(self, buffer_name: str, count: int) -> None:
+        if button := self.find_button(buffer_name):
+            self.unread[buffer_name] = self.unread.get(buffer_name, 0) + count
+            button.text = self.label(buffer_name)
+
+    def add_mention(self, buffer_name: str) -> None:
+        if button := self.find_button(buffer_name):
+            self.mentions[buffer_name] = self.mentions.get(buffer_name, 0) + 1
+            button.text = self.label(buffer_name)
+
+    def clear_unread(self, buffer_name: str) -> None:
+        unread = self.unread.pop(buffer_name, None)
+        mentions = self.mentions.pop(buffer_name, None)
+        if (unread or mentions) and (button := self.find_button(buffer_name)):
+            button.text = buffer_name
+
+    def label(self, buffer_name: str) -> str:
+        label = buffer_name
+        if unread := self.unread.get(buffer_name):
+            label += f" ({unread})"
+        if mentions := self.mentions.get(buffer_name):
+            label += f" @{mentions}"
+        return label
+
 
 class ChatOutput(ft.ListView):
     def __init__(self) -> None:
@@ -309,48 +781,209 @@ class ChatOutput(ft.ListView):
         self.padding = 10
         self.height = 400
         self.auto_scroll = True
-        self.on_scroll_interval = 0
+        self.on_scroll_interval = 100
         self.buffers = {"<server>": []}
+        # (timestamp, nick, message, highlight) records of buffers not shown
+        self.compacted: dict[str, list[tuple[str, str, str, bool]]] = {}
+        self.sizes = {"<server>": 0}
         self.active_buffer = "<server>"
 
     def add_message(self, nick: str, message: str) -> None:
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
         chat_message = ChatMessage(timestamp, nick, message)
         self.buffers[self.active_buffer].append(chat_message)
+        self.sizes[self.active_buffer] += line_size(message, rendered=True)
 
     def register_buffer(self, buffer_name: str) -> None:
         self.buffers[buffer_name] = []
+        self.compacted.pop(buffer_name, None)
+        self.sizes[buffer_name] = 0
 
     def set_active_buffer(self, buffer_name: str) -> None:
+        if buffer_name in self.compacted:
+            self.buffers[buffer_name] = [
+                ChatMessage(*line) for line in self.compacted.pop(buffer_name)
+            ]
+            self.sizes[buffer_name] = sum(
+                line_size(message.message, rendered=True)
+                for message in self.buffers[buffer_name]
+            )
         try:
             self.controls = self.buffers[buffer_name]
             self.active_buffer = buffer_name
         except KeyError:
             self.active_buffer = buffer_name
             self.buffers[buffer_name] = []
+            self.sizes[buffer_name] = 0
             self.controls = self.buffers[buffer_name]
 
-    def add_message_to_buffer(self, buffer_name: str, nick: str, message: str) -> None:
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+    def add_message_to_buffer(
+        self,
+        buffer_name: str,
+        nick: str,
+        message: str,
+        timestamp: str = None,
+        highlight: bool = False,
+    ) -> None:
+        timestamp = timestamp or datetime.datetime.now().strftime("%H:%M:%S")
+        if buffer_name in self.compacted:
+            self.compacted[buffer_name].append((timestamp, nick, message, highlight))
+            self.sizes[buffer_name] += line_size(message, rendered=False)
+            return
         try:
-            self.buffers[buffer_name].append(ChatMessage(timestamp, nick, message))
+            self.buffers[buffer_name].append(
+                ChatMessage(timestamp, nick, message, highlight)
+            )
+            self.sizes[buffer_name] += line_size(message, rendered=True)
         except KeyError:
-            print("No buffer named", buffer_name)
+            buffer_log.warning(
+                "No buffer named %s", buffer_name, extra={"buffer": buffer_name}
+            )
+
+    def prepend_lines(
+        self, buffer_name: str, lines: list[tuple[str, str, str, bool]]
+    ) -> int | None:
+        """Insert older lines at the top of a buffer, in place"""
+        if buffer_name in self.compacted:
+            self.compacted[buffer_name][:0] = lines
+            rendered = False
+        elif buffer_name in self.buffers:
+            self.buffers[buffer_name][:0] = [ChatMessage(*line) for line in lines]
+            rendered = True
+        else:
+            return None
+        self.sizes[buffer_name] += sum(
+            line_size(message, rendered) for _, _, message, _ in lines
+        )
+        return self.sizes[buffer_name]
+
+    def lines(self, buffer_name: str) -> list[tuple[str, str, str, bool]]:
+        if buffer_name in self.compacted:
+            return list(self.compacted[buffer_name])
+        return [
+            (message.timestamp, message.nickname, message.message, message.highlight)
+            for message in self.buffers.get(buffer_name, [])
+        ]
+
+    def load_lines(
+        self, buffer_name: str, lines: list[tuple[str, str, str, bool]]
+    ) -> None:
+        """Store lines as records; controls are built when the buffer is shown"""
+        self.buffers[buffer_name] = []
+        self.compacted[buffer_name] = lines
+        self.sizes[buffer_name] = sum(
+            line_size(message, rendered=False) for _, _, message, _ in lines
+        )
+
+    def compact_buffer(self, buffer_name: str) -> int | None:
+        if buffer_name in self.compacted or not self.buffers.get(buffer_name):
+            return None
+        self.load_lines(buffer_name, self.lines(buffer_name))
+        return self.sizes[buffer_name]
+
+    def trim_buffer(self, buffer_name: str, keep_lines: int) -> int | None:
+        lines = self.compacted.get(buffer_name)
+        if lines is None or len(lines) <= keep_lines:
+            return None
+        self.load_lines(buffer_name, lines[-keep_lines:] if keep_lines else [])
+        return self.sizes[buffer_name]
 
 
 class NickBox(ft.Container):
-    def __init__(self, nick: str) -> None:
+    def __init__(
+        self, nick: str, on_select: Callable[[str], None] | None = None
+    ) -> None:
         super().__init__()
         self.bgcolor = CustomColors.BLACK
         self.content = ft.Text(value=nick)
-        self.on_hover = self.hover
+        # The ink well draws the hover highlight in the browser; no events
+        # come back to the server until the nick is clicked
+        self.ink = True
+        self.ink_color = CustomColors.NAVY
+        self.on_select = on_select
+        self.on_click = self.clicked
 
-    def hover(self, e: ft.HoverEvent) -> None:
-        if e.data == "true":
-            self.bgcolor = CustomColors.NAVY
-        else:
-            self.bgcolor = CustomColors.BLACK
-        self.page.update()
+    def clicked(self, e: ft.ControlEvent) -> None:
+        if self.on_select is not None:
+            self.on_select(self.content.value)
+
+
+class BufferUsers:
+    """One buffer's nick list, kept sorted as members come and go
+
+    listing holds the NickBoxes in display order (the UserList's controls when
+    the buffer is active); boxes and nicks are keyed by the nick casefolded
+    with the server's CASEMAPPING, nicks being the Tab completion index.
+    """
+
+    def __init__(self, on_select: Callable[[str], None] | None = None) -> None:
+        self.on_select = on_select
+        self.listing = SortedIndex()
+        self.boxes: dict[str, NickBox] = {}
+        self.nicks = SortedIndex()
+        self.recent = RecentSpeakers()
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def reset(self, names: list[str], isupport: ISupport) -> None:
+        self.boxes = {}
+        nicks = {}
+        for name in names:
+            _, nick = isupport.strip_prefix(name)
+            key = isupport.casefold(nick)
+            self.boxes[key] = NickBox(name, self.on_select)
+            nicks[key] = nick
+        self.listing.reset(
+            (box.content.value.casefold(), box) for box in self.boxes.values()
+        )
+        self.nicks.reset(nicks.items())
+
+    def add(self, name: str, isupport: ISupport) -> None:
+        _, nick = isupport.strip_prefix(name)
+        key = isupport.casefold(nick)
+        self.remove(key)
+        box = NickBox(name, self.on_select)
+        self.boxes[key] = box
+        self.listing.insert(name.casefold(), box)
+        self.nicks.insert(key, nick)
+
+    def remove(self, key: str) -> NickBox | None:
+        box = self.boxes.pop(key, None)
+        if box is not None:
+            self.listing.remove(box.content.value.casefold())
+            self.nicks.remove(key)
+        return box
+
+    def rename(self, old_key: str, new_nick: str, isupport: ISupport) -> None:
+        spoke = old_key in self.recent.nicks
+        box = self.remove(old_key)
+        self.recent.discard(old_key)
+        if box is None:
+            return
+        prefix, _ = isupport.strip_prefix(box.content.value)
+        box.content.value = prefix + new_nick
+        key = isupport.casefold(new_nick)
+        self.boxes[key] = box
+        self.listing.insert(box.content.value.casefold(), box)
+        self.nicks.insert(key, new_nick)
+        if spoke:
+            self.recent.spoke(key)
+
+    def complete(self, prefix: str) -> list[str]:
+        """Nicks starting with the casefolded prefix, recent speakers first"""
+        completions = [
+            self.nicks.get(key)
+            for key in self.recent.newest_first()
+            if key.startswith(prefix) and key in self.boxes
+        ]
+        seen = set(completions)
+        for nick in self.nicks.prefixed(prefix):
+            if len(completions) >= COMPLETION_LIMIT:
+                break
+            if nick not in seen:
+                completions.append(nick)
+        return completions
 
 
 class UserList(ft.ListView):
@@ -359,56 +992,66 @@ class UserList(ft.ListView):
         self.padding = 10
         self.controls = []
         self.active_buffer = "<server>"
-        self.buffers = {"<server>": []}
+        self.buffers = {"<server>": BufferUsers(self.select)}
+        # Replaced by the session's own ISupport once connected
+        self.isupport = ISupport()
+        # Called with the bare nick when a NickBox is clicked
+        self.on_select = None
 
     def register_buffer(self, buffer_name: str) -> None:
-        self.buffers[buffer_name] = []
+        self.buffers[buffer_name] = BufferUsers(self.select)
+
+    def select(self, name: str) -> None:
+        if self.on_select is not None:
+            self.on_select(self.isupport.strip_prefix(name)[1])
 
     def set_buffer_nicks(self, buffer_name: str, nicks: list[str]) -> None:
-        nicks = sorted(nicks, key=lambda s: s.casefold())
         try:
-            self.buffers[buffer_name] = [NickBox(nick) for nick in nicks]
-            if buffer_name == self.active_buffer:
-                self.set_active_buffer(buffer_name)
+            self.buffers[buffer_name].reset(nicks, self.isupport)
         except KeyError:
-            print("No buffer named", buffer_name)
+            buffer_log.warning(
+                "No buffer named %s", buffer_name, extra={"buffer": buffer_name}
+            )
 
     def add_user(self, buffer_name: str, nick: str):
-        nicks = [
-            nickbox.content.value.lower()
-            for nickbox in self.buffers[buffer_name]
-            if nickbox.content.value != nick
-        ]
-        nicks.append(nick)
-        self.set_buffer_nicks(buffer_name, nicks)
+        with contextlib.suppress(KeyError):
+            self.buffers[buffer_name].add(nick, self.isupport)
 
     def set_active_buffer(self, buffer_name) -> None:
-        try:
-            self.controls = []
-            for nick_box in self.buffers[buffer_name]:
-                self.controls.append(nick_box)
-            self.active_buffer = buffer_name
-        except KeyError:
-            self.active_buffer = buffer_name
-            self.buffers[buffer_name] = []
-            self.controls = self.buffers[buffer_name]
+        if buffer_name not in self.buffers:
+            self.register_buffer(buffer_name)
+        # The listing is updated in place, so the active buffer's controls follow
+        self.controls = self.buffers[buffer_name].listing.values
+        self.active_buffer = buffer_name
 
     def remove_user(self, nick: str) -> None:
-        for buffer_name, buffer in self.buffers.items():
-            nicks = [
-                nickbox.content.value.lower()
-                for nickbox in buffer
-                if nickbox.content.value != nick
-            ]
-            self.set_buffer_nicks(buffer_name, nicks)
+        key = self.isupport.casefold(nick)
+        for users in self.buffers.values():
+            if users.remove(key) is not None:
+                users.recent.discard(key)
+
+    def remove_user_from_buffer(self, buffer_name: str, nick: str) -> None:
+        if (users := self.buffers.get(buffer_name)) is not None:
+            key = self.isupport.casefold(nick)
+            users.remove(key)
+            users.recent.discard(key)
 
     def replace_name(self, old_nick: str, new_nick: str) -> None:
-        for buffer_name, buffer in self.buffers.items():
-            nicks = [nickbox.content.value.lower() for nickbox in buffer]
-            with contextlib.suppress(ValueError):
-                nicks.remove(old_nick.lower())
-            nicks.append(new_nick)
-            self.set_buffer_nicks(buffer_name, nicks)
+        old_key = self.isupport.casefold(old_nick)
+        for users in self.buffers.values():
+            if old_key in users.boxes:
+                users.rename(old_key, new_nick, self.isupport)
+
+    def spoke(self, buffer_name: str, nick: str) -> None:
+        users = self.buffers.get(buffer_name)
+        key = self.isupport.casefold(nick)
+        if users is not None and key in users.boxes:
+            users.recent.spoke(key)
+
+    def complete(self, buffer_name: str, prefix: str) -> list[str]:
+        if (users := self.buffers.get(buffer_name)) is not None:
+            return users.complete(self.isupport.casefold(prefix))
+        return []
 
 
 class ChatInput(ft.TextField):
@@ -417,27 +1060,24 @@ class ChatInput(ft.TextField):
         self.expand = True
 
 
-class ChatMessage(ft.Row):
-    def __init__(self, timestamp: str, nickname: str, message: str) -> None:
+class ChatMessage(ft.Text):
+    def __init__(
+        self, timestamp: str, nickname: str, message: str, highlight: bool = False
+    ) -> None:
         super().__init__()
         self.timestamp = timestamp
         self.nickname = nickname
         self.message = message
-        self.vertical_alignment = ft.MainAxisAlignment.START
-        self.alignment = ft.CrossAxisAlignment.START
-        self.spacing = 5
-        self.controls = [
-            ft.Text(value=timestamp, size=10),
-            ft.Text(
-                value=f"{nickname}:", weight=ft.FontWeight.BOLD, font_family="Cousine"
-            ),
-            ft.Text(
-                value=message,
-                selectable=True,
-                font_family="Cousine",
-                no_wrap=False,
-                overflow=ft.TextOverflow.CLIP,
-                expand=True,
+        self.highlight = highlight
+        self.selectable = True
+        self.no_wrap = False
+        self.overflow = ft.TextOverflow.CLIP
+        self.expand = True
+        self.spans = [
+            ft.TextSpan(text=f"{timestamp} ", style=TIMESTAMP_STYLE),
+            ft.TextSpan(text=f"{nickname}: ", style=NICK_STYLE),
+            ft.TextSpan(
+                text=message, style=HIGHLIGHT_STYLE if highlight else MESSAGE_STYLE
             ),
         ]
 
@@ -486,7 +1126,9 @@ class TopicOutput(ft.Container):
             if buffer_name == self.active_buffer:
                 self.set_active_buffer(buffer_name)
         except KeyError:
-            print("No buffer named", buffer_name)
+            buffer_log.warning(
+                "No buffer named %s", buffer_name, extra={"buffer": buffer_name}
+            )
 
     def set_active_buffer(self, buffer_name) -> None:
         try:
@@ -496,3 +1138,201 @@ class TopicOutput(ft.Container):
             self.active_buffer = buffer_name
             self.buffers[buffer_name] = ft.Text(value="")
             self.content = self.buffers[buffer_name]
+
+
+class ChannelBrowser(ft.AlertDialog):
+    """A channel listing, one page of rows at a time
+
+    Searching and sorting run against the listing's index, so only the rows of
+    the page shown are ever built. While LIST is still arriving the listing
+    notifies the browser, which re-renders at most once per scheduled task.
+    """
+
+    def __init__(
+        self, listing: ChannelListing, on_join: Callable[[str], None], query: str = ""
+    ) -> None:
+        super().__init__()
+        self.listing = listing
+        self.on_join = on_join
+        self.offset = 0
+        self.refresh_pending = False
+        self.search_field = ft.TextField(
+            label="Search names and topics",
+            value=query,
+            dense=True,
+            expand=True,
+            on_change=self.search_changed,
+        )
+        self.sort_dropdown = ft.Dropdown(
+            value="users",
+            options=[
+                ft.dropdown.Option("users", "Most users"),
+                ft.dropdown.Option("name", "Name"),
+            ],
+            dense=True,
+            width=150,
+            on_change=self.search_changed,
+        )
+        self.rows = ft.ListView(expand=True)
+        self.status = ft.Text(size=12)
+        self.previous_button = ft.TextButton("Previous", on_click=self.previous_page)
+        self.next_button = ft.TextButton("Next", on_click=self.next_page)
+        self.title = ft.Text("Channels")
+        self.content = ft.Container(
+            content=ft.Column(
+                controls=[
+                    ft.Row(controls=[self.search_field, self.sort_dropdown]),
+                    self.rows,
+                    ft.Row(
+                        controls=[
+                            self.status,
+                            ft.Row(
+                                controls=[self.previous_button, self.next_button]
+                            ),
+                        ],
+                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                    ),
+                ],
+            ),
+            width=600,
+            height=500,
+        )
+        self.actions = [ft.TextButton("Close", on_click=self.close)]
+        self.on_dismiss = lambda _: self.listing.unsubscribe(self.listing_changed)
+        self.render()
+
+    def render(self) -> None:
+        total, page = self.listing.index.search(
+            self.search_field.value or "",
+            self.sort_dropdown.value,
+            self.offset,
+            LIST_PAGE,
+        )
+        self.rows.controls = [
+            ft.ListTile(
+                title=ft.Text(entry.name),
+                subtitle=ft.Text(entry.topic, max_lines=2) if entry.topic else None,
+                trailing=ft.Text(str(entry.users)),
+                dense=True,
+                on_click=lambda _, name=entry.name: self.on_join(name),
+            )
+            for entry in page
+        ]
+        shown = f"{self.offset + 1}-{self.offset + len(page)}" if page else "0"
+        loading = "" if self.listing.completed else ", loading"
+        self.status.value = f"{shown} of {total}{loading}"
+        self.previous_button.disabled = self.offset == 0
+        self.next_button.disabled = self.offset + LIST_PAGE >= total
+
+    def search_changed(self, e: ft.ControlEvent) -> None:
+        self.offset = 0
+        self.render()
+        self.update()
+
+    def previous_page(self, e: ft.ControlEvent) -> None:
+        self.offset = max(self.offset - LIST_PAGE, 0)
+        self.render()
+        self.update()
+
+    def next_page(self, e: ft.ControlEvent) -> None:
+        self.offset += LIST_PAGE
+        self.render()
+        self.update()
+
+    def listing_changed(self) -> None:
+        # Called by whichever session is receiving LIST, possibly another page's
+        if not self.open or self.page is None:
+            self.listing.unsubscribe(self.listing_changed)
+        elif not self.refresh_pending:
+            self.refresh_pending = True
+            self.page.run_task(self.refresh)
+
+    async def refresh(self) -> None:
+        self.refresh_pending = False
+        if self.open and self.page:
+            self.render()
+            self.update()
+
+    def close(self, e: ft.ControlEvent) -> None:
+        self.listing.unsubscribe(self.listing_changed)
+        self.page.close_dialog()
+
+
+class UserCard(ft.AlertDialog):
+    """WHOIS details of one nick, from the cache shared by every session"""
+
+    def __init__(
+        self,
+        nick: str,
+        on_message: Callable[[str], None],
+        on_close: Callable[["UserCard"], None],
+    ) -> None:
+        super().__init__()
+        self.nick = nick
+        self.on_message = on_message
+        self.on_close = on_close
+        self.info: UserInfo | None = None
+        self.waiting = True
+        self.replied = False
+        self.refresh_pending = False
+        self.details = ft.Column(tight=True, spacing=4)
+        self.title = ft.Text(nick)
+        self.content = self.details
+        self.actions = [
+            ft.TextButton("Message", on_click=self.message),
+            ft.TextButton("Close", on_click=self.close),
+        ]
+        self.on_dismiss = self.dismissed
+
+    def message(self, e: ft.ControlEvent) -> None:
+        self.dismissed(e)
+        self.on_message(self.nick)
+
+    def close(self, e: ft.ControlEvent) -> None:
+        self.dismissed(e)
+        self.page.close_dialog()
+
+    def dismissed(self, e: ft.ControlEvent) -> None:
+        if self.waiting:
+            self.on_close(self)
+
+    def set_info(self, info: UserInfo | None, waiting: bool) -> None:
+        if not self.replied:
+            self.info, self.waiting = info, waiting
+        self.render()
+
+    def render(self) -> None:
+        info = self.info
+        rows = []
+        if info is not None:
+            idle = info.idle_now()
+            rows = [
+                ("Name", info.realname),
+                ("Host", f"{info.username}@{info.host}"),
+                ("Account", info.account or "not logged in"),
+                ("Server", info.server),
+                ("Channels", " ".join(info.channels)),
+                ("Idle", f"{idle // 60}m {idle % 60}s" if idle is not None else ""),
+            ]
+        self.details.controls = [
+            ft.Text(spans=[ft.TextSpan(f"{label}: ", NICK_STYLE), ft.TextSpan(value)])
+            for label, value in rows
+            if value
+        ]
+        if self.waiting:
+            self.details.controls.append(ft.Text("Looking up...", italic=True))
+        elif info is None:
+            self.details.controls.append(ft.Text("No such nick", italic=True))
+
+    def reply_received(self, info: UserInfo | None) -> None:
+        # Called by whichever session received the WHOIS reply
+        self.info, self.waiting, self.replied = info, False, True
+        if self.open and self.page and not self.refresh_pending:
+            self.refresh_pending = True
+            self.page.run_task(self.refresh)
+
+    async def refresh(self) -> None:
+        self.refresh_pending = False
+        if self.open and self.page:
+            self.render()
+            self.update()
@@ -1,6 +1,13 @@
 import flet as ft
 
+from helpers.assets import assets
+from helpers.bans import ban_list
 from helpers.colors import CustomColors
+from helpers.ratelimit import session_limiter
+from helpers.sessions import SESSION_TOKEN_KEY, session_store
+from irc.isupport import ISupport
+
+RULES_PATH = "assets/text/rules.txt"
 
 
 class HomeView(ft.View):
@@ -61,25 +68,47 @@ class HomeView(ft.View):
         self.vertical_alignment = ft.MainAxisAlignment.CENTER
         self.horizontal_alignment = ft.CrossAxisAlignment.CENTER
         self.spacing = 26
-        with open("assets/text/rules.txt", "r") as f:
-            self.rules_text = f.read()
 
     def validate(self, e: ft.ControlEvent) -> None:
+        # Reject nicks the server would refuse before opening a connection
+        nick = self.text_nickname.value
+        self.text_nickname.error_text = ISupport().nick_error(nick) if nick else None
         self.login_button.disabled = not (
-            self.text_nickname.value and self.checkbox_agree.value
+            nick and self.checkbox_agree.value and not self.text_nickname.error_text
         )
         self.page.update()
 
     def submit(self, e: ft.ControlEvent) -> None:
+        if ban_list.is_banned(self.page.client_ip):
+            self.show_error("You are banned from this server")
+            return
+        if reason := session_limiter.check(self.page.client_ip):
+            self.show_error(reason)
+            return
+        # A fresh login replaces any detached session this browser still holds
+        if token := self.page.client_storage.get(SESSION_TOKEN_KEY):
+            if detached := session_store.reattach(token):
+                detached.irc_client.expire()
+            self.page.client_storage.remove(SESSION_TOKEN_KEY)
         self.page.session.set("nickname", self.text_nickname.value)
         self.page.session.set("password", self.text_password.value)
         self.page.session.set("username", f"lizardchat-web")
         self.page.session.set("realname", f"lizardchat-web")
         self.page.go("/chat")
 
+    def show_error(self, message: str) -> None:
+        error_dialog = ft.AlertDialog(
+            title=ft.Text("Error"),
+            content=ft.Text(message),
+            actions=[
+                ft.TextButton(text="Ok", on_click=lambda _: self.page.close_dialog())
+            ],
+        )
+        self.page.show_dialog(error_dialog)
+
     def show_rules(self, e: ft.ControlEvent) -> None:
         rules_dialog = ft.AlertDialog(
-            content=ft.Text(self.rules_text),
+            content=ft.Text(assets.read_text(RULES_PATH)),
             actions=[
                 ft.TextButton(text="Ok", on_click=lambda _: self.page.close_dialog())
             ],